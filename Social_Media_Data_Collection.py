@@ -1,21 +1,31 @@
 # social_media_data_collection.py
+import os
 import sys
+import threading
 import time
 import re
 import csv
 import statistics
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
 from collections import defaultdict
 import math
+import json
+import weakref
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+# Selenium and webdriver-manager are imported where a driver is used, so the
+# parsing/analysis helpers can be imported without them.
+import instrumentation as instr
+from classifier import KeywordClassifier
+from scheduler import PAGE_ERRORS, RateLimited, TransientError, retry_call
+
+if TYPE_CHECKING:
+    from selenium import webdriver
+
+class By:
+    """Selenium locator strategies (the same strings as selenium's By)."""
+    CSS_SELECTOR = "css selector"
+    XPATH = "xpath"
 
 # ------------ CONFIG ------------
 USE_MOBILE_LAYOUT = False         # Desktop is more reliable for counts
@@ -26,7 +36,55 @@ USERNAMES = [
 
     # add more handles here (no @)
 ]
+HANDLES_FILE = None               # text file with one handle per line ("#" starts a comment); replaces USERNAMES
 MIN_HASHTAG_OCCURRENCES = 2       # for hashtag efficiency stats
+POOL_WORKERS = 1                  # >1 scrapes with a pool of Chrome drivers (browser_pool.py)
+BASE_URL = "https://www.tiktok.com"  # point at fixture_server.py for offline runs
+FETCH_MODE = "browser"            # "http": fetch post pages without Chrome (http_fetch.py)
+HTTP_CONCURRENCY = 16             # max in-flight requests per host in "http" mode
+INCREMENTAL = False               # reuse cached posts younger than CACHE_TTL_HOURS (post_cache.py)
+CACHE_DIR = ".post_cache"
+CACHE_TTL_HOURS = 24
+CACHE_MAX_ENTRIES = 200_000       # oldest entries are evicted beyond this
+REFRESH_POLICY = False            # INCREMENTAL: re-fetch cached posts by predicted change, not CACHE_TTL_HOURS (refresh_policy.py; needs HISTORY_DB)
+REFRESH_TOLERANCE = 0.05          # a post is due once its counts are expected to have moved by this fraction
+REFRESH_BUDGET = None             # max cached posts re-fetched per run, most-changed first (None: every due post)
+REFRESH_MAX_HOURS = 14 * 24       # re-fetch even a settled post at least this often
+PAGE_READY_TIMEOUT = 10           # max wait for a page's data/grid to appear (s)
+SCROLL_WAIT_TIMEOUT = 1.5         # max wait for the grid to grow after a scroll (s)
+REPORT_WAIT_TIMINGS = True        # print per-wait timings at the end of main()
+CAPTURE_ITEM_LIST = False         # read post IDs from the profile's item_list API responses (DevTools)
+LEAN_DRIVER = True                # headless, eager page loads, no images/fonts/media
+TRACK_NAVIGATION = True           # record bytes transferred and load time per page
+PIPELINE_MODE = False             # stream into consolidated output files (pipeline.py)
+OUTPUT_DIR = "output"             # where PIPELINE_MODE writes summary.* and posts.*
+OUTPUT_FORMATS = ["csv"]          # any of "csv", "jsonl", "parquet"
+INSTRUMENT = False                # record stage timings/counters (instrumentation.py)
+TRACE_PATH = "trace.jsonl"        # one JSON line per timed stage when INSTRUMENT
+METRICS_PATH = "metrics.prom"     # Prometheus text-format totals written at the end of main()
+THEME_MATCH = "none"              # plain substring, as before ("grammar" hits "#englishgrammar"); "start" for prefix-only
+COUNTRY_MATCH = "word"            # whole words only ("us" no longer hits "music")
+THEME_KEYWORDS_FILE = None        # JSON {"theme": [keywords], ...} in priority order, replaces THEME_CATEGORIES
+COUNTRY_KEYWORDS_FILE = None      # same for COUNTRY_CATEGORIES
+SCHEDULER = False                 # per-handle retries, staleness order and resumable checkpoints (scheduler.py)
+CHECKPOINT_PATH = "scrape_checkpoint.json"  # progress of a SCHEDULER run; delete to start over
+MAX_ATTEMPTS = 3                  # tries per profile/post before it is given up
+BACKOFF_BASE = 2.0                # retry n waits up to BACKOFF_BASE * 2**n seconds (full jitter)
+BACKOFF_CAP = 60.0
+THROTTLED_PAGE_MARKERS = ("too many requests", "rate limit")   # page text of a throttled post page (browser mode)
+ERROR_PAGE_MARKERS = ("internal error", "server error", "something went wrong")  # ... of a failed one (retried)
+RATE_LIMIT_PER_HOST = None        # page requests per second per host (None: unlimited)
+RATE_LIMIT_BURST = 5
+HISTORY_DB = None                 # e.g. "history.sqlite": keep every scrape as timestamped snapshots (history_store.py)
+HASHTAG_INDEX = None              # e.g. "hashtags.idx": cross-profile hashtag index, saved at the end (hashtag_index.py)
+CRAWL_DIR = "crawl"               # sharded crawl: queue.sqlite and per-worker parts/ (crawl.py)
+CRAWL_SHARD_SIZE = 5              # handles a crawl worker claims at a time
+CRAWL_LEASE_SECONDS = 300         # a claimed handle returns to the queue if not heartbeated for this long
+CRAWL_TOKEN = None                # shared secret between `crawl.py serve` and remote workers
+DRIVER_PATH_CACHE = ".chromedriver_path"  # chromedriver location resolved by webdriver-manager
+DRIVER_CACHE_DAYS = 7             # re-check for a new chromedriver after this many days
+BROWSER_PROFILE_DIR = None        # Chrome user-data dir kept across runs (cookies, consent); serial runs
+ATTACH_DEBUGGER = None            # e.g. "127.0.0.1:9222": reuse a Chrome started with --remote-debugging-port
 # ---------------------------------
 
 # ---------- Utilities / parsing ----------
@@ -58,47 +116,65 @@ def parse_iso_or_text_date(dt: str) -> Optional[datetime]:
             return None
     return None
 
+# Ordered categories: the first one with a keyword in the text wins.
+THEME_CATEGORIES = [
+    ("grammar",         ["grammar", "grammartips", "pasttense", "presentperfect", "articles", "tenses"]),
+    ("vocabulary",      ["vocabulary", "vocab", "wordoftheday", "phrases", "idioms", "phrasalverbs"]),
+    ("pronunciation",   ["pronunciation", "accent", "phonetics", "ipa", "sounds"]),
+    ("exam/test prep",  ["ielts", "toefl", "toeic", "cambridge", "pte"]),
+    ("slang/culture",   ["slang", "culture", "britishvsamerican", "usvsuk"]),
+    ("business english",["businessenglish", "interview", "resume", "cv", "email"]),
+    ("study tips",      ["study", "tips", "learnenglish", "englishlearning"]),
+]
+COUNTRY_CATEGORIES = [
+    ("United States", ["usa", "us", "america", "american"]),
+    ("United Kingdom", ["uk", "united kingdom", "british", "england"]),
+    ("Canada", ["canada", "canadian"]),
+    ("Australia", ["australia", "aussie", "australian"]),
+    ("India", ["india", "indian"]),
+    ("Poland", ["poland", "polish"]),
+    ("France", ["france", "french"]),
+    ("Germany", ["germany", "german"]),
+    ("Spain", ["spain", "spanish"]),
+    ("Italy", ["italy", "italian"]),
+    ("Brazil", ["brazil", "brazilian"]),
+    ("Mexico", ["mexico", "mexican"]),
+    ("China", ["china", "chinese"]),
+    ("Japan", ["japan", "japanese"]),
+    ("Korea", ["korea", "korean"]),
+    ("Turkey", ["turkey", "turkish"]),
+]
+
+_CLASSIFIERS: Dict[str, KeywordClassifier] = {}
+
+def _classifier(name: str, categories, keywords_file: Optional[str], default: str,
+                boundary: str) -> KeywordClassifier:
+    """Compile a category table once per process (from keywords_file when set)."""
+    clf = _CLASSIFIERS.get(name)
+    if clf is None:
+        clf = (KeywordClassifier.from_file(keywords_file, default, boundary) if keywords_file
+               else KeywordClassifier(categories, default, boundary))
+        _CLASSIFIERS[name] = clf
+    return clf
+
+def theme_classifier() -> KeywordClassifier:
+    return _classifier("theme", THEME_CATEGORIES, THEME_KEYWORDS_FILE, "general english", THEME_MATCH)
+
+def country_classifier() -> KeywordClassifier:
+    return _classifier("country", COUNTRY_CATEGORIES, COUNTRY_KEYWORDS_FILE, "Unknown", COUNTRY_MATCH)
+
 def guess_theme(hashtags: List[str], caption: str) -> str:
-    blob = (" ".join(hashtags) + " " + (caption or "")).lower()
-    themes = [
-        ("grammar",         ["grammar", "grammartips", "pasttense", "presentperfect", "articles", "tenses"]),
-        ("vocabulary",      ["vocabulary", "vocab", "wordoftheday", "phrases", "idioms", "phrasalverbs"]),
-        ("pronunciation",   ["pronunciation", "accent", "phonetics", "ipa", "sounds"]),
-        ("exam/test prep",  ["ielts", "toefl", "toeic", "cambridge", "pte"]),
-        ("slang/culture",   ["slang", "culture", "britishvsamerican", "usvsuk"]),
-        ("business english",["businessenglish", "interview", "resume", "cv", "email"]),
-        ("study tips",      ["study", "tips", "learnenglish", "englishlearning"]),
-    ]
-    for label, kws in themes:
-        if any(kw in blob for kw in kws):
-            return label
-    return "general english"
+    return theme_classifier().classify(" ".join(hashtags) + " " + (caption or ""))
+
+def guess_themes(posts: List[Tuple[List[str], str]]) -> List[str]:
+    """guess_theme() for many (hashtags, caption) pairs in one pass."""
+    return theme_classifier().classify_many([" ".join(h) + " " + (c or "") for h, c in posts])
 
 def guess_country_from_bio(bio: str) -> str:
-    if not bio: return "Unknown"
-    bio_low = bio.lower()
-    mapping = {
-        "United States": ["usa", "us", "america", "american"],
-        "United Kingdom": ["uk", "united kingdom", "british", "england"],
-        "Canada": ["canada", "canadian"],
-        "Australia": ["australia", "aussie", "australian"],
-        "India": ["india", "indian"],
-        "Poland": ["poland", "polish"],
-        "France": ["france", "french"],
-        "Germany": ["germany", "german"],
-        "Spain": ["spain", "spanish"],
-        "Italy": ["italy", "italian"],
-        "Brazil": ["brazil", "brazilian"],
-        "Mexico": ["mexico", "mexican"],
-        "China": ["china", "chinese"],
-        "Japan": ["japan", "japanese"],
-        "Korea": ["korea", "korean"],
-        "Turkey": ["turkey", "turkish"],
-    }
-    for country, kws in mapping.items():
-        if any(kw in bio_low for kw in kws):
-            return country
-    return "Unknown"
+    return country_classifier().classify(bio)
+
+def guess_countries(bios: List[str]) -> List[str]:
+    return country_classifier().classify_many(bios)
 
 def posts_per_week(timestamps: List[datetime]) -> Optional[float]:
     ts = [t for t in timestamps if isinstance(t, datetime)]
@@ -116,47 +192,308 @@ def pearson_r(xs: List[float], ys: List[float]) -> Optional[float]:
     if den_x == 0 or den_y == 0: return None
     return num / (den_x * den_y)
 
+def load_handles(path: str) -> List[str]:
+    """Handles from a text file, one per line; blank lines, "#" comments and duplicates are skipped."""
+    handles = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            handle = line.split("#", 1)[0].strip().lstrip("@")
+            if handle: handles.append(handle)
+    return list(dict.fromkeys(handles))
+
+def usernames() -> List[str]:
+    """The handles to scrape: HANDLES_FILE if set, else USERNAMES."""
+    return load_handles(HANDLES_FILE) if HANDLES_FILE else list(USERNAMES)
+
+def video_id_from_url(url: str) -> Optional[str]:
+    m = re.search(r"/video/(\d+)", url or "")
+    return m.group(1) if m else None
+
+def handle_from_url(url: str) -> Optional[str]:
+    m = re.search(r"/@([^/?#]+)/video/", url or "")
+    return m.group(1) if m else None
+
+def post_to_json(post: Dict) -> Dict:
+    """JSON-safe copy of a scrape_post() record (timestamp as ISO string)."""
+    out = dict(post)
+    if isinstance(out.get("timestamp"), datetime):
+        out["timestamp"] = out["timestamp"].isoformat()
+    return out
+
+def post_from_json(data: Dict) -> Dict:
+    post = dict(data)
+    ts = post.get("timestamp")
+    post["timestamp"] = datetime.fromisoformat(ts) if isinstance(ts, str) and ts else None
+    return post
+
 # ---------- WebDriver ----------
-def get_driver(use_mobile=False, headless=False) -> webdriver.Chrome:
+MOBILE_USER_AGENT = (
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) "
+    "AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1"
+)
+DESKTOP_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36"
+)
+
+# URL patterns blocked in lean mode (Network.setBlockedURLs): we only need JSON and text.
+LEAN_BLOCKED_URLS = [
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp4", "*.webm", "*.m3u8", "*.mp3", "*mime_type=video*", "*mime_type=audio*",
+]
+
+_DRIVER_PATH: Optional[str] = None
+_DRIVER_PATH_LOCK = threading.Lock()
+
+# Drivers attached to an already-running Chrome; release_driver() leaves those browsers open.
+_ATTACHED: "weakref.WeakSet" = weakref.WeakSet()
+
+def resolve_driver_path() -> str:
+    """
+    Path of the chromedriver binary. webdriver-manager (which checks the
+    network for the current version) runs at most once per DRIVER_CACHE_DAYS;
+    in between the path is read from DRIVER_PATH_CACHE.
+    """
+    global _DRIVER_PATH
+    with _DRIVER_PATH_LOCK:
+        if _DRIVER_PATH and os.access(_DRIVER_PATH, os.X_OK):
+            return _DRIVER_PATH
+        try:
+            with open(DRIVER_PATH_CACHE, encoding="utf-8") as f:
+                entry = json.load(f)
+            fresh = time.time() - float(entry["resolved_at"]) < DRIVER_CACHE_DAYS * 86400
+            if fresh and os.access(entry["path"], os.X_OK):
+                _DRIVER_PATH = entry["path"]
+                return _DRIVER_PATH
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        from webdriver_manager.chrome import ChromeDriverManager
+        with instr.span("driver_install"):
+            path = ChromeDriverManager().install()
+        try:
+            with open(DRIVER_PATH_CACHE, "w", encoding="utf-8") as f:
+                json.dump({"path": path, "resolved_at": time.time()}, f)
+        except OSError:
+            pass
+        _DRIVER_PATH = path
+        return path
+
+@instr.timed("driver_startup")
+def get_driver(use_mobile=False, headless=False, lean=False,
+               profile_dir: Optional[str] = None, attach: Optional[str] = None) -> "webdriver.Chrome":
+    """
+    lean=True runs headless with an eager page-load strategy and blocks
+    images, fonts and media, so pages stop at the HTML/JSON we parse.
+    profile_dir keeps Chrome's profile (cookies, consent) between runs.
+    attach ("host:port") connects to a running Chrome started with
+    --remote-debugging-port instead of launching one; launch options are
+    then ignored.
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
     opts = Options()
-    if headless: opts.add_argument("--headless=new")
+    if attach:
+        opts.add_experimental_option("debuggerAddress", attach)
+        if CAPTURE_ITEM_LIST:
+            opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        driver = webdriver.Chrome(service=Service(resolve_driver_path()), options=opts)
+        _ATTACHED.add(driver)
+        if lean: _block_heavy_resources(driver)
+        return driver
+
+    if headless or lean: opts.add_argument("--headless=new")
     opts.add_argument("--disable-gpu"); opts.add_argument("--no-sandbox")
     opts.add_argument("--disable-blink-features=AutomationControlled")
     opts.add_argument("--lang=en-US")
+    if profile_dir: opts.add_argument(f"--user-data-dir={os.path.abspath(profile_dir)}")
 
     if use_mobile:
-        opts.add_argument(
-            "--user-agent=Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) "
-            "AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1"
-        )
+        opts.add_argument(f"--user-agent={MOBILE_USER_AGENT}")
         opts.add_argument("--window-size=390,844")
     else:
-        opts.add_argument(
-            "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36"
-        )
+        opts.add_argument(f"--user-agent={DESKTOP_USER_AGENT}")
         opts.add_argument("--window-size=1280,1800")
 
-    service = Service(ChromeDriverManager().install())
-    return webdriver.Chrome(service=service, options=opts)
+    if CAPTURE_ITEM_LIST:
+        opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+    if lean:
+        opts.page_load_strategy = "eager"  # return at DOMContentLoaded
+        opts.add_argument("--blink-settings=imagesEnabled=false")
+        opts.add_argument("--autoplay-policy=user-gesture-required")
+        opts.add_argument("--mute-audio")
+        opts.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.media_stream": 2,
+        })
+
+    driver = webdriver.Chrome(service=Service(resolve_driver_path()), options=opts)
+    if lean: _block_heavy_resources(driver)
+    return driver
+
+def _block_heavy_resources(driver):
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": LEAN_BLOCKED_URLS})
+    except Exception:
+        pass  # lean prefs still block images
+
+def release_driver(driver):
+    """Quit a driver; an attached browser is left running for the next run."""
+    try:
+        if driver in _ATTACHED:
+            driver.service.stop()  # end chromedriver only
+        else:
+            driver.quit()
+    except Exception:
+        pass
+
+# ---------- Navigation stats ----------
+# kind ("profile"/"post") -> [(seconds until usable, bytes transferred)]
+NAV_STATS: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
+
+# Bytes over the wire for the current page (document + resources). Cross-origin
+# resources without Timing-Allow-Origin report 0, so this is a lower bound.
+PAGE_BYTES_JS = """
+const nav = performance.getEntriesByType('navigation')[0];
+let total = nav ? (nav.transferSize || 0) : 0;
+for (const r of performance.getEntriesByType('resource')) total += r.transferSize || 0;
+return total;
+"""
+
+_RATE_LIMITER = None
+
+def rate_limiter():
+    """Shared per-host limiter for RATE_LIMIT_PER_HOST (None when unlimited)."""
+    global _RATE_LIMITER
+    if not RATE_LIMIT_PER_HOST: return None
+    if _RATE_LIMITER is None or _RATE_LIMITER.rate != RATE_LIMIT_PER_HOST:
+        from scheduler import RateLimiter
+        _RATE_LIMITER = RateLimiter(RATE_LIMIT_PER_HOST, RATE_LIMIT_BURST)
+    return _RATE_LIMITER
+
+def navigate(driver, url: str) -> float:
+    """driver.get(url); returns the start time for record_navigation()."""
+    limiter = rate_limiter()
+    if limiter: limiter.wait(url)
+    started = time.perf_counter()
+    with instr.span("navigate"):
+        driver.get(url)
+    return started
+
+def record_navigation(driver, kind: str, started: float):
+    if not TRACK_NAVIGATION: return
+    elapsed = time.perf_counter() - started
+    try:
+        transferred = int(driver.execute_script(PAGE_BYTES_JS) or 0)
+    except Exception:
+        transferred = 0
+    NAV_STATS[kind].append((elapsed, transferred))
+
+def print_navigation_report():
+    if not NAV_STATS: return
+    print("\nNavigation (kind: pages, mean s to usable page, mean KB transferred):")
+    for kind, vals in sorted(NAV_STATS.items()):
+        secs = sum(v[0] for v in vals) / len(vals)
+        kb = sum(v[1] for v in vals) / len(vals) / 1024
+        print(f"  {kind:<8} {len(vals):>5}  {secs:>7.3f}  {kb:>9.1f}")
+
+# ---------- Waits ----------
+COOKIE_BUTTON = (By.XPATH, "//button[contains(., 'Accept')]")
+POST_ANCHOR_SELECTOR = "a[href*='/video/']"
+ITEM_LIST_API = "/api/post/item_list"
+
+# One round-trip per scroll: hrefs of anchors from index arguments[1] on,
+# then scroll. Restarts from 0 if the grid was re-rendered with fewer anchors.
+GRID_BATCH_JS = """
+const anchors = document.querySelectorAll(arguments[0]);
+const start = anchors.length >= arguments[1] ? arguments[1] : 0;
+const hrefs = [];
+for (let i = start; i < anchors.length; i++) hrefs.push(anchors[i].href);
+window.scrollBy(0, 1200);
+return [hrefs, anchors.length, document.body.scrollHeight];
+"""
+GRID_STATE_JS = "return [document.querySelectorAll(arguments[0]).length, document.body.scrollHeight];"
+
+# label -> wall-clock seconds of every wait, for print_wait_report()
+WAIT_TIMINGS: Dict[str, List[float]] = defaultdict(list)
+
+# Drivers whose cookie banner was already handled this session.
+_COOKIES_HANDLED: "weakref.WeakSet" = weakref.WeakSet()
+
+# Post page is usable once the state JSON or the DOM stats are in place.
+POST_READY_JS = """
+for (const id of arguments[0]) { if (document.getElementById(id)) return true; }
+return !!document.querySelector("[data-e2e='like-count'], [data-e2e='browse-video-desc']");
+"""
+
+def timed_wait(driver, label: str, condition, timeout: float, poll: float = 0.1):
+    """
+    WebDriverWait on `condition`, recording its duration under `label`.
+    Returns the condition's value, or None on timeout.
+    """
+    from selenium.webdriver.support.ui import WebDriverWait
+    t0 = time.perf_counter()
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=poll).until(condition)
+    except Exception:
+        instr.count("timeouts", wait=label)
+        return None
+    finally:
+        elapsed = time.perf_counter() - t0
+        WAIT_TIMINGS[label].append(elapsed)
+        instr.observe("wait", elapsed, wait=label)
+
+def print_wait_report():
+    if not WAIT_TIMINGS: return
+    print("\nWait timings (label: count, total s, mean s, max s):")
+    for label, vals in sorted(WAIT_TIMINGS.items(), key=lambda kv: -sum(kv[1])):
+        print(f"  {label:<16} {len(vals):>5}  {sum(vals):>8.2f}  {sum(vals)/len(vals):>6.3f}  {max(vals):>6.3f}")
 
 def accept_cookies(driver, timeout=10):
+    """
+    Dismiss the cookie banner. The full wait only happens on a driver's
+    first page; afterwards a banner is clicked only if it is already there.
+    """
+    from selenium.webdriver.support import expected_conditions as EC
     try:
-        wait = WebDriverWait(driver, timeout)
-        btn = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[contains(., 'Accept')]")))
-        btn.click(); time.sleep(0.8)
+        if driver in _COOKIES_HANDLED:
+            btns = driver.find_elements(*COOKIE_BUTTON)
+            if btns and btns[0].is_displayed(): btns[0].click()
+            return
+        btn = timed_wait(driver, "cookie_banner", EC.element_to_be_clickable(COOKIE_BUTTON), timeout)
+        if btn:
+            btn.click()
+            timed_wait(driver, "cookie_dismiss", EC.invisibility_of_element(btn), 2)
+        _COOKIES_HANDLED.add(driver)
     except Exception:
         pass
 
 # ---------- Scraping ----------
-def get_profile_identity(driver, username: str):
+def profile_url(username: str) -> str:
+    return f"{BASE_URL}/@{username}?lang=en"
+
+def open_profile(driver, username: str):
+    if CAPTURE_ITEM_LIST:
+        try: driver.get_log("performance")  # drop entries from earlier pages
+        except Exception: pass
+    started = navigate(driver, profile_url(username))
+    accept_cookies(driver)
+    record_navigation(driver, "profile", started)
+
+def read_profile_identity(driver, username: str):
     """
-    Return (display_name, bio_text, followers, following).
+    Read (display_name, bio_text, followers, following) from the DOM of the
+    already-loaded profile page.
     """
-    url = f"https://www.tiktok.com/@{username}?lang=en"
-    driver.get(url)
-    accept_cookies(driver)
-    time.sleep(1.2)
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    timed_wait(driver, "profile_ready", EC.presence_of_element_located(
+        (By.CSS_SELECTOR, "strong[data-e2e='followers-count']")), PAGE_READY_TIMEOUT)
     wait = WebDriverWait(driver, 10)
 
     def metric(sel: str) -> int:
@@ -164,6 +501,7 @@ def get_profile_identity(driver, username: str):
             el = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, sel)))
             return convert_count(el.text)
         except Exception:
+            instr.count("timeouts", wait="profile_metric")
             return 0
 
     followers = metric("strong[data-e2e='followers-count']")
@@ -193,43 +531,227 @@ def get_profile_identity(driver, username: str):
 
     return display_name, bio_text, followers, following
 
-def collect_recent_post_urls(driver, username: str, limit: int) -> List[str]:
-    url = f"https://www.tiktok.com/@{username}?lang=en"
-    driver.get(url)
-    accept_cookies(driver)
-    time.sleep(1.0)
+@instr.timed("url_discovery")
+def scroll_post_urls(driver, limit: int) -> List[str]:
+    """
+    Collect post URLs from the already-loaded profile grid, scrolling as needed.
+    """
+    from selenium.webdriver.support import expected_conditions as EC
+    timed_wait(driver, "grid_ready", EC.presence_of_element_located(
+        (By.CSS_SELECTOR, POST_ANCHOR_SELECTOR)), PAGE_READY_TIMEOUT)
 
     urls: List[str] = []
-    last_h = 0; stuck = 0
+    seen = set()
+    offset = 0; stuck = 0
     while len(urls) < limit and stuck < 4:
-        anchors = driver.find_elements(By.CSS_SELECTOR, "a[href*='/video/']")
-        for a in anchors:
-            href = a.get_attribute("href")
-            if href and "/video/" in href and href not in urls:
-                urls.append(href)
+        hrefs, count, height = driver.execute_script(GRID_BATCH_JS, POST_ANCHOR_SELECTOR, offset)
+        offset = count
+        for href in hrefs:
+            if href and "/video/" in href and href not in seen:
+                seen.add(href); urls.append(href)
                 if len(urls) >= limit: break
-        driver.execute_script("window.scrollBy(0, 1200);")
-        time.sleep(0.9)
-        new_h = driver.execute_script("return document.body.scrollHeight")
-        stuck = stuck + 1 if new_h == last_h else 0
-        last_h = new_h
+        if len(urls) >= limit: break
+        # wait until the grid actually grows (or give up after a short timeout)
+        def grew(d, count=count, height=height):
+            new_count, new_height = d.execute_script(GRID_STATE_JS, POST_ANCHOR_SELECTOR)
+            return new_count > count or new_height > height
+        stuck = 0 if timed_wait(driver, "grid_scroll", grew, SCROLL_WAIT_TIMEOUT) else stuck + 1
     return urls[:limit]
 
-def scrape_post(driver, post_url: str) -> Dict:
+def capture_item_list_ids(driver, username: str, limit: int, timeout: float) -> Tuple[List[str], bool]:
     """
-    JSON-first scrape; fallback to DOM.
+    Read post IDs from the item_list API responses the profile page fetches,
+    via Chrome's performance log and DevTools (needs CAPTURE_ITEM_LIST).
+    Stops once `limit` IDs are known or the API reports no more posts.
+    Returns (ids, exhausted); exhausted means the profile has no further posts.
     """
-    driver.get(post_url)
-    accept_cookies(driver)
-    wait = WebDriverWait(driver, 10)
-    time.sleep(0.6)
+    ids: List[str] = []
+    seen = set()
+    pending = set()
+    state = {"done": False}
+
+    def poll(d):
+        for entry in d.get_log("performance"):
+            try:
+                msg = json.loads(entry["message"])["message"]
+            except Exception:
+                continue
+            method, params = msg.get("method"), msg.get("params") or {}
+            if method == "Network.responseReceived":
+                if ITEM_LIST_API in ((params.get("response") or {}).get("url") or ""):
+                    pending.add(params.get("requestId"))
+            elif method == "Network.loadingFinished" and params.get("requestId") in pending:
+                pending.discard(params["requestId"])
+                try:
+                    body = d.execute_cdp_cmd("Network.getResponseBody", {"requestId": params["requestId"]})
+                    data = json.loads(body.get("body") or "{}")
+                except Exception:
+                    continue
+                for item in data.get("itemList") or []:
+                    author = item.get("author")
+                    author = author.get("uniqueId") if isinstance(author, dict) else author
+                    vid = str(item.get("id") or "")
+                    if vid and vid not in seen and (not author or author == username):
+                        seen.add(vid); ids.append(vid)
+                if not data.get("hasMore"):
+                    state["done"] = True
+        return len(ids) >= limit or state["done"]
+
+    timed_wait(driver, "item_list_capture", poll, timeout, poll=0.2)
+    return ids, state["done"]
+
+def get_profile_identity(driver, username: str):
+    """
+    Return (display_name, bio_text, followers, following).
+    """
+    open_profile(driver, username)
+    return read_profile_identity(driver, username)
+
+def collect_recent_post_urls(driver, username: str, limit: int) -> List[str]:
+    open_profile(driver, username)
+    return scroll_post_urls(driver, limit)
+
+def parse_profile_state(data: Dict, username: str):
+    """
+    Pull identity and post IDs from a profile page's state JSON.
+    Returns (identity or None, [video_id, ...] in grid order).
+    """
+    identity = None
+    scope = data.get("__DEFAULT_SCOPE__") if isinstance(data.get("__DEFAULT_SCOPE__"), dict) else {}
+    info = (scope.get("webapp.user-detail") or {}).get("userInfo")
+    if not info and isinstance(data.get("UserModule"), dict):  # SIGI_STATE layout
+        users, stats = data["UserModule"].get("users") or {}, data["UserModule"].get("stats") or {}
+        if username in users:
+            info = {"user": users[username], "stats": stats.get(username) or {}}
+    if isinstance(info, dict) and isinstance(info.get("user"), dict):
+        user, stats = info["user"], info.get("stats") or {}
+        try:
+            identity = (
+                (user.get("nickname") or "").strip() or username,
+                (user.get("signature") or "").strip(),
+                int(stats.get("followerCount") or 0),
+                int(stats.get("followingCount") or 0),
+            )
+        except (TypeError, ValueError):
+            identity = None
+
+    video_ids: List[str] = []
+    item_list = ((data.get("ItemList") or {}).get("user-post") or {}).get("list")
+    if isinstance(item_list, list):
+        video_ids = [str(v) for v in item_list]
+    elif isinstance(data.get("ItemModule"), dict):
+        video_ids = [str(k) for k in data["ItemModule"]]
+    return identity, video_ids
+
+@instr.timed("harvest_profile")
+def harvest_profile(driver, username: str, limit: int):
+    """
+    One page load per handle: return (identity, post_urls), the same values
+    as get_profile_identity() + collect_recent_post_urls(). Both are read
+    from the embedded state JSON when present; the DOM is the fallback.
+    """
+    open_profile(driver, username)
     try:
-        wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+        state = driver.execute_script(REHYDRATION_JS, list(REHYDRATION_SCRIPT_IDS))
+        data = json.loads(state) if state else {}
     except Exception:
-        pass
+        data = {}
+    identity, video_ids = parse_profile_state(data, username) if isinstance(data, dict) else (None, [])
+    instr.count("extraction", field="identity", path="json" if identity else "dom")
+
+    if identity is None:
+        identity = read_profile_identity(driver, username)
+    exhausted = False
+    if len(video_ids) < limit and CAPTURE_ITEM_LIST:
+        captured, exhausted = capture_item_list_ids(driver, username, limit, PAGE_READY_TIMEOUT)
+        known = set(video_ids)
+        video_ids += [v for v in captured if v not in known]
+    if len(video_ids) >= limit or (exhausted and video_ids):
+        post_urls = [f"{BASE_URL}/@{username}/video/{vid}" for vid in video_ids[:limit]]
+    else:
+        post_urls = scroll_post_urls(driver, limit)
+    return identity, post_urls
+
+# Script tags TikTok uses to ship page state, newest layout first.
+REHYDRATION_SCRIPT_IDS = ("__UNIVERSAL_DATA_FOR_REHYDRATION__", "SIGI_STATE")
+
+# One round-trip: return the state JSON text instead of the whole page_source.
+REHYDRATION_JS = """
+for (const id of arguments[0]) {
+    const el = document.getElementById(id);
+    if (el && el.textContent) return el.textContent;
+}
+return null;
+"""
+
+def find_rehydration_text(html: str) -> Optional[str]:
+    """Locate the rehydration <script> block with plain string searches (no regex)."""
+    for script_id in REHYDRATION_SCRIPT_IDS:
+        i = html.find(f'id="{script_id}"')
+        if i < 0: continue
+        start = html.find(">", i) + 1
+        end = html.find("</script>", start)
+        if start > 0 and end > start:
+            return html[start:end]
+    return None
 
-    html = driver.page_source
+def find_item_struct(data: Dict, post_url: str = "") -> Optional[Dict]:
+    """Return the video's item dict from either state layout."""
+    scope = data.get("__DEFAULT_SCOPE__")
+    if isinstance(scope, dict):
+        item = ((scope.get("webapp.video-detail") or {}).get("itemInfo") or {}).get("itemStruct")
+        if isinstance(item, dict): return item
+    items = data.get("ItemModule")
+    if isinstance(items, dict) and items:
+        video_id = video_id_from_url(post_url)
+        if video_id in items: return items[video_id]
+        return next(iter(items.values()))
+    return None
+
+def item_fields(item: Dict) -> Dict:
+    """Map a TikTok item dict to the fields scrape_post() needs."""
+    stats = item.get("stats") or item.get("statsV2") or {}
+
+    def count(key, default=None):
+        try: return int(stats[key])
+        except Exception: return default
+
+    caption = item.get("desc")
+    caption = caption if isinstance(caption, str) else None
+    try:
+        ts = datetime.fromtimestamp(int(item["createTime"])) if int(item["createTime"]) else None
+    except Exception:
+        ts = None
+    return {
+        "views": count("playCount"), "likes": count("diggCount"),
+        "comments": count("commentCount"), "shares": count("shareCount"),
+        "saves": count("collectCount", 0), "caption": caption,
+        "hashtags": extract_hashtags(caption or ""), "timestamp": ts,
+    }
+
+def parse_rehydration_text(text: str, post_url: str = "") -> Optional[Dict]:
+    try:
+        data = json.loads(text)
+    except Exception:
+        return None
+    item = find_item_struct(data, post_url) if isinstance(data, dict) else None
+    return item_fields(item) if item else None
+
+def parse_post_html(html: str, post_url: str = "") -> Dict:
+    """
+    Pull post fields from the page's embedded JSON. Fields that are not in
+    the JSON are None (caption is None only when there is no "desc" key).
+    """
+    text = find_rehydration_text(html)
+    fields = parse_rehydration_text(text, post_url) if text else None
+    instr.count("page_parse", path="json" if fields is not None else "regex")
+    return fields if fields is not None else parse_post_html_regex(html)
 
+def parse_post_html_regex(html: str) -> Dict:
+    """
+    Legacy extraction: one regex scan of the full page per field. Only used
+    for pages without a recognizable rehydration block.
+    """
     def rx(pattern, flags=0, cast=int, default=None):
         m = re.search(pattern, html, flags)
         if not m: return default
@@ -242,48 +764,140 @@ def scrape_post(driver, post_url: str) -> Dict:
     shares   = rx(r'"shareCount"\s*:\s*(\d+)', cast=int, default=None)
     saves    = rx(r'"collectCount"\s*:\s*(\d+)', cast=int, default=0)
 
-    caption  = rx(r'"desc"\s*:\s*"([^"]*)"', flags=re.DOTALL, cast=str, default="") or ""
+    caption  = rx(r'"desc"\s*:\s*"([^"]*)"', flags=re.DOTALL, cast=str, default=None)
     caption  = bytes(caption, "utf-8").decode("unicode_escape") if caption else caption
     create_ts = rx(r'"createTime"\s*:\s*"(\d+)"', cast=int, default=None)
     ts = datetime.fromtimestamp(create_ts) if create_ts else None
 
+    return {
+        "views": views, "likes": likes, "comments": comments, "shares": shares,
+        "saves": saves, "caption": caption, "timestamp": ts,
+    }
+
+# Fields scrape_post() falls back to the DOM for when the page state lacks them.
+DOM_FALLBACK_FIELDS = ("views", "likes", "comments", "shares", "caption", "timestamp")
+
+def field_from_state(fields: Dict, key: str) -> bool:
+    """Whether the page state supplied `key`. An empty caption counts as missing: the DOM may have it."""
+    return bool(fields.get(key)) if key == "caption" else fields.get(key) is not None
+
+def post_fields_complete(fields: Dict) -> bool:
+    """True when the JSON alone covers every field scrape_post() would look up in the DOM."""
+    return all(field_from_state(fields, k) for k in DOM_FALLBACK_FIELDS)
+
+STAT_FIELDS = ("views", "likes", "comments", "shares")
+
+def check_post_page(post_url: str, html: str):
+    """
+    Raise RateLimited or TransientError if `html` is a throttle or error page.
+    Only meaningful for pages that carried no post data.
+    """
+    text = (html or "").lower()
+    if any(m in text for m in THROTTLED_PAGE_MARKERS):
+        raise RateLimited(post_url)
+    if any(m in text for m in ERROR_PAGE_MARKERS):
+        raise TransientError(f"error page: {post_url}")
+
+def build_post_record(post_url: str, fields: Dict) -> Dict:
+    views, likes, comments, shares, saves = (
+        fields["views"], fields["likes"], fields["comments"], fields["shares"], fields["saves"])
+    caption = fields["caption"] or ""
+    hashtags = fields.get("hashtags")
+    if hashtags is None: hashtags = extract_hashtags(caption)
+    theme = guess_theme(hashtags, caption)
+    caption_len = len(caption or "")
+
+    er_view = None
+    if views and views > 0:
+        er_view = (likes + comments + shares + (saves or 0)) / views
+
+    return {
+        "url": post_url,
+        "views": views or 0,
+        "likes": likes or 0,
+        "comments": comments or 0,
+        "shares": shares or 0,
+        "saves": saves or 0,
+        "er_view": er_view,
+        "caption": caption,
+        "caption_len": caption_len,
+        "hashtags": hashtags,
+        "timestamp": fields["timestamp"],
+        "theme": theme,
+    }
+
+@instr.timed("scrape_post")
+def scrape_post(driver, post_url: str) -> Dict:
+    """
+    JSON-first scrape; fallback to DOM. Raises RateLimited/TransientError when
+    the page is a throttle or error page, or has no stats in either.
+    """
+    started = navigate(driver, post_url)
+    accept_cookies(driver)
+    timed_wait(driver, "post_ready", lambda d: d.execute_script(
+        POST_READY_JS, list(REHYDRATION_SCRIPT_IDS)), PAGE_READY_TIMEOUT)
+    record_navigation(driver, "post", started)
+
+    html = None
+    try:
+        state = driver.execute_script(REHYDRATION_JS, list(REHYDRATION_SCRIPT_IDS))
+    except Exception:
+        state = None
+    fields = parse_rehydration_text(state, post_url) if state else None
+    if fields is None:
+        html = driver.page_source
+        fields = parse_post_html(html, post_url)
+        if all(fields[k] is None for k in STAT_FIELDS):
+            check_post_page(post_url, html)
+    views, likes, comments, shares = (
+        fields["views"], fields["likes"], fields["comments"], fields["shares"])
+    caption, ts = fields["caption"], fields["timestamp"]
+    if instr.ENABLED:
+        for key in DOM_FALLBACK_FIELDS:
+            instr.count("extraction", field=key, path="json" if field_from_state(fields, key) else "dom")
+
     def first_text(selectors) -> str:
-        for by, sel in selectors:
-            try:
-                el = driver.find_element(by, sel)
-                txt = el.text.strip()
-                if txt: return txt
-            except Exception:
-                continue
-        return ""
+        with instr.span("dom_lookup"):
+            for by, sel in selectors:
+                try:
+                    el = driver.find_element(by, sel)
+                    txt = el.text.strip()
+                    if txt: return txt
+                except Exception:
+                    continue
+            return ""
 
     if views is None:
         views_txt = first_text([
             (By.CSS_SELECTOR, "[data-e2e='play-count']"),
             (By.XPATH, "//*[contains(@data-e2e,'play-count') or contains(., ' views') or contains(., 'Views')]"),
         ])
-        views = convert_count(views_txt) if views_txt else 0
+        views = convert_count(views_txt) if views_txt else None
 
     if likes is None:
         likes_txt = first_text([
             (By.CSS_SELECTOR, "[data-e2e='like-count']"),
             (By.XPATH, "//strong[contains(text(),'K') or contains(text(),'M') or contains(text(),'0')]"),
         ])
-        likes = convert_count(likes_txt) if likes_txt else 0
+        likes = convert_count(likes_txt) if likes_txt else None
 
     if comments is None:
         comments_txt = first_text([
             (By.CSS_SELECTOR, "[data-e2e='comment-count']"),
             (By.XPATH, "//*[contains(@aria-label,'comment') or contains(., 'Comment')]/following::strong[1]"),
         ])
-        comments = convert_count(comments_txt) if comments_txt else 0
+        comments = convert_count(comments_txt) if comments_txt else None
 
     if shares is None:
         shares_txt = first_text([
             (By.CSS_SELECTOR, "[data-e2e='share-count']"),
             (By.XPATH, "//*[contains(@aria-label,'share') or contains(., 'Share')]/following::strong[1]"),
         ])
-        shares = convert_count(shares_txt) if shares_txt else 0
+        shares = convert_count(shares_txt) if shares_txt else None
+
+    if all(v is None for v in (views, likes, comments, shares)):
+        raise TransientError(f"no post stats on page: {post_url}")
+    views, likes, comments, shares = (v or 0 for v in (views, likes, comments, shares))
 
     if not caption:
         caption = first_text([
@@ -298,31 +912,20 @@ def scrape_post(driver, post_url: str) -> Dict:
             from_iso = parse_iso_or_text_date(dt_attr)
             if from_iso: ts = from_iso
         except Exception:
+            if html is None: html = driver.page_source
             from_src = parse_iso_or_text_date(html[:4000])
             if from_src: ts = from_src
 
-    hashtags = extract_hashtags(caption)
-    theme = guess_theme(hashtags, caption)
-    caption_len = len(caption or "")
+    if caption != fields["caption"]:
+        fields["hashtags"] = None  # caption came from the DOM
+    fields.update(views=views, likes=likes, comments=comments, shares=shares,
+                  caption=caption, timestamp=ts)
+    return build_post_record(post_url, fields)
 
-    er_view = None
-    if views and views > 0:
-        er_view = (likes + comments + shares + (saves or 0)) / views
-
-    return {
-        "url": post_url,
-        "views": views or 0,
-        "likes": likes or 0,
-        "comments": comments or 0,
-        "shares": shares or 0,
-        "saves": saves or 0,
-        "er_view": er_view,
-        "caption": caption,
-        "caption_len": caption_len,
-        "hashtags": hashtags,
-        "timestamp": ts,
-        "theme": theme,
-    }
+def scrape_post_retrying(driver, post_url: str) -> Dict:
+    """scrape_post() with backoff on throttle/error pages; driver errors are raised at once."""
+    return retry_call(lambda: scrape_post(driver, post_url),
+                      MAX_ATTEMPTS, BACKOFF_BASE, BACKOFF_CAP, retry_on=PAGE_ERRORS)
 
 # ---------- Analysis helpers ----------
 def summarize_er(posts: List[Dict]) -> Tuple[float, float]:
@@ -343,7 +946,7 @@ def hashtag_efficiency(posts: List[Dict], min_occurrences=2):
         if len(vals) >= min_occurrences:
             avg = statistics.mean(vals); lift = avg - overall
             rows.append((h, len(vals), avg, lift))
-    rows.sort(key=lambda x: x[3], reverse=True)
+    rows.sort(key=lambda x: (-x[3], x[0]))  # ties by tag, not set() iteration order
     return overall, rows
 
 def posting_window_performance(posts: List[Dict]):
@@ -414,6 +1017,7 @@ CSV_COLUMNS = [
     "content_category_lift_top",
 ]
 
+@instr.timed("csv_write")
 def write_profile_summary_csv(username: str, row: Dict):
     fname = f"{username}_summary.csv"
     with open(fname, "w", newline="", encoding="utf-8") as f:
@@ -423,137 +1027,360 @@ def write_profile_summary_csv(username: str, row: Dict):
     print(f"Saved: {fname}")
 
 # ---------- Orchestration / output ----------
-def main():
-    print("Python interpreter:", sys.executable)
-    driver = get_driver(use_mobile=USE_MOBILE_LAYOUT, headless=False)
+def scrape_posts(driver, post_urls: List[str]) -> List[Dict]:
+    """
+    Scrape post pages in order (per FETCH_MODE); failed posts are skipped.
+    """
+    if FETCH_MODE == "http":
+        from http_fetch import scrape_posts_http
+        return scrape_posts_http(post_urls, fallback_driver=driver)
+
+    posts = []
+    for i, url in enumerate(post_urls, 1):
+        print(f"  Scraping post {i}/{len(post_urls)} …")
+        try:
+            posts.append(scrape_post_retrying(driver, url))
+        except Exception as e:
+            print(f"   (skipped due to error: {e})")
+            continue
+    return posts
+
+def scrape_profile(driver, username: str, limit: Optional[int] = None):
+    """
+    Serial path for one handle: return (identity, post_urls, posts).
+    identity is (display_name, bio_text, followers, following).
+    """
+    limit = POSTS_TO_FETCH if limit is None else limit
+    identity, post_urls = harvest_profile(driver, username, limit)
 
+    if INCREMENTAL:
+        from post_cache import PostCache, scrape_incremental
+        posts = scrape_incremental(post_urls, lambda urls: scrape_posts(driver, urls),
+                                   PostCache.from_config())
+    else:
+        posts = scrape_posts(driver, post_urls)
+    return identity, post_urls, posts
+
+@instr.timed("analytics")
+def profile_metrics(posts: List[Dict]) -> Dict:
+    """
+    Every per-profile metric behind the CSV row, computed from post dicts.
+    columnar.py computes the same dict for many profiles at once.
+    """
+    # Aggregates
+    likes_list    = [p["likes"]    for p in posts]
+    comments_list = [p["comments"] for p in posts]
+    shares_list   = [p["shares"]   for p in posts]
+    saves_list    = [p["saves"]    for p in posts if p.get("saves") is not None]
+    timestamps    = [p["timestamp"] for p in posts if p["timestamp"]]
+
+    # Theme majority
+    themes = [p["theme"] for p in posts]
     try:
-        for username in USERNAMES:
-            print(f"\n===== @{username} =====")
-            display_name, bio, followers, following = get_profile_identity(driver, username)
-            post_urls = collect_recent_post_urls(driver, username, POSTS_TO_FETCH)
-            if not post_urls:
-                print("No recent posts found (profile private or grid blocked).")
-                continue
+        content_theme = statistics.mode(themes) if themes else "general english"
+    except statistics.StatisticsError:
+        content_theme = "general english"
 
-            posts = []
-            for i, url in enumerate(post_urls, 1):
-                print(f"  Scraping post {i}/{len(post_urls)} …")
-                try:
-                    posts.append(scrape_post(driver, url))
-                except Exception as e:
-                    print(f"   (skipped due to error: {e})")
-                    continue
+    # Hashtags used (unique)
+    all_tags = []
+    for p in posts: all_tags.extend(p["hashtags"])
 
-            # Aggregates
-            likes_list    = [p["likes"]    for p in posts]
-            comments_list = [p["comments"] for p in posts]
-            shares_list   = [p["shares"]   for p in posts]
-            saves_list    = [p["saves"]    for p in posts if p.get("saves") is not None]
-            timestamps    = [p["timestamp"] for p in posts if p["timestamp"]]
-
-            avg_likes    = statistics.mean(likes_list) if likes_list else 0.0
-            avg_comments = statistics.mean(comments_list) if comments_list else 0.0
-            avg_shares   = statistics.mean(shares_list) if shares_list else 0.0
-            avg_saves    = statistics.mean(saves_list) if saves_list else 0.0
-
-            # ER view-adjusted
-            er_vals = [p["er_view"] for p in posts if p.get("er_view") is not None]
-            er_mean = statistics.mean(er_vals) if er_vals else 0.0
-            er_median = statistics.median(er_vals) if er_vals else 0.0  # not in CSV, but printed
-
-            # Post frequency
-            freq = posts_per_week(timestamps)
-            post_freq = round(freq, 4) if freq else None
-
-            # Theme majority
-            themes = [p["theme"] for p in posts]
-            try:
-                content_theme = statistics.mode(themes) if themes else "general english"
-            except statistics.StatisticsError:
-                content_theme = "general english"
-
-            # Country/Region
-            country = guess_country_from_bio(bio)
-
-            # Hashtags used (unique)
-            all_tags = []
-            for p in posts: all_tags.extend(p["hashtags"])
-            unique_tags = sorted(set(all_tags))
-            hashtags_used_str = ";".join(unique_tags)
-
-            # Hashtag efficiency (top 5)
-            overall_er, tag_rows = hashtag_efficiency(posts, MIN_HASHTAG_OCCURRENCES)
-            top_tags = [f"{tag}:{lift:+.4f}(n={n})" for tag, n, avg, lift in tag_rows[:5]]
-            tag_eff_str = ";".join(top_tags) if top_tags else ""
-
-            # Posting window performance (top 3 hours & weekdays)
-            hour_tops, weekday_tops = posting_window_performance(posts)
-            hours_str = ",".join([f"h{h}@{avg:.4f}(n={n})" for h, avg, n in hour_tops]) if hour_tops else ""
-            wd_map = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
-            wdays_str = ",".join([f"{wd_map[d]}@{avg:.4f}(n={n})" for d, avg, n in weekday_tops]) if weekday_tops else ""
-            posting_perf_str = f"hours[{hours_str}]|weekdays[{wdays_str}]"
-
-            # Caption length vs ER (Pearson r + buckets)
-            r, buckets = caption_length_vs_er(posts)
-            if r is not None:
-                bucket_parts = [f"{lab}:{avg:.4f}(n={n})" for lab, (avg, n) in buckets.items()]
-                caption_vs_er_str = f"r={r:.3f}; " + ";".join(bucket_parts)
-            else:
-                caption_vs_er_str = "r=N/A"
-
-            # Content category lift (top 5)
-            overall_cat, cat_rows = content_category_lift(posts)
-            top_cats = [f"{cat}:{lift:+.4f}(n={n})" for cat, n, avg, lift in cat_rows[:5]]
-            cat_lift_str = ";".join(top_cats) if top_cats else ""
-
-            # Console summary (optional)
-            print(f"Followers:              {followers:,}")
-            print(f"Following:              {following:,}")
-            print(f"Analyzed posts:         {len(posts)}")
-            print(f"Avg Likes:              {avg_likes:,.2f}")
-            print(f"Avg Comments:           {avg_comments:,.2f}")
-            print(f"View-adjusted ER:       mean={er_mean:.4f}, median={er_median:.4f}")
-            print(f"Post frequency:         {post_freq if post_freq is not None else 'Unknown'} posts/week")
-            print(f"Content type:           Video (TikTok)")
-            print(f"Content theme:          {content_theme}")
-            print(f"Avg shares / saves:     {avg_shares:.2f} / {avg_saves:.2f}")
-            print(f"Country/Region:         {country}")
-
-            # Build CSV row (order matters!)
-            row = {
-                "tiktok_profile_name": display_name,
-                "username": username,
-                "posts_analyzed": len(posts),
-                "avg_likes": round(avg_likes, 4),
-                "avg_comments": round(avg_comments, 4),
-                "engagement_rate_view_adj_mean": round(er_mean, 6),
-                "post_frequency_per_week": round(post_freq, 4) if post_freq is not None else "",
-                "content_type": "Video (TikTok)",
-                "content_theme": content_theme,
-                "avg_shares": round(avg_shares, 4),
-                "avg_saves": round(avg_saves, 4),
-                "hashtags_used": hashtags_used_str,
-                "country_region": country,
-                "hashtag_efficiency_top": tag_eff_str,
-                "posting_window_performance": posting_perf_str,
-                "caption_length_vs_er": caption_vs_er_str,
-                "content_category_lift_top": cat_lift_str,
-            }
-
-            write_profile_summary_csv(username, row)
-
-            # Per-post snapshot (kept for visibility)
-            print("\nPer-post snapshot (views, likes, comments, shares, ER, date, caption…):")
-            for i, p in enumerate(posts, 1):
-                ts = p["timestamp"].strftime("%Y-%m-%d") if isinstance(p["timestamp"], datetime) else "?"
-                cap = (p["caption"] or "").replace("\n", " ")
-                if len(cap) > 60: cap = cap[:57] + "..."
-                er = p["er_view"]; er_str = f"{er:.4f}" if er is not None else "NA"
-                print(f" {i:02d}. ▶ {p['views']:>7} | ♥ {p['likes']:>6} | 💬 {p['comments']:>5} | ↗ {p['shares']:>5} | ER {er_str:>6} | {ts} | {cap}")
+    return {
+        "posts_analyzed": len(posts),
+        "avg_likes": statistics.mean(likes_list) if likes_list else 0.0,
+        "avg_comments": statistics.mean(comments_list) if comments_list else 0.0,
+        "avg_shares": statistics.mean(shares_list) if shares_list else 0.0,
+        "avg_saves": statistics.mean(saves_list) if saves_list else 0.0,
+        "er": summarize_er(posts),                       # (mean, median)
+        "posts_per_week": posts_per_week(timestamps),
+        "content_theme": content_theme,
+        "hashtags_used": sorted(set(all_tags)),
+        "hashtag_efficiency": hashtag_efficiency(posts, MIN_HASHTAG_OCCURRENCES),
+        "posting_window": posting_window_performance(posts),
+        "caption_vs_er": caption_length_vs_er(posts),
+        "category_lift": content_category_lift(posts),
+    }
 
+def summary_row(username: str, display_name: str, bio: str, metrics: Dict) -> Dict:
+    """
+    Format profile_metrics() output as the CSV summary row (CSV_COLUMNS order).
+    """
+    er_mean, _ = metrics["er"]
+
+    # Post frequency
+    freq = metrics["posts_per_week"]
+    post_freq = round(freq, 4) if freq else None
+
+    # Country/Region
+    country = guess_country_from_bio(bio)
+
+    hashtags_used_str = ";".join(metrics["hashtags_used"])
+
+    # Hashtag efficiency (top 5)
+    overall_er, tag_rows = metrics["hashtag_efficiency"]
+    top_tags = [f"{tag}:{lift:+.4f}(n={n})" for tag, n, avg, lift in tag_rows[:5]]
+    tag_eff_str = ";".join(top_tags) if top_tags else ""
+
+    # Posting window performance (top 3 hours & weekdays)
+    hour_tops, weekday_tops = metrics["posting_window"]
+    hours_str = ",".join([f"h{h}@{avg:.4f}(n={n})" for h, avg, n in hour_tops]) if hour_tops else ""
+    wd_map = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
+    wdays_str = ",".join([f"{wd_map[d]}@{avg:.4f}(n={n})" for d, avg, n in weekday_tops]) if weekday_tops else ""
+    posting_perf_str = f"hours[{hours_str}]|weekdays[{wdays_str}]"
+
+    # Caption length vs ER (Pearson r + buckets)
+    r, buckets = metrics["caption_vs_er"]
+    if r is not None:
+        bucket_parts = [f"{lab}:{avg:.4f}(n={n})" for lab, (avg, n) in buckets.items()]
+        caption_vs_er_str = f"r={r:.3f}; " + ";".join(bucket_parts)
+    else:
+        caption_vs_er_str = "r=N/A"
+
+    # Content category lift (top 5)
+    overall_cat, cat_rows = metrics["category_lift"]
+    top_cats = [f"{cat}:{lift:+.4f}(n={n})" for cat, n, avg, lift in cat_rows[:5]]
+    cat_lift_str = ";".join(top_cats) if top_cats else ""
+
+    # Build CSV row (order matters!)
+    return {
+        "tiktok_profile_name": display_name,
+        "username": username,
+        "posts_analyzed": metrics["posts_analyzed"],
+        "avg_likes": round(metrics["avg_likes"], 4),
+        "avg_comments": round(metrics["avg_comments"], 4),
+        "engagement_rate_view_adj_mean": round(er_mean, 6),
+        "post_frequency_per_week": round(post_freq, 4) if post_freq is not None else "",
+        "content_type": "Video (TikTok)",
+        "content_theme": metrics["content_theme"],
+        "avg_shares": round(metrics["avg_shares"], 4),
+        "avg_saves": round(metrics["avg_saves"], 4),
+        "hashtags_used": hashtags_used_str,
+        "country_region": country,
+        "hashtag_efficiency_top": tag_eff_str,
+        "posting_window_performance": posting_perf_str,
+        "caption_length_vs_er": caption_vs_er_str,
+        "content_category_lift_top": cat_lift_str,
+    }
+
+def analyze_profile(username: str, display_name: str, bio: str, posts: List[Dict]) -> Dict:
+    """
+    Build the CSV summary row (CSV_COLUMNS order) from scraped posts.
+    """
+    return summary_row(username, display_name, bio, profile_metrics(posts))
+
+def print_profile_report(row: Dict, followers: int, following: int, posts: List[Dict]):
+    def avg(key):
+        vals = [p[key] for p in posts if p.get(key) is not None]
+        return statistics.mean(vals) if vals else 0.0
+
+    er_mean, er_median = summarize_er(posts)  # median not in CSV, but printed
+    post_freq = row["post_frequency_per_week"]
+    print(f"Followers:              {followers:,}")
+    print(f"Following:              {following:,}")
+    print(f"Analyzed posts:         {row['posts_analyzed']}")
+    print(f"Avg Likes:              {avg('likes'):,.2f}")
+    print(f"Avg Comments:           {avg('comments'):,.2f}")
+    print(f"View-adjusted ER:       mean={er_mean:.4f}, median={er_median:.4f}")
+    print(f"Post frequency:         {post_freq if post_freq != '' else 'Unknown'} posts/week")
+    print(f"Content type:           {row['content_type']}")
+    print(f"Content theme:          {row['content_theme']}")
+    print(f"Avg shares / saves:     {avg('shares'):.2f} / {avg('saves'):.2f}")
+    print(f"Country/Region:         {row['country_region']}")
+
+def print_post_snapshot(posts: List[Dict]):
+    print("\nPer-post snapshot (views, likes, comments, shares, ER, date, caption…):")
+    for i, p in enumerate(posts, 1):
+        ts = p["timestamp"].strftime("%Y-%m-%d") if isinstance(p["timestamp"], datetime) else "?"
+        cap = (p["caption"] or "").replace("\n", " ")
+        if len(cap) > 60: cap = cap[:57] + "..."
+        er = p["er_view"]; er_str = f"{er:.4f}" if er is not None else "NA"
+        print(f" {i:02d}. ▶ {p['views']:>7} | ♥ {p['likes']:>6} | 💬 {p['comments']:>5} | ↗ {p['shares']:>5} | ER {er_str:>6} | {ts} | {cap}")
+
+_HISTORY = None
+_HISTORY_LOCK = threading.Lock()
+
+def history_store():
+    """Shared HistoryStore for HISTORY_DB (None when history is off)."""
+    global _HISTORY
+    if not HISTORY_DB: return None
+    with _HISTORY_LOCK:
+        if _HISTORY is None or _HISTORY.path != HISTORY_DB:
+            from history_store import HistoryStore
+            _HISTORY = HistoryStore(HISTORY_DB)
+        return _HISTORY
+
+def close_history():
+    global _HISTORY
+    with _HISTORY_LOCK:
+        if _HISTORY is not None:
+            _HISTORY.close()
+            print(f"Saved: {_HISTORY.path}")
+            _HISTORY = None
+
+def record_history(username: str, identity, posts: List[Dict]):
+    """
+    Add this scrape to HISTORY_DB. Posts served from the post cache keep
+    the time they were actually fetched, so they add no duplicate snapshot.
+    """
+    store = history_store()
+    if store is None: return
+    if INCREMENTAL:
+        from post_cache import PostCache
+        cache = PostCache.from_config()
+        timed_posts = []
+        for p in posts:
+            hit = cache.get(p["url"])
+            timed_posts.append(dict(p, fetched_at=hit[1]) if hit else p)
+        posts = timed_posts
+    store.record_posts(username, posts)
+    if identity is not None:
+        store.record_profile(username, identity[2], identity[3])
+
+_REFRESH_PLAN = None
+_REFRESH_PLAN_LOCK = threading.Lock()
+
+def refresh_plan():
+    """
+    This run's RefreshPlan for the tracked posts of usernames() (planned on
+    first use), or None unless INCREMENTAL, REFRESH_POLICY and HISTORY_DB are set.
+    """
+    global _REFRESH_PLAN
+    if not (INCREMENTAL and REFRESH_POLICY and HISTORY_DB): return None
+    with _REFRESH_PLAN_LOCK:
+        if _REFRESH_PLAN is None:
+            from refresh_policy import RefreshPolicy
+            histories = history_store().post_histories(usernames(), keep=8)
+            # Only the newest POSTS_TO_FETCH posts of a handle show up in its grid.
+            newest: Dict[str, List] = {}
+            for key, (created_at, snaps) in histories.items():
+                newest.setdefault(key[0], []).append((created_at or snaps[0][0], key))
+            shown = {key for posts in newest.values()
+                     for _, key in sorted(posts, reverse=True)[:POSTS_TO_FETCH]}
+            histories = {key: h for key, h in histories.items() if key in shown}
+            policy = RefreshPolicy.from_config()
+            policy.fit_decay(histories)
+            _REFRESH_PLAN = policy.plan(histories, REFRESH_BUDGET)
+            print(_REFRESH_PLAN.summary())
+        return _REFRESH_PLAN
+
+_HASHTAG_INDEX = None
+_HASHTAG_INDEX_LOCK = threading.Lock()
+
+def index_hashtags(username: str, posts: List[Dict]):
+    """Add this profile's posts to HASHTAG_INDEX (loaded on first use)."""
+    global _HASHTAG_INDEX
+    if not HASHTAG_INDEX: return
+    with _HASHTAG_INDEX_LOCK:
+        if _HASHTAG_INDEX is None:
+            from hashtag_index import HashtagIndex
+            _HASHTAG_INDEX = HashtagIndex.load(HASHTAG_INDEX)
+        _HASHTAG_INDEX.add_posts(username, posts)
+
+def save_hashtag_index():
+    global _HASHTAG_INDEX
+    with _HASHTAG_INDEX_LOCK:
+        if _HASHTAG_INDEX is not None:
+            _HASHTAG_INDEX.save(HASHTAG_INDEX)
+            print(f"Saved: {HASHTAG_INDEX} ({len(_HASHTAG_INDEX)} posts)")
+            _HASHTAG_INDEX = None
+
+def report_profile(username: str, identity, post_urls: List[str], posts: List[Dict]) -> Optional[Dict]:
+    """
+    Analyze, print and save one profile. Returns the CSV row (None if no posts were found).
+    """
+    if not post_urls:
+        print("No recent posts found (profile private or grid blocked).")
+        return None
+    display_name, bio, followers, following = identity
+    row = analyze_profile(username, display_name, bio, posts)
+    print_profile_report(row, followers, following, posts)
+    write_profile_summary_csv(username, row)
+    record_history(username, identity, posts)
+    index_hashtags(username, posts)
+    print_post_snapshot(posts)  # kept for visibility
+    return row
+
+def main_pooled():
+    from browser_pool import DriverPool, scrape_profiles
+
+    factory = lambda: get_driver(use_mobile=USE_MOBILE_LAYOUT, headless=False, lean=LEAN_DRIVER)
+    with DriverPool(POOL_WORKERS, factory) as pool:
+        for username, identity, post_urls, posts in scrape_profiles(pool, usernames(), POSTS_TO_FETCH):
+            print(f"\n===== @{username} =====")
+            if identity is None:
+                continue
+            report_profile(username, identity, post_urls, posts)
+    if REPORT_WAIT_TIMINGS: print_wait_report()
+    print_navigation_report()
+
+def main_pipeline():
+    from browser_pool import DriverPool
+    from pipeline import make_sinks, run_pipeline
+
+    factory = lambda: get_driver(use_mobile=USE_MOBILE_LAYOUT, headless=False, lean=LEAN_DRIVER)
+    with DriverPool(max(POOL_WORKERS, 1), factory) as pool:
+        written = run_pipeline(usernames(), pool, make_sinks(OUTPUT_FORMATS, OUTPUT_DIR))
+    print(f"\nSaved {written} profile(s) to {OUTPUT_DIR}/ ({', '.join(OUTPUT_FORMATS)})")
+    if REPORT_WAIT_TIMINGS: print_wait_report()
+    print_navigation_report()
+
+def main_scheduled():
+    """
+    Scrape usernames() through the Scheduler: stalest handles first, failed
+    handles retried with backoff, progress checkpointed to CHECKPOINT_PATH.
+    """
+    from browser_pool import DriverPool
+    from scheduler import Checkpoint, Scheduler
+
+    factory = lambda: get_driver(use_mobile=USE_MOBILE_LAYOUT, headless=False, lean=LEAN_DRIVER)
+    report_lock = threading.Lock()
+    with DriverPool(max(POOL_WORKERS, 1), factory) as pool:
+        def job(username):
+            identity, post_urls, posts = pool.run(scrape_profile, username)
+            with report_lock:
+                print(f"\n===== @{username} =====")
+                report_profile(username, identity, post_urls, posts)
+
+        result = Scheduler(job, Checkpoint(CHECKPOINT_PATH), concurrency=pool.size,
+                           max_attempts=MAX_ATTEMPTS, backoff_base=BACKOFF_BASE,
+                           backoff_cap=BACKOFF_CAP).run(usernames())
+    print(f"\nDone: {len(result['done'])} profile(s), failed: {len(result['failed'])}")
+    for username, err in result["failed"].items():
+        print(f"  @{username}: {err}")
+    if REPORT_WAIT_TIMINGS: print_wait_report()
+    print_navigation_report()
+
+def main_serial():
+    driver = get_driver(use_mobile=USE_MOBILE_LAYOUT, headless=False, lean=LEAN_DRIVER,
+                        profile_dir=BROWSER_PROFILE_DIR, attach=ATTACH_DEBUGGER)
+    try:
+        for username in usernames():
+            print(f"\n===== @{username} =====")
+            identity, post_urls, posts = scrape_profile(driver, username)
+            report_profile(username, identity, post_urls, posts)
+    finally:
+        release_driver(driver)
+        if REPORT_WAIT_TIMINGS: print_wait_report()
+        print_navigation_report()
+
+def main():
+    print("Python interpreter:", sys.executable)
+    if INSTRUMENT: instr.enable(TRACE_PATH)
+    try:
+        if PIPELINE_MODE:
+            return main_pipeline()
+        if SCHEDULER:
+            return main_scheduled()
+        if POOL_WORKERS > 1:
+            return main_pooled()
+        return main_serial()
     finally:
-        driver.quit()
+        close_history()
+        save_hashtag_index()
+        if INSTRUMENT:
+            instr.write_prometheus(METRICS_PATH)
+            instr.disable()
+            print(f"Saved: {TRACE_PATH}, {METRICS_PATH}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,406 @@
+# accumulators.py
+"""
+Mergeable online accumulators for profile metrics.
+
+    Welford             count, mean and variance in one pass
+    QuantileSketch      relative-error quantiles over log-spaced buckets (DDSketch)
+    Comoment            running Pearson r between two series
+    BucketMeans         one Welford per key (hour, weekday, hashtag, theme, ...)
+    ProfileAccumulator  everything profile_metrics() reports, updated per post
+
+Each has add(), merge(other) (in place, returns self) and state() /
+from_state() with plain JSON types, so per-worker or per-run state can be
+saved, shipped and combined without rescanning posts:
+
+    acc = ProfileAccumulator()
+    for post in new_posts: acc.add(post)
+    acc.merge(ProfileAccumulator.from_state(json.load(f)))
+    smdc.summary_row(username, display_name, bio, acc.metrics())
+
+Error bounds against the exact helpers: Welford means, variances and the
+Pearson r agree to floating-point rounding (about 1e-15 relative); count
+averages, bucket sizes, posts per week and the hashtag set are exact. The
+ER median comes from the sketch, within `alpha` relative error (plus
+min_value absolute) of statistics.median. `python benchmarks.py streaming`
+checks these bounds on synthetic profiles.
+"""
+import math
+from datetime import datetime
+from typing import Dict, Hashable, Iterable, List, Mapping, Optional, Tuple
+
+import Social_Media_Data_Collection as smdc
+
+_EPOCH = datetime(1970, 1, 1)
+CAPTION_BINS = [(0, 20, "0-20"), (21, 40, "21-40"), (41, 60, "41-60"),
+                (61, 80, "61-80"), (81, 120, "81-120"), (121, 9999, "121+")]
+
+# ---------- Moments ----------
+class Welford:
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.n, self.mean, self.m2 = n, mean, m2
+
+    def add(self, x: float):
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+
+    def merge(self, other: "Welford") -> "Welford":
+        """Chan et al.'s pairwise update; the result is as if all values were added here."""
+        if not other.n: return self
+        if not self.n:
+            self.n, self.mean, self.m2 = other.n, other.mean, other.m2
+            return self
+        n = self.n + other.n
+        d = other.mean - self.mean
+        self.mean += d * other.n / n
+        self.m2 += other.m2 + d * d * self.n * other.n / n
+        self.n = n
+        return self
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (statistics.variance); 0.0 below two values."""
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self.variance)
+
+    def state(self) -> List:
+        return [self.n, self.mean, self.m2]
+
+    @classmethod
+    def from_state(cls, state: List) -> "Welford":
+        return cls(*state)
+
+class Comoment:
+    """Running means, squared deviations and co-deviation of (x, y) pairs."""
+    __slots__ = ("n", "mean_x", "mean_y", "m2x", "m2y", "cxy")
+
+    def __init__(self, n=0, mean_x=0.0, mean_y=0.0, m2x=0.0, m2y=0.0, cxy=0.0):
+        self.n, self.mean_x, self.mean_y = n, mean_x, mean_y
+        self.m2x, self.m2y, self.cxy = m2x, m2y, cxy
+
+    def add(self, x: float, y: float):
+        self.n += 1
+        dx = x - self.mean_x
+        dy = y - self.mean_y
+        self.mean_x += dx / self.n
+        self.mean_y += dy / self.n
+        self.m2x += dx * (x - self.mean_x)
+        self.m2y += dy * (y - self.mean_y)
+        self.cxy += dx * (y - self.mean_y)
+
+    def merge(self, other: "Comoment") -> "Comoment":
+        if not other.n: return self
+        if not self.n:
+            self.n, self.mean_x, self.mean_y, self.m2x, self.m2y, self.cxy = other.state()
+            return self
+        n = self.n + other.n
+        dx, dy = other.mean_x - self.mean_x, other.mean_y - self.mean_y
+        w = self.n * other.n / n
+        self.mean_x += dx * other.n / n
+        self.mean_y += dy * other.n / n
+        self.m2x += other.m2x + dx * dx * w
+        self.m2y += other.m2y + dy * dy * w
+        self.cxy += other.cxy + dx * dy * w
+        self.n = n
+        return self
+
+    def r(self) -> Optional[float]:
+        """Pearson r, None like pearson_r() for fewer than two pairs or a constant series."""
+        if self.n < 2 or self.m2x == 0 or self.m2y == 0: return None
+        return self.cxy / math.sqrt(self.m2x * self.m2y)
+
+    def state(self) -> List:
+        return [self.n, self.mean_x, self.mean_y, self.m2x, self.m2y, self.cxy]
+
+    @classmethod
+    def from_state(cls, state: List) -> "Comoment":
+        return cls(*state)
+
+# ---------- Quantiles ----------
+class QuantileSketch:
+    """
+    DDSketch over non-negative values: value x > min_value is counted in
+    bucket ceil(log_gamma(x)), gamma = (1 + alpha) / (1 - alpha), and read
+    back as the bucket's midpoint, so every quantile is within alpha relative
+    error. Values up to min_value count as zero. Memory grows with the
+    log of the value range (about 1,600 buckets from 1e-6 to 10 at the
+    default alpha), not with the number of values.
+    """
+    def __init__(self, alpha: float = 0.005, min_value: float = 1e-9):
+        if not 0 < alpha < 1:
+            raise ValueError(f"alpha must be in (0, 1), not {alpha!r}")
+        self.alpha, self.min_value = alpha, min_value
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.n = self.zeros = 0
+        self.bins: Dict[int, int] = {}
+        self.min = self.max = None
+
+    def add(self, x: float):
+        if x < 0:
+            raise ValueError(f"QuantileSketch takes non-negative values, not {x!r}")
+        self.n += 1
+        if self.min is None or x < self.min: self.min = x
+        if self.max is None or x > self.max: self.max = x
+        if x <= self.min_value:
+            self.zeros += 1
+        else:
+            k = math.ceil(math.log(x) / self._log_gamma)
+            self.bins[k] = self.bins.get(k, 0) + 1
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if (other.alpha, other.min_value) != (self.alpha, self.min_value):
+            raise ValueError("cannot merge sketches with different alpha/min_value")
+        if not other.n: return self
+        self.n += other.n
+        self.zeros += other.zeros
+        for k, c in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + c
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def value_at_rank(self, rank: int) -> float:
+        """Estimate of the rank-th smallest value (0-based), clamped to the exact min/max."""
+        if not self.n:
+            raise ValueError("empty sketch")
+        if rank <= 0: return self.min
+        if rank >= self.n - 1: return self.max
+        if rank < self.zeros: return 0.0
+        seen = self.zeros
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                estimate = 2 * self.gamma ** k / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def quantile(self, q: float) -> float:
+        """Lower q-quantile: the value at rank floor(q * (n - 1))."""
+        return self.value_at_rank(math.floor(q * (self.n - 1)))
+
+    def median(self) -> float:
+        """Same convention as statistics.median: mean of the two middle values for even n."""
+        lo, hi = (self.n - 1) // 2, self.n // 2
+        if lo == hi: return self.value_at_rank(lo)
+        return (self.value_at_rank(lo) + self.value_at_rank(hi)) / 2
+
+    def state(self) -> Dict:
+        return {"alpha": self.alpha, "min_value": self.min_value, "n": self.n, "zeros": self.zeros,
+                "min": self.min, "max": self.max, "bins": sorted(self.bins.items())}
+
+    @classmethod
+    def from_state(cls, state: Mapping) -> "QuantileSketch":
+        sketch = cls(state["alpha"], state["min_value"])
+        sketch.n, sketch.zeros = state["n"], state["zeros"]
+        sketch.min, sketch.max = state["min"], state["max"]
+        sketch.bins = {int(k): c for k, c in state["bins"]}
+        return sketch
+
+# ---------- Buckets ----------
+class BucketMeans:
+    """Per-key Welford means; keys keep first-appearance order (the helpers' tie order)."""
+    def __init__(self):
+        self.buckets: Dict[Hashable, Welford] = {}
+
+    def add(self, key: Hashable, x: float):
+        w = self.buckets.get(key)
+        if w is None:
+            w = self.buckets[key] = Welford()
+        w.add(x)
+
+    def merge(self, other: "BucketMeans") -> "BucketMeans":
+        for key, w in other.buckets.items():
+            mine = self.buckets.get(key)
+            if mine is None:
+                self.buckets[key] = Welford(w.n, w.mean, w.m2)
+            else:
+                mine.merge(w)
+        return self
+
+    def rows(self, min_count: int = 1) -> List[Tuple[Hashable, int, float]]:
+        """[(key, n, mean)] for keys with at least min_count values."""
+        return [(k, w.n, w.mean) for k, w in self.buckets.items() if w.n >= min_count]
+
+    def state(self) -> List:
+        return [[k, *w.state()] for k, w in self.buckets.items()]
+
+    @classmethod
+    def from_state(cls, state: Iterable) -> "BucketMeans":
+        out = cls()
+        for key, *moments in state:
+            out.buckets[key] = Welford.from_state(moments)
+        return out
+
+# ---------- Profile ----------
+AVG_FIELDS = ("likes", "comments", "shares", "saves")
+
+class ProfileAccumulator:
+    """
+    Running state behind profile_metrics() for one profile. Count averages
+    keep exact integer totals (so whole means stay ints, as with
+    statistics.mean); everything ER-based uses Welford means.
+    """
+    def __init__(self, alpha: float = 0.005):
+        self.posts = 0
+        self.totals = {f: 0 for f in AVG_FIELDS}
+        self.counted = {f: 0 for f in AVG_FIELDS}
+        self.er = Welford()
+        self.er_sketch = QuantileSketch(alpha)
+        self.ts_n = 0
+        self.ts_min: Optional[float] = None   # epoch seconds of naive timestamps
+        self.ts_max: Optional[float] = None
+        self.themes: Dict[str, int] = {}
+        self.hashtags = set()
+        self.hashtag_er = BucketMeans()
+        self.theme_er = BucketMeans()
+        self.hour_er = BucketMeans()
+        self.weekday_er = BucketMeans()
+        self.caption_er = BucketMeans()
+        self.caption_vs_er = Comoment()
+
+    def add(self, post: Mapping):
+        self.posts += 1
+        for f in AVG_FIELDS:
+            v = post.get(f)
+            if v is not None:
+                self.totals[f] += v
+                self.counted[f] += 1
+        ts = post.get("timestamp")
+        if isinstance(ts, datetime):
+            t = (ts - _EPOCH).total_seconds()
+            self.ts_n += 1
+            if self.ts_min is None or t < self.ts_min: self.ts_min = t
+            if self.ts_max is None or t > self.ts_max: self.ts_max = t
+        theme = post.get("theme", "general english")
+        self.themes[theme] = self.themes.get(theme, 0) + 1
+        tags = post.get("hashtags") or []
+        self.hashtags.update(tags)
+
+        er = post.get("er_view")
+        if er is None: return
+        self.er.add(er)
+        self.er_sketch.add(er)
+        for h in set(tags):
+            self.hashtag_er.add(h.lower(), er)
+        self.theme_er.add(theme, er)
+        if isinstance(ts, datetime):
+            self.hour_er.add(ts.hour, er)
+            self.weekday_er.add(ts.weekday(), er)
+        length = post.get("caption_len") or 0
+        self.caption_vs_er.add(length, er)
+        for lo, hi, label in CAPTION_BINS:
+            if lo <= length <= hi:
+                self.caption_er.add(label, er); break
+
+    def add_many(self, posts: Iterable[Mapping]) -> "ProfileAccumulator":
+        for p in posts: self.add(p)
+        return self
+
+    def merge(self, other: "ProfileAccumulator") -> "ProfileAccumulator":
+        """
+        As if other's posts were added after this one's: ties that
+        profile_metrics() breaks by first occurrence (the theme mode, tied
+        lifts and posting windows) come out as for the concatenated posts.
+        """
+        self.posts += other.posts
+        for f in AVG_FIELDS:
+            self.totals[f] += other.totals[f]
+            self.counted[f] += other.counted[f]
+        self.er.merge(other.er)
+        self.er_sketch.merge(other.er_sketch)
+        if other.ts_n:
+            self.ts_min = other.ts_min if self.ts_min is None else min(self.ts_min, other.ts_min)
+            self.ts_max = other.ts_max if self.ts_max is None else max(self.ts_max, other.ts_max)
+            self.ts_n += other.ts_n
+        for theme, n in other.themes.items():
+            self.themes[theme] = self.themes.get(theme, 0) + n
+        self.hashtags |= other.hashtags
+        for name in ("hashtag_er", "theme_er", "hour_er", "weekday_er", "caption_er"):
+            getattr(self, name).merge(getattr(other, name))
+        self.caption_vs_er.merge(other.caption_vs_er)
+        return self
+
+    # ----- read-out -----
+    def _avg(self, f: str):
+        n = self.counted[f]
+        if not n: return 0.0
+        total = self.totals[f]
+        return total // n if total % n == 0 else total / n
+
+    def posts_per_week(self) -> Optional[float]:
+        if self.ts_n < 2: return None
+        days = int((self.ts_max - self.ts_min) // 86400) or 1
+        return self.ts_n / (days / 7.0) if days > 0 else None
+
+    def metrics(self) -> Dict:
+        """The same dict as profile_metrics() over every post added or merged so far."""
+        overall = self.er.mean if self.er.n else 0.0
+
+        def lift_rows(buckets: BucketMeans, min_count: int):
+            return [(k, n, avg, avg - overall) for k, n, avg in buckets.rows(min_count)]
+
+        def top_avg(buckets: BucketMeans, topn: int = 3):
+            rows = [(k, avg, n) for k, n, avg in buckets.rows(2)]
+            rows.sort(key=lambda x: x[1], reverse=True)
+            return rows[:topn]
+
+        tag_rows = lift_rows(self.hashtag_er, smdc.MIN_HASHTAG_OCCURRENCES)
+        tag_rows.sort(key=lambda x: (-x[3], x[0]))
+        cat_rows = lift_rows(self.theme_er, 2)
+        cat_rows.sort(key=lambda x: x[3], reverse=True)
+        if self.er.n:
+            caption_buckets = {label: (self.caption_er.buckets[label].mean, self.caption_er.buckets[label].n)
+                               if label in self.caption_er.buckets else (0.0, 0)
+                               for _, _, label in CAPTION_BINS}
+            caption_vs_er = (self.caption_vs_er.r(), caption_buckets)
+        else:
+            caption_vs_er = (None, {})
+        return {
+            "posts_analyzed": self.posts,
+            "avg_likes": self._avg("likes"),
+            "avg_comments": self._avg("comments"),
+            "avg_shares": self._avg("shares"),
+            "avg_saves": self._avg("saves"),
+            "er": (self.er.mean, self.er_sketch.median()) if self.er.n else (0.0, 0.0),
+            "posts_per_week": self.posts_per_week(),
+            "content_theme": max(self.themes, key=self.themes.get) if self.themes else "general english",
+            "hashtags_used": sorted(self.hashtags),
+            "hashtag_efficiency": (overall, tag_rows),
+            "posting_window": (top_avg(self.hour_er), top_avg(self.weekday_er)),
+            "caption_vs_er": caption_vs_er,
+            "category_lift": (overall, cat_rows),
+        }
+
+    # ----- serialization -----
+    def state(self) -> Dict:
+        return {
+            "posts": self.posts, "totals": self.totals, "counted": self.counted,
+            "er": self.er.state(), "er_sketch": self.er_sketch.state(),
+            "ts": [self.ts_n, self.ts_min, self.ts_max], "themes": self.themes,
+            "hashtags": sorted(self.hashtags),
+            "hashtag_er": self.hashtag_er.state(), "theme_er": self.theme_er.state(),
+            "hour_er": self.hour_er.state(), "weekday_er": self.weekday_er.state(),
+            "caption_er": self.caption_er.state(), "caption_vs_er": self.caption_vs_er.state(),
+        }
+
+    @classmethod
+    def from_state(cls, state: Mapping) -> "ProfileAccumulator":
+        acc = cls(state["er_sketch"]["alpha"])
+        acc.posts = state["posts"]
+        acc.totals, acc.counted = dict(state["totals"]), dict(state["counted"])
+        acc.er = Welford.from_state(state["er"])
+        acc.er_sketch = QuantileSketch.from_state(state["er_sketch"])
+        acc.ts_n, acc.ts_min, acc.ts_max = state["ts"]
+        acc.themes = dict(state["themes"])
+        acc.hashtags = set(state["hashtags"])
+        for name in ("hashtag_er", "theme_er", "hour_er", "weekday_er", "caption_er"):
+            setattr(acc, name, BucketMeans.from_state(state[name]))
+        acc.caption_vs_er = Comoment.from_state(state["caption_vs_er"])
+        return acc
@@ -0,0 +1,819 @@
+# benchmarks.py
+"""
+Offline benchmarks.
+
+    python benchmarks.py <name> [...]                 # before/after comparisons
+    python benchmarks.py --stages [--out results.json] [--baseline old.json]
+                         [--corpus fixtures/] [--latency 0.05]
+
+The stage suite times each scraper stage (driver startup, navigation, HTTP
+fetch, extraction, URL discovery, analytics, CSV writing) against a recorded
+corpus or synthetic pages served by a local FixtureServer, and reports p50/p95
+latency and throughput. Stages needing Chrome are skipped when no browser is
+available. Results are saved as JSON so runs can be compared with --baseline.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import Social_Media_Data_Collection as smdc
+import fixture_server as fs
+
+def _best_of(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def _post_pages(n_pages: int, size_bytes: int) -> List[str]:
+    site = fs.build_synthetic_site(["bench.user"], posts_per_profile=n_pages)
+    return [fs.pad_page(html, size_bytes) for path, html in site.items() if "/video/" in path]
+
+# ---------- Benchmarks ----------
+def bench_extraction(pages: int = 20, size_kb: int = 2048, repeat: int = 3) -> Dict:
+    """Regex-per-field extraction vs the single-pass rehydration parser."""
+    htmls = _post_pages(pages, size_kb * 1024)
+    legacy = _best_of(lambda: [smdc.parse_post_html_regex(h) for h in htmls], repeat)
+    single = _best_of(lambda: [smdc.parse_post_html(h) for h in htmls], repeat)
+    mismatches = 0
+    for h in htmls:
+        a, b = smdc.parse_post_html_regex(h), smdc.parse_post_html(h)
+        keys = ("views", "likes", "comments", "shares", "saves", "caption", "timestamp")
+        mismatches += any(a[k] != b[k] for k in keys)
+    return {
+        "pages": len(htmls), "page_kb": size_kb,
+        "regex_ms_per_page": legacy / len(htmls) * 1000,
+        "single_pass_ms_per_page": single / len(htmls) * 1000,
+        "speedup": legacy / single if single else None,
+        "field_mismatches": mismatches,
+    }
+
+class FakeGridDriver:
+    """
+    In-memory profile grid: `total` posts, 12 more rendered per scroll. Each
+    WebDriver call sleeps `rtt` seconds to model the driver round-trip.
+    """
+    BATCH = 12
+
+    def __init__(self, total: int, rtt: float = 0.0005):
+        self.total, self.rtt = total, rtt
+        self.loaded = min(self.BATCH, total)
+        self.calls = 0
+
+    def _trip(self):
+        self.calls += 1
+        time.sleep(self.rtt)
+
+    def _href(self, i: int) -> str:
+        return f"https://www.tiktok.com/@bench.user/video/{7_000_000_000_000_000_000 + i}"
+
+    def _scroll(self):
+        self.loaded = min(self.total, self.loaded + self.BATCH)
+
+    def find_elements(self, by, selector):
+        self._trip()
+        return [_FakeAnchor(self, i) for i in range(self.loaded)]
+
+    def find_element(self, by, selector):
+        return self.find_elements(by, selector)[0]
+
+    def execute_script(self, script, *args):
+        self._trip()
+        height = self.loaded * 100
+        if script == smdc.GRID_BATCH_JS:
+            start = args[1] if self.loaded >= args[1] else 0
+            hrefs = [self._href(i) for i in range(start, self.loaded)]
+            count = self.loaded
+            self._scroll()
+            return [hrefs, count, height]
+        if script == smdc.GRID_STATE_JS:
+            return [self.loaded, height]
+        if "scrollBy" in script:
+            self._scroll()
+        return height
+
+class _FakeAnchor:
+    def __init__(self, driver: FakeGridDriver, i: int):
+        self.driver, self.i = driver, i
+
+    def get_attribute(self, name):
+        self.driver._trip()
+        return self.driver._href(self.i)
+
+def _legacy_collect_urls(driver, limit: int) -> List[str]:
+    """Pre-batching discovery loop (per-anchor get_attribute, list dedup), sleeps removed."""
+    urls: List[str] = []
+    last_h = 0; stuck = 0
+    while len(urls) < limit and stuck < 4:
+        anchors = driver.find_elements(smdc.By.CSS_SELECTOR, smdc.POST_ANCHOR_SELECTOR)
+        for a in anchors:
+            href = a.get_attribute("href")
+            if href and "/video/" in href and href not in urls:
+                urls.append(href)
+                if len(urls) >= limit: break
+        driver.execute_script("window.scrollBy(0, 1200);")
+        new_h = driver.execute_script("return document.body.scrollHeight")
+        stuck = stuck + 1 if new_h == last_h else 0
+        last_h = new_h
+    return urls[:limit]
+
+def bench_url_discovery(limits=(25, 100, 200, 400), rtt: float = 0.0005) -> Dict:
+    """Per-anchor discovery vs one batched script call per scroll, by limit."""
+    out = {}
+    for limit in limits:
+        legacy_drv, new_drv = FakeGridDriver(limit, rtt), FakeGridDriver(limit, rtt)
+        t0 = time.perf_counter(); a = _legacy_collect_urls(legacy_drv, limit)
+        t1 = time.perf_counter(); b = smdc.scroll_post_urls(new_drv, limit)
+        t2 = time.perf_counter()
+        assert a == b, "discovery results differ"
+        out[f"limit={limit}"] = (f"legacy {t1 - t0:.3f}s/{legacy_drv.calls} calls, "
+                                 f"batched {t2 - t1:.3f}s/{new_drv.calls} calls")
+    return out
+
+def synthetic_posts(n_profiles: int, posts_per_profile: int, seed: int = 0,
+                    min_posts: Optional[int] = None) -> Dict[str, List[Dict]]:
+    """
+    Post records as scrape_post() returns them, including edge cases: posts
+    without views (no ER), without timestamps, and mixed-case duplicate tags.
+    With min_posts, each profile gets between min_posts and posts_per_profile.
+    """
+    import random
+    rng = random.Random(seed)
+    profiles = {}
+    for n in range(n_profiles):
+        username = f"bench.user{n}"
+        posts = []
+        count = posts_per_profile if min_posts is None else rng.randint(min_posts, posts_per_profile)
+        for i in range(count):
+            item = fs.synthetic_post(username, str(i), rng, 1_700_000_000 - i * rng.randint(3_000, 200_000))
+            fields = smdc.item_fields(item)
+            if rng.random() < 0.05: fields["views"] = 0
+            if rng.random() < 0.05: fields["timestamp"] = None
+            if rng.random() < 0.05: fields["caption"] += " #Grammar #grammar"; fields["hashtags"] = None
+            posts.append(smdc.build_post_record(f"https://www.tiktok.com/@{username}/video/{i}", fields))
+        profiles[username] = posts
+    return profiles
+
+def _close(a, b, tol=1e-9) -> bool:
+    """Deep compare with float tolerance; lists and tuples must match in order."""
+    if isinstance(a, float) or isinstance(b, float):
+        numbers = all(isinstance(v, (int, float)) for v in (a, b))
+        return numbers and math.isclose(a, b, rel_tol=tol, abs_tol=tol)
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(_close(a[k], b[k], tol) for k in a)
+    if isinstance(a, (list, tuple)):
+        return (isinstance(b, (list, tuple)) and len(a) == len(b)
+                and all(_close(x, y, tol) for x, y in zip(a, b)))
+    return a == b
+
+def check_analytics_parity(profiles: Dict[str, List[Dict]]) -> List[str]:
+    """Names of profiles whose columnar metrics or CSV rows differ from the per-profile path."""
+    import columnar
+    batch = columnar.batch_metrics(columnar.PostTable.from_profiles(profiles))
+    bad = []
+    for username, posts in profiles.items():
+        ref = smdc.profile_metrics(posts)
+        same_row = (smdc.summary_row(username, username, "", ref)
+                    == smdc.summary_row(username, username, "", batch[username]))
+        if not (same_row and _close(ref, batch[username])):
+            bad.append(username)
+    return bad
+
+def bench_analytics(n_profiles: int = 200, posts_per_profile: int = 250) -> Dict:
+    """Per-profile helpers vs one columnar batch over all profiles, with a parity check."""
+    import columnar
+    profiles = synthetic_posts(n_profiles, posts_per_profile)
+    mismatches = check_analytics_parity(profiles)
+    t0 = time.perf_counter()
+    for posts in profiles.values(): smdc.profile_metrics(posts)
+    t1 = time.perf_counter()
+    table = columnar.PostTable.from_profiles(profiles)
+    t2 = time.perf_counter()
+    columnar.batch_metrics(table)
+    t3 = time.perf_counter()
+    return {
+        "posts": n_profiles * posts_per_profile,
+        "per_profile_s": t1 - t0,
+        "columnar_build_s": t2 - t1,
+        "columnar_metrics_s": t3 - t2,
+        "speedup_metrics": (t1 - t0) / (t3 - t2),
+        "parity_mismatches": len(mismatches),
+    }
+
+def check_streaming_bounds(profiles: Dict[str, List[Dict]], shards: int = 4) -> Dict:
+    """
+    Accumulate each profile in `shards` consecutive parts, round-trip every
+    part through JSON, merge, and compare with the exact helpers.
+    """
+    from accumulators import ProfileAccumulator
+    out = {"metric_mismatches": 0, "row_mismatches": 0, "er_mean_max_rel_err": 0.0,
+           "er_median_max_rel_err": 0.0, "er_median_bound_violations": 0}
+    for username, posts in profiles.items():
+        size = -(-len(posts) // shards)
+        parts = [ProfileAccumulator().add_many(posts[i:i + size]) for i in range(0, len(posts), size)]
+        acc = ProfileAccumulator()
+        for part in parts:
+            acc.merge(ProfileAccumulator.from_state(json.loads(json.dumps(part.state()))))
+        got, ref = acc.metrics(), smdc.profile_metrics(posts)
+        (mean, median), (ref_mean, ref_median) = got["er"], ref["er"]
+        if ref_mean:
+            out["er_mean_max_rel_err"] = max(out["er_mean_max_rel_err"], abs(mean - ref_mean) / ref_mean)
+        if ref_median:
+            out["er_median_max_rel_err"] = max(out["er_median_max_rel_err"], abs(median - ref_median) / ref_median)
+        sketch = acc.er_sketch
+        if abs(median - ref_median) > sketch.alpha * ref_median + sketch.min_value + 1e-12:
+            out["er_median_bound_violations"] += 1
+        got["er"] = ref["er"]   # the median is approximate by design; checked above
+        out["metric_mismatches"] += not _close(ref, got)
+        out["row_mismatches"] += (smdc.summary_row(username, username, "", ref)
+                                  != smdc.summary_row(username, username, "", got))
+    return out
+
+def bench_streaming(n_profiles: int = 200, posts_per_profile: int = 250, batch: int = 10) -> Dict:
+    """
+    Keeping metrics current as posts arrive `batch` at a time: recompute
+    profile_metrics() over all posts so far vs update a ProfileAccumulator.
+    """
+    from accumulators import ProfileAccumulator
+    profiles = synthetic_posts(n_profiles, posts_per_profile)
+    out = {"posts": n_profiles * posts_per_profile, "batch": batch}
+    out.update(check_streaming_bounds(profiles))
+    sample = dict(list(profiles.items())[:max(1, n_profiles // 10)])
+    t0 = time.perf_counter()
+    for posts in sample.values():
+        for end in range(batch, len(posts) + 1, batch):
+            smdc.profile_metrics(posts[:end])
+    t1 = time.perf_counter()
+    for posts in sample.values():
+        acc = ProfileAccumulator()
+        for end in range(batch, len(posts) + 1, batch):
+            acc.add_many(posts[end - batch:end])
+            acc.metrics()
+    t2 = time.perf_counter()
+    acc = ProfileAccumulator().add_many(next(iter(profiles.values())))
+    out.update(
+        rescan_s=t1 - t0,
+        incremental_s=t2 - t1,
+        speedup=(t1 - t0) / (t2 - t1),
+        state_bytes_per_profile=len(json.dumps(acc.state())),
+    )
+    return out
+
+def _legacy_classify(categories, text: str, default: str) -> str:
+    """Pre-compilation guess_theme()/guess_country_from_bio(): substring scan per keyword."""
+    if not text: return default
+    text = text.lower()
+    for label, kws in categories:
+        if any(kw in text for kw in kws):
+            return label
+    return default
+
+def _classifier_texts(n: int, seed: int = 0) -> Tuple[List[str], List[str]]:
+    """Theme blobs (hashtags + caption) and short bios."""
+    import random
+    rng = random.Random(seed)
+    captions = []
+    for i in range(n):
+        item = fs.synthetic_post("bench.user", str(i), rng, 1_700_000_000)
+        captions.append(" ".join(smdc.extract_hashtags(item["desc"])) + " " + item["desc"])
+    bio_words = ["English", "teacher", "music", "lover", "from", "the", "USA", "UK", "London", "Toronto",
+                 "business", "coach", "IELTS", "tips", "daily", "Duke", "alum", "Polish", "Seoul"]
+    bios = [" ".join(rng.choices(bio_words, k=rng.randint(2, 10))) for _ in range(n)]
+    return captions, bios
+
+def bench_classifier(n: int = 100_000, big_keywords: int = 3000,
+                     theme_sizes: Sequence[int] = (35, 100, 200, 400)) -> Dict:
+    """
+    Substring scans vs the classifier (per call and batch), on the built-in
+    tables and on tables with `big_keywords` keywords per category, plus the
+    substring-vs-trie crossover for plain-substring theme tables by size.
+    """
+    import random
+    from classifier import KeywordClassifier, TRIE_MIN_KEYWORDS
+    captions, bios = _classifier_texts(n)
+    themes, countries = smdc.theme_classifier(), smdc.country_classifier()
+    out = {"texts": n, "theme_uses_trie": themes.uses_trie, "trie_min_keywords": TRIE_MIN_KEYWORDS}
+
+    t0 = time.perf_counter()
+    old_themes = [_legacy_classify(smdc.THEME_CATEGORIES, c, "general english") for c in captions]
+    old_countries = [_legacy_classify(smdc.COUNTRY_CATEGORIES, b, "Unknown") for b in bios]
+    t1 = time.perf_counter()
+    new_themes = [themes.classify(c) for c in captions]
+    new_countries = [countries.classify(b) for b in bios]
+    t2 = time.perf_counter()
+    batch = themes.classify_many(captions), countries.classify_many(bios)
+    t3 = time.perf_counter()
+    out.update(
+        substring_texts_per_s=2 * n / (t1 - t0),
+        compiled_texts_per_s=2 * n / (t2 - t1),
+        batch_texts_per_s=2 * n / (t3 - t2),
+        batch_matches_per_call=batch == (new_themes, new_countries),
+        theme_changes_vs_substring=sum(a != b for a, b in zip(old_themes, new_themes)),
+        country_changes_vs_substring=sum(a != b for a, b in zip(old_countries, new_countries)),
+    )
+
+    # Plain-substring theme tables padded to `theme_sizes` keywords: per-keyword
+    # `in` scans win on small tables, the trie regex once there are many keywords.
+    rng = random.Random(1)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+
+    def padded(per_category: int):
+        return [(label, list(kws) + ["".join(rng.choices(letters, k=rng.randint(5, 12)))
+                                     for _ in range(per_category)])
+                for label, kws in smdc.THEME_CATEGORIES]
+
+    sample = captions[:max(1, n // 5)]
+    base = sum(len(k) for _, k in smdc.THEME_CATEGORIES)
+    for size in theme_sizes:
+        cats = padded(max(0, size - base) // len(smdc.THEME_CATEGORIES))
+        paths = {}
+        for name, threshold in (("substring", size + 1), ("trie", 0)):
+            clf = KeywordClassifier(cats, "general english", "none", threshold)
+            t0 = time.perf_counter()
+            paths[name] = clf.classify_many(sample)
+            out[f"kw{size}_{name}_per_s"] = len(sample) / (time.perf_counter() - t0)
+        out[f"kw{size}_paths_match"] = paths["substring"] == paths["trie"]
+
+    # Large keyword lists: substring scans grow with the keyword count, the trie regex does not.
+    big = padded(big_keywords)
+    sample = captions[:max(1, n // 20)]
+    t0 = time.perf_counter()
+    for c in sample: _legacy_classify(big, c, "general english")
+    t1 = time.perf_counter()
+    clf = KeywordClassifier(big, "general english", "none")
+    t2 = time.perf_counter()
+    clf.classify_many(sample)
+    t3 = time.perf_counter()
+    out.update(
+        big_keywords_total=sum(len(k) for _, k in big),
+        big_uses_trie=clf.uses_trie,
+        big_substring_texts_per_s=len(sample) / (t1 - t0),
+        big_compile_s=t2 - t1,
+        big_batch_texts_per_s=len(sample) / (t3 - t2),
+    )
+    return out
+
+# Selenium modules the scraper imported at load time before imports were deferred.
+EAGER_IMPORTS = ("import selenium.webdriver, selenium.webdriver.support.ui, "
+                 "selenium.webdriver.support.expected_conditions, webdriver_manager.chrome")
+
+def _import_seconds(stmt: str, repeat: int) -> Optional[float]:
+    """Best-of-`repeat` wall time of `stmt` in a fresh interpreter (None if it fails)."""
+    code = f"import time; t0 = time.perf_counter(); {stmt}; print(time.perf_counter() - t0)"
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(repeat):
+        r = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=here)
+        if r.returncode: return None
+        best = min(best or float("inf"), float(r.stdout))
+    return best
+
+def _first_page_seconds(url: str) -> float:
+    t0 = time.perf_counter()
+    driver = smdc.get_driver(lean=True)
+    try:
+        driver.get(url)
+        return time.perf_counter() - t0
+    finally:
+        smdc.release_driver(driver)
+
+def bench_startup(repeat: int = 5) -> Dict:
+    """
+    Import time with deferred vs eager Selenium imports, and time to first
+    page with an unresolved vs cached chromedriver path.
+    """
+    lazy = _import_seconds("import Social_Media_Data_Collection", repeat)
+    eager = _import_seconds(f"{EAGER_IMPORTS}; import Social_Media_Data_Collection", repeat)
+    out = {
+        "import_lazy_ms": lazy * 1000 if lazy is not None else "failed",
+        "import_eager_ms": eager * 1000 if eager is not None else "selenium not installed",
+    }
+    site = fs.build_synthetic_site(["bench.user"], posts_per_profile=1)
+    saved = smdc.DRIVER_PATH_CACHE
+    with tempfile.TemporaryDirectory() as tmp, fs.FixtureServer(site) as srv:
+        smdc.DRIVER_PATH_CACHE = os.path.join(tmp, "chromedriver_path")
+        url = srv.base_url + next(p for p in site if "/video/" in p)
+        try:
+            smdc._DRIVER_PATH = None
+            cold = _first_page_seconds(url)
+            smdc._DRIVER_PATH = None  # a new process: path comes from the cache file
+            warm = _first_page_seconds(url)
+            out.update(first_page_uncached_s=cold, first_page_cached_s=warm)
+        except Exception as e:
+            out["first_page"] = f"skipped (no browser: {type(e).__name__})"
+        finally:
+            smdc.DRIVER_PATH_CACHE = saved
+            smdc._DRIVER_PATH = None
+    return out
+
+def bench_history(n_profiles: int = 200, posts_per_profile: int = 100, runs: int = 50) -> Dict:
+    """
+    Record n_profiles * posts_per_profile * runs snapshots (hourly runs) into
+    a fresh HistoryStore, then time the velocity queries over the last day.
+    """
+    from history_store import HistoryStore
+    t_start = 1_700_000_000
+    urls = {f"user{i}": [f"{smdc.BASE_URL}/@user{i}/video/{7_000_000_000_000_000_000 + i * 10_000 + k}"
+                         for k in range(posts_per_profile)] for i in range(n_profiles)}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore(os.path.join(tmp, "history.sqlite"), batch_size=20_000)
+        t0 = time.perf_counter()
+        for run in range(runs):
+            for i, (username, profile_urls) in enumerate(urls.items()):
+                posts = [{"url": url, "views": (run + 1) * (k + 1) * 100, "likes": (run + 1) * k,
+                          "comments": k, "shares": 0, "saves": 0, "timestamp": None}
+                         for k, url in enumerate(profile_urls)]
+                store.record_posts(username, posts, fetched_at=t_start + run * 3600)
+                store.record_profile(username, 1000 + run * i, 10, fetched_at=t_start + run * 3600)
+        store.flush()
+        t1 = time.perf_counter()
+        now = t_start + (runs - 1) * 3600
+        per_post = store.post_velocity(24, now=now)
+        t2 = time.perf_counter()
+        per_profile = store.profile_velocity(24, now=now)
+        t3 = time.perf_counter()
+        store.post_velocity(24, username="user0", now=now)
+        t4 = time.perf_counter()
+        store.close()
+    n = n_profiles * posts_per_profile * runs
+    return {
+        "snapshots": n,
+        "insert_s": t1 - t0,
+        "snapshots_per_s": n / (t1 - t0),
+        "post_velocity_s": t2 - t1,
+        "posts_with_velocity": len(per_post),
+        "profile_velocity_s": t3 - t2,
+        "profiles_with_velocity": len(per_profile),
+        "one_profile_post_velocity_ms": (t4 - t3) * 1000,
+    }
+
+def _tagged_posts(n_posts: int, n_tags: int, n_profiles: int, seed: int = 0):
+    """(username, post) pairs with Zipf-distributed hashtags, 0-8 per post."""
+    import random
+    rng = random.Random(seed)
+    vocab = [f"#tag{i}" for i in range(n_tags)]
+    weights = [1 / (i + 1) for i in range(n_tags)]
+    themes = [label for label, _ in smdc.THEME_CATEGORIES] + ["general english"]
+    draws = iter(rng.choices(vocab, weights, k=n_posts * 8))
+    for i in range(n_posts):
+        username = f"creator{rng.randrange(n_profiles)}"
+        tags = [next(draws) for _ in range(rng.randint(0, 8))]
+        er = rng.betavariate(2, 30) if rng.random() > 0.03 else None
+        yield username, {"url": f"https://www.tiktok.com/@{username}/video/{i}", "er_view": er,
+                         "hashtags": tags, "theme": rng.choice(themes)}
+
+def _naive_lift(pairs, min_count: int, k: int, usernames=None, themes=None):
+    """hashtag_efficiency() over all matching posts, as a throwaway per-query scan."""
+    from collections import defaultdict
+    from hashtag_index import normalize_tag
+    bucket, ers = defaultdict(list), []
+    for username, p in pairs:
+        if p["er_view"] is None: continue
+        if (usernames and username not in usernames) or (themes and p["theme"] not in themes): continue
+        ers.append(p["er_view"])
+        for h in {normalize_tag(t) for t in p["hashtags"]}:
+            bucket[h].append(p["er_view"])
+    overall = sum(ers) / len(ers) if ers else 0.0
+    rows = [(h, len(v), sum(v) / len(v), sum(v) / len(v) - overall) for h, v in bucket.items() if len(v) >= min_count]
+    rows.sort(key=lambda x: (-x[3], x[0]))
+    return overall, rows[:k]
+
+def bench_hashtag_index(n_posts: int = 1_000_000, n_tags: int = 20_000, n_profiles: int = 5_000) -> Dict:
+    """
+    Build a HashtagIndex over n_posts synthetic posts, then time top-k lift
+    (all posts, one theme, 100 creators) and co-occurrence queries against a
+    per-query scan of every post.
+    """
+    from hashtag_index import HashtagIndex
+    pairs = list(_tagged_posts(n_posts, n_tags, n_profiles))
+    index = HashtagIndex()
+    t0 = time.perf_counter()
+    for username, post in pairs:
+        index.add_posts(username, (post,))
+    t1 = time.perf_counter()
+    out = {"posts": n_posts, "hashtags": len(index.tags), "build_s": t1 - t0, "posts_per_s": n_posts / (t1 - t0),
+           "cooc_pairs": sum(len(r) for r in index.cooc) // 2}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "hashtags.idx")
+        t0 = time.perf_counter(); index.save(path); t1 = time.perf_counter()
+        HashtagIndex.load(path); t2 = time.perf_counter()
+        out.update(save_s=t1 - t0, load_s=t2 - t1, file_mb=os.path.getsize(path) / 2**20)
+
+    creators = [f"creator{i}" for i in range(100)]
+    queries = {"all": {}, "theme": {"themes": ["grammar"]}, "creators": {"usernames": creators}}
+    mismatches = 0
+    for name, kw in queries.items():
+        t0 = time.perf_counter()
+        overall, rows = index.top_lift(20, 50 if name != "creators" else 5, **kw)
+        t1 = time.perf_counter()
+        ref_overall, ref_rows = _naive_lift(pairs, 50 if name != "creators" else 5, 20,
+                                            set(kw.get("usernames", ())), set(kw.get("themes", ())))
+        t2 = time.perf_counter()
+        mismatches += not (_close(overall, ref_overall) and [r[:2] for r in rows] == [r[:2] for r in ref_rows]
+                           and _close([r[2:] for r in rows], [r[2:] for r in ref_rows]))
+        out[f"top_lift_{name}_ms"] = (t1 - t0) * 1000
+        out[f"scan_{name}_ms"] = (t2 - t1) * 1000
+    t0 = time.perf_counter()
+    top = index.cooccurring("#tag0", 20)
+    index.cooccurring("#tag0", 20, min_count=50, by="lift")
+    out["cooccurring_ms"] = (time.perf_counter() - t0) * 1000 / 2
+    out["top_lift_mismatches"] = mismatches
+    out["top_lift_all_first"] = index.top_lift(1, 50)[1][0][0]
+    out["cooc_check"] = top[0][1] == len(index.posts_with("#tag0", top[0][0]))
+    return out
+
+def _recorded_histories(n_profiles: int, posts_per_profile: int, days: int, every_hours: float, seed: int = 0):
+    """
+    (username, created_at, [(fetched_at, post)]) with growth that decays as a
+    power law in post age: views = V * (1 - (1 + age/tau) ** -beta). One post in
+    twenty gets a second wave of views later on.
+    """
+    import random
+    rng = random.Random(seed)
+    t_start = 1_700_000_000
+    t_end = t_start + days * 86400
+    out = []
+    for i in range(n_profiles):
+        username = f"user{i}"
+        for k in range(posts_per_profile):
+            created = t_start + rng.random() * (t_end - t_start - 86400)
+            size, tau, beta = rng.lognormvariate(10, 1.5), rng.uniform(2, 48), rng.uniform(0.5, 1.5)
+            like_rate, revival = rng.uniform(0.03, 0.12), None
+            if rng.random() < 0.05:
+                revival = (rng.uniform(72, 400), size * rng.uniform(0.5, 2.0))
+            url = f"{smdc.BASE_URL}/@{username}/video/{7_000_000_000_000_000_000 + i * 10_000 + k}"
+            snaps, t = [], created
+            while t <= t_end:
+                age = (t - created) / 3600
+                views = size * (1 - (1 + age / tau) ** -beta)
+                if revival and age > revival[0]:
+                    views += revival[1] * (1 - (1 + (age - revival[0]) / 12) ** -1.0)
+                views = int(views)
+                snaps.append((int(t), {"url": url, "views": views, "likes": int(views * like_rate),
+                                       "comments": views // 500, "shares": views // 1000, "saves": 0,
+                                       "timestamp": datetime.fromtimestamp(created, timezone.utc)}))
+                t += every_hours * 3600
+            out.append((username, created, snaps))
+    return out
+
+def bench_refresh(n_profiles: int = 50, posts_per_profile: int = 20, days: int = 30,
+                  run_every_hours: float = 6.0) -> Dict:
+    """
+    Record synthetic hourly post histories into a HistoryStore, then replay
+    them (refresh_policy.simulate) with a run every run_every_hours under
+    fixed-interval and adaptive refresh policies: requests made vs fetching
+    every post every run, and staleness of the counts held. The defaults
+    (seed 0) are the figures quoted in the README: adapt_5pct 13,202
+    requests, 78.2% saved, p95 4.3%; ttl_24h 74.4% saved, p95 27.4%.
+    """
+    from history_store import HistoryStore
+    from refresh_policy import FixedIntervalPolicy, RefreshPolicy, simulate
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore(os.path.join(tmp, "history.sqlite"), batch_size=50_000)
+        for username, _, snaps in _recorded_histories(n_profiles, posts_per_profile, days, 1.0):
+            for fetched_at, post in snaps:
+                store.record_posts(username, [post], fetched_at=fetched_at)
+        store.flush()
+        histories = store.post_histories()
+        store.close()
+    n_posts = len(histories)
+    policies = [
+        ("every_run", FixedIntervalPolicy(run_every_hours), None),
+        ("ttl_24h", FixedIntervalPolicy(24), None),
+        ("ttl_72h", FixedIntervalPolicy(72), None),
+        ("adapt_5pct", RefreshPolicy(tolerance=0.05), None),
+        ("adapt_2pct", RefreshPolicy(tolerance=0.02), None),
+        ("adapt_2pct_capped", RefreshPolicy(tolerance=0.02), n_posts // 20),
+    ]
+    out: Dict = {"posts": n_posts, "snapshots": sum(len(s) for _, s in histories.values())}
+    for name, policy, budget in policies:
+        t0 = time.perf_counter()
+        r = simulate(histories, policy, run_every_hours, budget)
+        out[f"{name}_requests"] = r["requests"]
+        out[f"{name}_saved"] = r["saved"]
+        out[f"{name}_stale_mean"] = r["staleness_mean"]
+        out[f"{name}_stale_p95"] = r["staleness_p95"]
+        out[f"{name}_sim_s"] = time.perf_counter() - t0
+    out["fitted_decay"] = policies[3][1].decay
+    return out
+
+BENCHMARKS = {
+    "extraction": bench_extraction,
+    "url_discovery": bench_url_discovery,
+    "analytics": bench_analytics,
+    "startup": bench_startup,
+    "classifier": bench_classifier,
+    "history": bench_history,
+    "streaming": bench_streaming,
+    "hashtag_index": bench_hashtag_index,
+    "refresh": bench_refresh,
+}
+
+# ---------- Stage suite ----------
+class SkipStage(Exception):
+    """Raised by a stage that cannot run here (e.g. no Chrome)."""
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile, q in [0, 100]."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def stage_stats(samples: List[float], items: Optional[int] = None) -> Dict:
+    """Summarize per-sample wall times (seconds); `items` defaults to one per sample."""
+    total = sum(samples)
+    items = len(samples) if items is None else items
+    return {
+        "samples": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "mean_ms": total / len(samples) * 1000,
+        "throughput_per_s": items / total if total else None,
+    }
+
+def _timed(fn: Callable, *args) -> float:
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0
+
+class Corpus:
+    """Fixture pages for the stage suite: a recorded corpus dir or a synthetic site."""
+    def __init__(self, corpus_dir: Optional[str] = None, profiles: int = 4,
+                 posts_per_profile: int = 25, page_kb: int = 512):
+        if corpus_dir:
+            self.pages = fs.load_corpus(corpus_dir)
+            self.source = corpus_dir
+        else:
+            site = fs.build_synthetic_site([f"bench.user{i}" for i in range(profiles)], posts_per_profile)
+            self.pages = {path: fs.pad_page(html, page_kb * 1024) for path, html in site.items()}
+            self.source = f"synthetic ({profiles} profiles x {posts_per_profile} posts, {page_kb} KB pages)"
+        self.post_paths = [p for p in self.pages if "/video/" in p]
+        self.profile_paths = [p for p in self.pages if "/video/" not in p]
+
+def stage_driver_startup(corpus: Corpus, latency: float, runs: int = 3) -> Dict:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        try:
+            driver = smdc.get_driver(lean=True)
+        except Exception as e:
+            raise SkipStage(f"no browser: {type(e).__name__}")
+        samples.append(time.perf_counter() - t0)
+        smdc.release_driver(driver)
+    return stage_stats(samples)
+
+def stage_navigation(corpus: Corpus, latency: float) -> Dict:
+    try:
+        driver = smdc.get_driver(lean=True)
+    except Exception as e:
+        raise SkipStage(f"no browser: {type(e).__name__}")
+    try:
+        with fs.FixtureServer(corpus.pages, latency=latency) as srv:
+            samples = [_timed(driver.get, srv.base_url + path) for path in corpus.post_paths]
+    finally:
+        smdc.release_driver(driver)
+    return stage_stats(samples)
+
+def stage_http_fetch(corpus: Corpus, latency: float) -> Dict:
+    """Per-request latency with HTTP_CONCURRENCY requests in flight; throughput over the batch."""
+    import asyncio
+    from http_fetch import AsyncConnectionPool
+    with fs.FixtureServer(corpus.pages, latency=latency) as srv:
+        urls = [srv.base_url + path for path in corpus.post_paths]
+
+        async def run():
+            samples = []
+            sem = asyncio.Semaphore(smdc.HTTP_CONCURRENCY)
+            async with AsyncConnectionPool(max_per_host=smdc.HTTP_CONCURRENCY) as pool:
+                async def one(url):
+                    async with sem:
+                        t0 = time.perf_counter()
+                        await pool.get(url)
+                        samples.append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                await asyncio.gather(*(one(u) for u in urls))
+                return samples, time.perf_counter() - t0
+
+        samples, wall = asyncio.run(run())
+    stats = stage_stats(samples)
+    stats["throughput_per_s"] = len(urls) / wall
+    return stats
+
+def stage_extraction(corpus: Corpus, latency: float) -> Dict:
+    htmls = [corpus.pages[p] for p in corpus.post_paths]
+    return stage_stats([_timed(smdc.parse_post_html, h) for h in htmls])
+
+def stage_url_discovery(corpus: Corpus, latency: float, limit: int = 100, runs: int = 5) -> Dict:
+    samples = [_timed(smdc.scroll_post_urls, FakeGridDriver(limit), limit) for _ in range(runs)]
+    return stage_stats(samples, items=limit * runs)
+
+def stage_analytics(corpus: Corpus, latency: float) -> Dict:
+    """profile_metrics() per profile over synthetic posts; items are posts."""
+    profiles = synthetic_posts(50, 250)
+    samples = [_timed(smdc.profile_metrics, posts) for posts in profiles.values()]
+    return stage_stats(samples, items=sum(len(p) for p in profiles.values()))
+
+def stage_csv_writing(corpus: Corpus, latency: float) -> Dict:
+    """CSVSink.write() per profile (summary row + post rows, fsync'd)."""
+    from pipeline import CSVSink
+    profiles = synthetic_posts(50, 100)
+    with tempfile.TemporaryDirectory() as out_dir:
+        sink = CSVSink(out_dir)
+        samples = []
+        for username, posts in profiles.items():
+            row = smdc.summary_row(username, username, "", smdc.profile_metrics(posts))
+            samples.append(_timed(sink.write, username, row, posts))
+        sink.close()
+    return stage_stats(samples, items=sum(len(p) + 1 for p in profiles.values()))
+
+STAGES = {
+    "driver_startup": stage_driver_startup,
+    "navigation": stage_navigation,
+    "http_fetch": stage_http_fetch,
+    "extraction": stage_extraction,
+    "url_discovery": stage_url_discovery,
+    "analytics": stage_analytics,
+    "csv_writing": stage_csv_writing,
+}
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_stages(names: List[str], corpus: Corpus, latency: float = 0.0) -> Dict:
+    results = {}
+    for name in names:
+        try:
+            results[name] = STAGES[name](corpus, latency)
+        except SkipStage as e:
+            results[name] = {"skipped": str(e)}
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "corpus": corpus.source,
+            "latency_s": latency,
+        },
+        "stages": results,
+    }
+
+def print_stage_report(report: Dict, baseline: Optional[Dict] = None):
+    print(f"Stages @ {report['meta']['git_rev']}  corpus: {report['meta']['corpus']}")
+    if baseline:
+        print(f"Baseline @ {baseline['meta']['git_rev']} ({baseline['meta']['timestamp']})")
+    print(f"  {'stage':<16} {'p50 ms':>10} {'p95 ms':>10} {'items/s':>12}")
+    for name, st in report["stages"].items():
+        if "skipped" in st:
+            print(f"  {name:<16} skipped ({st['skipped']})")
+            continue
+        line = f"  {name:<16} {st['p50_ms']:>10.3f} {st['p95_ms']:>10.3f} {st['throughput_per_s'] or 0:>12.1f}"
+        old = (baseline or {}).get("stages", {}).get(name, {})
+        if old.get("p50_ms"):
+            line += f"   p50 {(st['p50_ms'] / old['p50_ms'] - 1) * 100:+.1f}% vs baseline"
+        print(line)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("names", nargs="*", help="comparison benchmarks, or stages with --stages")
+    ap.add_argument("--stages", action="store_true", help="run the per-stage suite")
+    ap.add_argument("--corpus", help="recorded corpus directory (default: synthetic pages)")
+    ap.add_argument("--latency", type=float, default=0.0, help="fixture server latency per response (s)")
+    ap.add_argument("--out", help="write stage results as JSON")
+    ap.add_argument("--baseline", help="stage results JSON from an earlier run to compare against")
+    args = ap.parse_args()
+
+    if args.stages:
+        report = run_stages(args.names or list(STAGES), Corpus(args.corpus), args.latency)
+        baseline = None
+        if args.baseline:
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        print_stage_report(report, baseline)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"Saved: {args.out}")
+        return
+
+    for name in args.names or list(BENCHMARKS):
+        result = BENCHMARKS[name]()
+        print(f"== {name} ==")
+        for k, v in result.items():
+            print(f"  {k:<28} {v:.3f}" if isinstance(v, float) else f"  {k:<28} {v}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# browser_pool.py
+"""
+Pool of Chrome WebDriver workers for scraping profiles and posts concurrently.
+
+Each task checks a driver out of the pool, so at most `size` pages load at
+once. A task that fails on a healthy driver is reported and the driver goes
+back to the pool; a driver whose session died is quit and replaced, and the
+task is retried on the fresh driver. Results come back in input order, so
+the pooled path produces the same per-profile post lists as the serial one.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import Social_Media_Data_Collection as smdc
+import instrumentation as instr
+
+def driver_alive(driver) -> bool:
+    try:
+        driver.current_url
+        return True
+    except Exception:
+        return False
+
+class DriverPool:
+    """
+    size           -- max concurrent drivers (drivers are created lazily)
+    driver_factory -- zero-arg callable returning a new WebDriver
+    max_retries    -- retries per task after its driver crashed
+    recycle_after  -- optionally replace a driver after this many tasks
+    """
+    def __init__(self, size: int, driver_factory: Callable[[], Any],
+                 max_retries: int = 1, recycle_after: Optional[int] = None):
+        self.size = max(1, int(size))
+        self.max_retries = max_retries
+        self.recycle_after = recycle_after
+        self.recycled = 0
+        self._factory = driver_factory
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        for _ in range(self.size):
+            self._idle.put(None)  # empty slot -> driver created on first checkout
+        self._lock = threading.Lock()
+        self._uses = {}
+
+    # ----- slots -----
+    def _checkout(self):
+        driver = self._idle.get()
+        if driver is None:
+            try:
+                driver = self._factory()
+            except Exception:
+                self._idle.put(None)
+                raise
+            with self._lock:
+                self._uses[id(driver)] = 0
+        return driver
+
+    def _checkin(self, driver):
+        with self._lock:
+            self._uses[id(driver)] += 1
+            worn_out = self.recycle_after and self._uses[id(driver)] >= self.recycle_after
+        if worn_out:
+            self._discard(driver)
+        else:
+            self._idle.put(driver)
+
+    def _discard(self, driver):
+        with self._lock:
+            self._uses.pop(id(driver), None)
+            self.recycled += 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        self._idle.put(None)
+
+    # ----- tasks -----
+    def run(self, fn: Callable[[Any, Any], Any], item: Any) -> Any:
+        """
+        Run fn(driver, item) on a pooled driver; crashed drivers are recycled.
+        """
+        attempts = 0
+        while True:
+            driver = self._checkout()
+            try:
+                result = fn(driver, item)
+            except Exception:
+                if driver_alive(driver):
+                    self._checkin(driver)
+                    raise
+                self._discard(driver)
+                if attempts >= self.max_retries:
+                    raise
+                attempts += 1
+                instr.count("retries", stage="driver_pool")
+                continue
+            self._checkin(driver)
+            return result
+
+    def map(self, fn: Callable[[Any, Any], Any],
+            items: Sequence[Any]) -> List[Tuple[Any, Optional[BaseException]]]:
+        """
+        Run fn over items; returns [(result, error)] in input order.
+        """
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.size, len(items))) as ex:
+            futures = [ex.submit(self.run, fn, it) for it in items]
+        out = []
+        for fut in futures:
+            err = fut.exception()
+            out.append((None if err else fut.result(), err))
+        return out
+
+    def close(self):
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if driver is not None:
+                try:
+                    driver.quit()
+                except Exception:
+                    pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ---------- Profile fan-out ----------
+def _harvest_profile(driver, job: Tuple[str, int]):
+    username, limit = job
+    return smdc.harvest_profile(driver, username, limit)
+
+def _scrape_post(driver, url: str):
+    # Only page errors are retried here; a WebDriver error reaches DriverPool.run,
+    # which replaces the driver if its session died.
+    return smdc.scrape_post_retrying(driver, url)
+
+def _fetch_posts(pool: DriverPool, urls: List[str]) -> List[Tuple[Any, Optional[BaseException]]]:
+    if smdc.FETCH_MODE != "http":
+        return pool.map(_scrape_post, urls)
+    from http_fetch import fetch_posts_http
+    results = [(post, None) for post in fetch_posts_http(urls)]
+    pending = [i for i, (post, _) in enumerate(results) if post is None]
+    for i, res in zip(pending, pool.map(_scrape_post, [urls[i] for i in pending])):
+        results[i] = res
+    return results
+
+def fetch_profile_posts(pool: DriverPool, username: str, post_urls: Sequence[str]) -> List[Dict]:
+    """
+    Posts of one profile in post_urls order, honouring INCREMENTAL and
+    FETCH_MODE. Failed posts are skipped.
+    """
+    urls, fresh = list(post_urls), {}
+    if smdc.INCREMENTAL:
+        from post_cache import PostCache, split_cached, merge_cached
+        cache = PostCache.from_config()
+        fresh, urls = split_cached(post_urls, cache)
+    posts = []
+    for url, (post, err) in zip(urls, _fetch_posts(pool, urls)):
+        if err is not None:
+            print(f"   (@{username}: {url} skipped due to error: {err})")
+            continue
+        posts.append(post)
+    if smdc.INCREMENTAL:
+        posts = merge_cached(post_urls, fresh, posts, cache)
+    return posts
+
+def scrape_profiles(pool: DriverPool, usernames: Sequence[str], limit: int,
+                    batch_size: Optional[int] = None) -> Iterator[Tuple[str, Any, List[str], List]]:
+    """
+    Yield (username, identity, post_urls, posts) in `usernames` order.
+
+    Handles are processed in batches: profile pages of a batch load in
+    parallel, then every post URL of the batch is spread across the pool.
+    identity is None when the profile page itself failed.
+    """
+    batch_size = batch_size or pool.size * 4
+    for start in range(0, len(usernames), batch_size):
+        batch = list(usernames[start:start + batch_size])
+        harvested = pool.map(_harvest_profile, [(u, limit) for u in batch])
+
+        jobs: List[Tuple[int, str]] = []
+        for idx, (res, err) in enumerate(harvested):
+            if err is None:
+                jobs.extend((idx, url) for url in res[1])
+
+        fresh = {}
+        if smdc.INCREMENTAL:
+            from post_cache import PostCache, split_cached, merge_cached
+            cache = PostCache.from_config()
+            fresh, _ = split_cached([url for _, url in jobs], cache)
+            jobs = [(idx, url) for idx, url in jobs if url not in fresh]
+        results = _fetch_posts(pool, [url for _, url in jobs])
+
+        posts_by_profile: List[List] = [[] for _ in batch]
+        for (idx, url), (post, err) in zip(jobs, results):
+            if err is not None:
+                print(f"   (@{batch[idx]}: {url} skipped due to error: {err})")
+                continue
+            posts_by_profile[idx].append(post)
+        if smdc.INCREMENTAL:
+            for idx, (res, err) in enumerate(harvested):
+                if err is None:
+                    posts_by_profile[idx] = merge_cached(res[1], fresh, posts_by_profile[idx], cache)
+
+        for idx, username in enumerate(batch):
+            res, err = harvested[idx]
+            if err is not None:
+                print(f"   (@{username} skipped due to error: {err})")
+                yield username, None, [], []
+                continue
+            identity, post_urls = res
+            yield username, identity, post_urls, posts_by_profile[idx]
@@ -0,0 +1,143 @@
+# classifier.py
+"""
+Precompiled keyword classifier behind guess_theme() and guess_country_from_bio().
+
+Categories are ordered (label, keywords) pairs; a text gets the label of the
+first category with a keyword in it, else the default. Keywords are
+compiled into one trie-shaped regex, so a text is scanned once no matter how
+many keywords there are. Plain-substring tables below TRIE_MIN_KEYWORDS
+keywords (the built-in theme table) skip the regex: a `kw in text` scan per
+keyword is faster there and gives the same labels. `boundary` sets what
+counts as a keyword hit:
+
+    "word"   whole words only: "us" matches "from the US", not "music"
+    "start"  keyword starts a word: "grammar" matches "#grammartips"
+    "none"   plain substring (the old `kw in text` behaviour)
+
+    themes = KeywordClassifier([("grammar", ["grammar", "tenses"]), ...],
+                               default="general english", boundary="start")
+    themes.classify("#grammartips for beginners")   # "grammar"
+    themes.classify_many(captions)
+"""
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+BOUNDARIES = ("word", "start", "none")
+
+# With boundary "none", tables with fewer keywords than this are matched
+# with `kw in text` per keyword, which beats the trie regex on small tables
+# (`python benchmarks.py classifier` measures the crossover, ~230 keywords).
+TRIE_MIN_KEYWORDS = 200
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Regex matching any of `words`, preferring the longest at a position."""
+    trie: Dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if "" in node:
+            return body + "?" if len(alts) == 1 and len(alts[0]) == 1 else f"(?:{body})?"
+        return body
+
+    return build(trie)
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+class KeywordClassifier:
+    def __init__(self, categories: Sequence[Tuple[str, Sequence[str]]], default: str = "Unknown",
+                 boundary: str = "word", trie_min_keywords: Optional[int] = None):
+        if boundary not in BOUNDARIES:
+            raise ValueError(f"boundary must be one of {BOUNDARIES}, not {boundary!r}")
+        self.labels = [label for label, _ in categories]
+        self.default = default
+        self.boundary = boundary
+        rank: Dict[str, int] = {}
+        for i, (_, keywords) in enumerate(categories):
+            for kw in keywords:
+                kw = kw.strip().lower()
+                if kw and "\n" not in kw and kw not in rank:
+                    rank[kw] = i
+        self._keywords: List[List[str]] = [[] for _ in categories]
+        for kw, i in rank.items():
+            self._keywords[i].append(kw)
+        threshold = TRIE_MIN_KEYWORDS if trie_min_keywords is None else trie_min_keywords
+        self.uses_trie = boundary != "none" or len(rank) >= threshold
+        if not self.uses_trie:
+            self._rx = None
+            return
+
+        # The regex reports the longest keyword at each position. Shorter
+        # keywords that also match there are its prefixes (ending at a word
+        # boundary for "word"), so fold their rank into the longer one.
+        self._rank: Dict[str, int] = {}
+        for kw, r in rank.items():
+            for n in range(1, len(kw)):
+                if kw[:n] in rank and (boundary != "word" or not _is_word_char(kw[n])):
+                    r = min(r, rank[kw[:n]])
+            self._rank[kw] = r
+
+        trie = _trie_regex(rank) if rank else r"(?!x)x"
+        left = "" if boundary == "none" else r"(?<!\w)"
+        right = r"(?!\w)" if boundary == "word" else ""
+        # zero-width lookahead: every start position is tried, overlaps included
+        self._rx = re.compile(f"{left}(?=({trie}){right})")
+
+    @classmethod
+    def from_file(cls, path: str, default: str = "Unknown", boundary: str = "word",
+                  trie_min_keywords: Optional[int] = None) -> "KeywordClassifier":
+        """
+        Load categories from JSON, in priority order: either
+        {"label": ["kw", ...], ...} or [["label", ["kw", ...]], ...].
+        """
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        categories = list(data.items()) if isinstance(data, dict) else [tuple(c) for c in data]
+        return cls(categories, default, boundary, trie_min_keywords)
+
+    def _scan(self, text: str) -> str:
+        """Substring path (boundary "none" only): first category with a keyword in `text`."""
+        text = text.lower()
+        for label, kws in zip(self.labels, self._keywords):
+            for kw in kws:
+                if kw in text: return label
+        return self.default
+
+    def classify(self, text: str) -> str:
+        if not text: return self.default
+        if self._rx is None: return self._scan(text)
+        best = None
+        for m in self._rx.finditer(text.lower()):
+            r = self._rank[m.group(1)]
+            if best is None or r < best:
+                best = r
+                if r == 0: break
+        return self.default if best is None else self.labels[best]
+
+    def classify_many(self, texts: Iterable[str]) -> List[str]:
+        """classify() over a batch, with lookups bound once for the whole loop."""
+        if self._rx is None:
+            scan, default = self._scan, self.default
+            return [scan(text) if text else default for text in texts]
+        finditer, rank, labels, default = self._rx.finditer, self._rank, self.labels, self.default
+        out = []
+        append = out.append
+        for text in texts:
+            best = None
+            if text:
+                for m in finditer(text.lower()):
+                    r = rank[m.group(1)]
+                    if best is None or r < best:
+                        best = r
+                        if r == 0: break
+            append(default if best is None else labels[best])
+        return out
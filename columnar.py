@@ -0,0 +1,281 @@
+# columnar.py
+"""
+NumPy-backed columnar analytics for many profiles at once.
+
+PostTable stores posts from any number of profiles as flat arrays (one row
+per post, rows of a profile contiguous) with hashtags in CSR form. batch_metrics()
+computes, for every profile in one set of vectorized group-bys, the same
+dict that profile_metrics() builds from a list of post dicts, and
+batch_summary_rows() turns those into CSV rows.
+
+    table = PostTable.from_profiles({"user": posts, ...})
+    metrics = batch_metrics(table)          # {username: profile_metrics-style dict}
+
+Floating-point means are summed in a different order than statistics.mean,
+so values can differ from the per-profile helpers in the last few ulps;
+ties between equal averages are broken the same way as in the dict-based
+helpers (first appearance; tag name for hashtags).
+"""
+import math
+from datetime import datetime
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+import Social_Media_Data_Collection as smdc
+import instrumentation as instr
+
+_EPOCH = datetime(1970, 1, 1)
+CAPTION_BIN_UPPER = np.array([20, 40, 60, 80, 120, 9999])
+CAPTION_BIN_LABELS = ["0-20", "21-40", "41-60", "61-80", "81-120", "121+"]
+
+class _Vocab:
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def code(self, name: str) -> int:
+        c = self.codes.get(name)
+        if c is None:
+            c = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return c
+
+class PostTable:
+    """
+    Columns (length n_posts): profile, likes, comments, shares, saves, views,
+    er (NaN when unknown), caption_len, ts (naive seconds since 1970, NaN when
+    unknown), hour/weekday (-1 when unknown), theme. Hashtags: tag_offsets
+    (n_posts + 1) into tag_codes, codes into `tags`.
+    """
+    def __init__(self, usernames: List[str], columns: Dict[str, np.ndarray],
+                 tags: List[str], themes: List[str]):
+        self.usernames = usernames
+        self.tags = tags
+        self.themes = themes
+        for name, col in columns.items():
+            setattr(self, name, col)
+
+    def __len__(self):
+        return len(self.likes)
+
+    @classmethod
+    def from_profiles(cls, profiles: Mapping[str, Sequence[Mapping]]) -> "PostTable":
+        usernames = list(profiles)
+        tag_vocab, theme_vocab = _Vocab(), _Vocab()
+        cols: Dict[str, list] = {k: [] for k in (
+            "profile", "likes", "comments", "shares", "saves", "views", "er",
+            "caption_len", "ts", "hour", "weekday", "theme")}
+        tag_offsets = [0]
+        tag_codes: List[int] = []
+        nan = float("nan")
+        for pi, username in enumerate(usernames):
+            for p in profiles[username]:
+                ts = p["timestamp"]
+                has_ts = isinstance(ts, datetime)
+                er = p.get("er_view")
+                cols["profile"].append(pi)
+                cols["likes"].append(p["likes"]); cols["comments"].append(p["comments"])
+                cols["shares"].append(p["shares"]); cols["saves"].append(p.get("saves") or 0)
+                cols["views"].append(p["views"])
+                cols["er"].append(nan if er is None else er)
+                cols["caption_len"].append(p["caption_len"])
+                cols["ts"].append((ts.replace(tzinfo=None) - _EPOCH).total_seconds() if ts else nan)
+                cols["hour"].append(ts.hour if has_ts else -1)
+                cols["weekday"].append(ts.weekday() if has_ts else -1)
+                cols["theme"].append(theme_vocab.code(p.get("theme", "general english")))
+                tag_codes.extend(tag_vocab.code(h) for h in p.get("hashtags", []))
+                tag_offsets.append(len(tag_codes))
+        dtypes = {"profile": np.int32, "er": np.float64, "ts": np.float64,
+                  "hour": np.int8, "weekday": np.int8, "theme": np.int32, "caption_len": np.int64}
+        columns = {k: np.asarray(v, dtype=dtypes.get(k, np.int64)) for k, v in cols.items()}
+        columns["tag_offsets"] = np.asarray(tag_offsets, dtype=np.int64)
+        columns["tag_codes"] = np.asarray(tag_codes, dtype=np.int32)
+        return cls(usernames, columns, tag_vocab.names, theme_vocab.names)
+
+# ---------- group-by helpers ----------
+def _group(keys: np.ndarray):
+    """Compress composite keys: (unique keys, inverse, first index of each key)."""
+    uniq, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    return uniq, inverse, first
+
+def _sorted_groups(profile: np.ndarray, primary: np.ndarray, tiebreak: np.ndarray):
+    """Group indices ordered by profile, then primary desc, then tiebreak asc."""
+    order = np.lexsort((tiebreak, -primary, profile))
+    return order, profile[order]
+
+def _split_by_profile(order: np.ndarray, sorted_profile: np.ndarray, n_profiles: int):
+    bounds = np.searchsorted(sorted_profile, np.arange(n_profiles + 1))
+    return [order[bounds[i]:bounds[i + 1]] for i in range(n_profiles)]
+
+def _lift_rows(profile: np.ndarray, key: np.ndarray, er: np.ndarray, overall: np.ndarray,
+               n_profiles: int, min_n: int, tiebreak_by_first: bool):
+    """(count, avg, lift) per (profile, key) with count >= min_n, sorted by lift desc."""
+    n_keys = int(key.max()) + 1 if len(key) else 1
+    uniq, inverse, first = _group(profile.astype(np.int64) * n_keys + key)
+    counts = np.bincount(inverse)
+    sums = np.bincount(inverse, weights=er)
+    g_profile = (uniq // n_keys).astype(np.int64)
+    g_key = uniq % n_keys
+    avg = sums / counts
+    lift = avg - overall[g_profile]
+    keep = counts >= min_n
+    g_profile, g_key, counts, avg, lift, first = (
+        a[keep] for a in (g_profile, g_key, counts, avg, lift, first))
+    order, sp = _sorted_groups(g_profile, lift, first if tiebreak_by_first else g_key)
+    return [(g_key[ix], counts[ix], avg[ix], lift[ix])
+            for ix in _split_by_profile(order, sp, n_profiles)]
+
+# ---------- metrics ----------
+@instr.timed("analytics_batch")
+def batch_metrics(table: PostTable, min_hashtag_occurrences: Optional[int] = None) -> Dict[str, Dict]:
+    """
+    {username: metrics} with the same keys and values as profile_metrics().
+    """
+    min_tags = smdc.MIN_HASHTAG_OCCURRENCES if min_hashtag_occurrences is None else min_hashtag_occurrences
+    P = len(table.usernames)
+    prof = table.profile.astype(np.int64)
+    n_posts = np.bincount(prof, minlength=P)
+
+    def per_profile_mean(values, mask=None):
+        p = prof if mask is None else prof[mask]
+        v = values if mask is None else values[mask]
+        n = np.bincount(p, minlength=P)
+        s = np.bincount(p, weights=v, minlength=P)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 0, s / np.maximum(n, 1), 0.0), n
+
+    # plain averages: integer sums are exact (below 2**53), so sum / n rounds
+    # exactly like statistics.mean
+    avgs = {}
+    for col in ("likes", "comments", "shares", "saves"):
+        sums = np.zeros(P, dtype=np.int64)
+        np.add.at(sums, prof, getattr(table, col))
+        avgs[col] = np.where(n_posts > 0, sums / np.maximum(n_posts, 1), 0.0)
+
+    # ER mean / median over posts with a known ER
+    has_er = ~np.isnan(table.er)
+    er_mean, er_n = per_profile_mean(table.er, has_er)
+    er_idx = np.nonzero(has_er)[0]
+    order = er_idx[np.lexsort((table.er[er_idx], prof[er_idx]))]
+    sorted_er = table.er[order]
+    starts = np.concatenate(([0], np.cumsum(er_n)[:-1]))
+    er_median = np.zeros(P)
+    nz = er_n > 0
+    lo = starts[nz] + (er_n[nz] - 1) // 2
+    hi = starts[nz] + er_n[nz] // 2
+    er_median[nz] = (sorted_er[lo] + sorted_er[hi]) / 2  # lo == hi for odd counts
+
+    # posts per week from first/last timestamp
+    has_ts = ~np.isnan(table.ts)
+    ts_n = np.bincount(prof[has_ts], minlength=P)
+    ts_min = np.full(P, np.inf); ts_max = np.full(P, -np.inf)
+    np.minimum.at(ts_min, prof[has_ts], table.ts[has_ts])
+    np.maximum.at(ts_max, prof[has_ts], table.ts[has_ts])
+
+    # theme mode: most common, ties -> first seen (statistics.mode semantics)
+    n_themes = max(len(table.themes), 1)
+    uniq, inverse, first = _group(prof * n_themes + table.theme)
+    counts = np.bincount(inverse)
+    g_prof = uniq // n_themes
+    order, sp = _sorted_groups(g_prof, counts, first)
+    theme_groups = _split_by_profile(order, sp, P)
+
+    # hashtags: CSR -> one row per (post, tag)
+    lengths = np.diff(table.tag_offsets)
+    tag_post = np.repeat(np.arange(len(table)), lengths)
+    tag_prof = prof[tag_post]
+    used = np.unique(tag_prof * max(len(table.tags), 1) + table.tag_codes)
+    used_prof = used // max(len(table.tags), 1)
+    used_code = used % max(len(table.tags), 1)
+    used_bounds = np.searchsorted(used_prof, np.arange(P + 1))
+
+    # hashtag efficiency: set() per post, then lowercase (duplicates after lowercasing count twice)
+    lower_names = sorted({t.lower() for t in table.tags})  # code order == name order
+    lower_code = {name: i for i, name in enumerate(lower_names)}
+    lower_of = np.array([lower_code[t.lower()] for t in table.tags], dtype=np.int64)
+    pair = np.unique(tag_post.astype(np.int64) * max(len(table.tags), 1) + table.tag_codes)
+    pair_post = pair // max(len(table.tags), 1)
+    pair_code = pair % max(len(table.tags), 1)
+    m = has_er[pair_post]
+    tag_rows = _lift_rows(prof[pair_post[m]], lower_of[pair_code[m]], table.er[pair_post[m]],
+                          er_mean, P, min_tags, tiebreak_by_first=False)
+
+    # category lift
+    cat_rows = _lift_rows(prof[has_er], table.theme[has_er].astype(np.int64), table.er[has_er],
+                          er_mean, P, 2, tiebreak_by_first=True)
+
+    # posting windows: buckets with n >= 2, top 3 by avg (ties -> first seen)
+    window = has_er & has_ts & (table.hour >= 0)
+    def top_windows(col):
+        return _lift_rows(prof[window], col[window].astype(np.int64), table.er[window],
+                          np.zeros(P), P, 2, tiebreak_by_first=True)
+    hour_rows, weekday_rows = top_windows(table.hour), top_windows(table.weekday)
+
+    # caption length vs ER: Pearson r and fixed length buckets
+    x = table.caption_len[has_er].astype(np.float64)
+    y = table.er[has_er]
+    px = prof[has_er]
+    mx = np.bincount(px, weights=x, minlength=P) / np.maximum(er_n, 1)
+    my = np.bincount(px, weights=y, minlength=P) / np.maximum(er_n, 1)
+    dx, dy = x - mx[px], y - my[px]
+    num = np.bincount(px, weights=dx * dy, minlength=P)
+    den_x = np.sqrt(np.bincount(px, weights=dx * dx, minlength=P))
+    den_y = np.sqrt(np.bincount(px, weights=dy * dy, minlength=P))
+    bucket = np.searchsorted(CAPTION_BIN_UPPER, table.caption_len[has_er], side="left")
+    in_bins = bucket < len(CAPTION_BIN_UPPER)
+    nb = len(CAPTION_BIN_LABELS)
+    bkey = px[in_bins] * nb + bucket[in_bins]
+    b_n = np.bincount(bkey, minlength=P * nb).reshape(P, nb)
+    b_s = np.bincount(bkey, weights=y[in_bins], minlength=P * nb).reshape(P, nb)
+
+    def plain_avg(col, i):
+        # statistics.mean of ints returns an int when the mean is whole
+        v = float(avgs[col][i])
+        return int(v) if n_posts[i] and v.is_integer() else v
+
+    out: Dict[str, Dict] = {}
+    for i, username in enumerate(table.usernames):
+        overall = float(er_mean[i])
+        if ts_n[i] >= 2:
+            days = math.floor((ts_max[i] - ts_min[i]) / 86400) or 1
+            ppw = int(ts_n[i]) / (days / 7.0)
+        else:
+            ppw = None
+        tg = theme_groups[i]
+        theme = table.themes[int(uniq[tg[0]] % n_themes)] if len(tg) else "general english"
+        if er_n[i] >= 2 and den_x[i] != 0 and den_y[i] != 0:
+            r = float(num[i] / (den_x[i] * den_y[i]))
+        else:
+            r = None
+        buckets = {lab: (float(b_s[i, j] / b_n[i, j]) if b_n[i, j] else 0.0, int(b_n[i, j]))
+                   for j, lab in enumerate(CAPTION_BIN_LABELS)}
+        tk, tn, ta, tl = tag_rows[i]
+        ck, cn, ca, cl = cat_rows[i]
+        hk, hn, ha, _ = hour_rows[i]
+        wk, wn, wa, _ = weekday_rows[i]
+        out[username] = {
+            "posts_analyzed": int(n_posts[i]),
+            "avg_likes": plain_avg("likes", i), "avg_comments": plain_avg("comments", i),
+            "avg_shares": plain_avg("shares", i), "avg_saves": plain_avg("saves", i),
+            "er": (overall, float(er_median[i])),
+            "posts_per_week": ppw,
+            "content_theme": theme,
+            "hashtags_used": sorted(table.tags[c] for c in used_code[used_bounds[i]:used_bounds[i + 1]]),
+            "hashtag_efficiency": (overall, [(lower_names[k], int(n), float(a), float(l))
+                                             for k, n, a, l in zip(tk, tn, ta, tl)]),
+            "posting_window": ([(int(k), float(a), int(n)) for k, n, a in zip(hk[:3], hn[:3], ha[:3])],
+                               [(int(k), float(a), int(n)) for k, n, a in zip(wk[:3], wn[:3], wa[:3])]),
+            "caption_vs_er": (r, buckets) if er_n[i] else (None, {}),
+            "category_lift": (overall, [(table.themes[k], int(n), float(a), float(l))
+                                        for k, n, a, l in zip(ck, cn, ca, cl)]),
+        }
+    return out
+
+def batch_summary_rows(profiles: Mapping[str, Sequence[Mapping]],
+                       identities: Mapping[str, Tuple[str, str]]) -> List[Dict]:
+    """
+    CSV rows for many profiles. identities maps username -> (display_name, bio).
+    """
+    metrics = batch_metrics(PostTable.from_profiles(profiles))
+    return [smdc.summary_row(u, identities[u][0], identities[u][1], metrics[u]) for u in profiles]
@@ -0,0 +1,534 @@
+# crawl.py
+"""
+Sharded crawl: handles in a lease-based work queue, any number of workers.
+
+    python crawl.py load handles.txt          # coordinator: queue the handles (file order)
+    python crawl.py work --processes 4        # workers, on this machine ...
+    python crawl.py serve --host 0.0.0.0 --allow-remote --token SECRET   # ... or expose the queue to other nodes
+    python crawl.py --queue http://coordinator:8765 --token SECRET work
+    python crawl.py status
+    python crawl.py merge                     # parts -> OUTPUT_DIR summary/profiles/posts
+
+The queue is a SQLite file (CRAWL_DIR/queue.sqlite). A worker claims a shard
+of CRAWL_SHARD_SIZE handles under a lease and heartbeats it while it works;
+a handle whose lease runs out (worker crashed or was killed) goes back to
+the queue. Failed handles are retried with backoff up to MAX_ATTEMPTS.
+SQLite locking needs a local disk, so workers on other nodes go through
+`serve`, which answers the same calls over HTTP. `serve` listens on
+127.0.0.1 unless told otherwise; binding any other address needs
+--allow-remote and a shared token (--token or CRAWL_TOKEN), which every
+request must carry. The token is sent in the clear, so keep the port on a
+trusted network or behind a TLS proxy.
+
+Each worker runs the usual stages (scrape_profile(), analyze_profile()) and
+appends its results to CRAWL_DIR/parts/<worker>/{summary,profiles,posts}.jsonl
+before marking the handle done. `merge` combines the parts in queue order;
+a handle found in several parts takes the copy of the worker the queue
+recorded as finishing it, so the output does not depend on timing or on
+directory listing order.
+"""
+import argparse
+import hmac
+import inspect
+import ipaddress
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import Social_Media_Data_Collection as smdc
+from pipeline import JSONLSink, make_sinks
+from reanalyze import load_store, read_table
+from scheduler import backoff_delay, retry_call
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS handles (
+    username    TEXT PRIMARY KEY,
+    position    INTEGER NOT NULL,
+    state       TEXT    NOT NULL DEFAULT 'pending',   -- pending | leased | done | failed
+    worker      TEXT,
+    lease_until REAL,
+    not_before  REAL    NOT NULL DEFAULT 0,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    posts       INTEGER,
+    error       TEXT,
+    updated_at  REAL
+);
+CREATE INDEX IF NOT EXISTS handles_by_state ON handles (state, position);
+"""
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+# ---------- Queue ----------
+class WorkQueue:
+    """Lease-based handle queue in one SQLite file; safe across threads and local processes."""
+    def __init__(self, path: str, max_attempts: int = 3, backoff_base: float = 2.0,
+                 backoff_cap: float = 60.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff_base, self.backoff_cap = backoff_base, backoff_cap
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, path: Optional[str] = None) -> "WorkQueue":
+        return cls(path or os.path.join(smdc.CRAWL_DIR, "queue.sqlite"),
+                   smdc.MAX_ATTEMPTS, smdc.BACKOFF_BASE, smdc.BACKOFF_CAP)
+
+    @contextmanager
+    def _tx(self):
+        """One write transaction; BEGIN IMMEDIATE so concurrent claims never interleave."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def load(self, usernames: Sequence[str]) -> int:
+        """Queue handles after any already queued; returns how many were new."""
+        with self._tx() as conn:
+            start = conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM handles").fetchone()[0]
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO handles (username, position) VALUES (?, ?)",
+                             [(u, start + i) for i, u in enumerate(usernames)])
+            return conn.total_changes - before
+
+    def claim(self, worker: str, n: int = 1, lease_seconds: float = 300.0) -> List[str]:
+        """Lease up to n ready handles (queue order) to `worker`."""
+        now = time.time()
+        with self._tx() as conn:
+            # Leases that ran out: the worker is gone, so that attempt failed.
+            conn.execute("UPDATE handles SET state = 'failed', error = 'lease expired (' || worker || ')', "
+                         "updated_at = ? WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                         (now, now, self.max_attempts))
+            conn.execute("UPDATE handles SET state = 'pending', error = 'lease expired (' || worker || ')', "
+                         "updated_at = ? WHERE state = 'leased' AND lease_until < ?", (now, now))
+            names = [r[0] for r in conn.execute(
+                "SELECT username FROM handles WHERE state = 'pending' AND not_before <= ? "
+                "ORDER BY position LIMIT ?", (now, n))]
+            conn.executemany("UPDATE handles SET state = 'leased', worker = ?, lease_until = ?, "
+                             "attempts = attempts + 1, updated_at = ? WHERE username = ?",
+                             [(worker, now + lease_seconds, now, u) for u in names])
+        return names
+
+    def heartbeat(self, worker: str, usernames: Sequence[str], lease_seconds: float = 300.0) -> List[str]:
+        """Extend `worker`'s leases on `usernames`; returns the ones it still holds."""
+        if not usernames: return []
+        now = time.time()
+        marks = ",".join("?" * len(usernames))
+        with self._tx() as conn:
+            conn.execute(f"UPDATE handles SET lease_until = ? WHERE state = 'leased' AND worker = ? "
+                         f"AND lease_until >= ? AND username IN ({marks})",
+                         (now + lease_seconds, worker, now, *usernames))
+            return [r[0] for r in conn.execute(
+                f"SELECT username FROM handles WHERE state = 'leased' AND worker = ? "
+                f"AND username IN ({marks})", (worker, *usernames))]
+
+    def complete(self, worker: str, username: str, posts: int = 0) -> bool:
+        """Mark done; False if `worker` no longer held the lease (its results are still merged)."""
+        with self._tx() as conn:
+            cur = conn.execute("UPDATE handles SET state = 'done', posts = ?, error = NULL, lease_until = NULL, "
+                               "updated_at = ? WHERE username = ? AND worker = ? AND state = 'leased'",
+                               (posts, time.time(), username, worker))
+            return cur.rowcount == 1
+
+    def fail(self, worker: str, username: str, error: str) -> str:
+        """Record a failed attempt; returns the new state ('pending' with backoff, or 'failed')."""
+        now = time.time()
+        with self._tx() as conn:
+            row = conn.execute("SELECT attempts FROM handles WHERE username = ? AND worker = ? "
+                               "AND state = 'leased'", (username, worker)).fetchone()
+            if row is None: return "lost"
+            attempts = row[0]
+            if attempts >= self.max_attempts:
+                state, not_before = "failed", 0
+            else:
+                state = "pending"
+                not_before = now + backoff_delay(attempts - 1, self.backoff_base, self.backoff_cap)
+            conn.execute("UPDATE handles SET state = ?, not_before = ?, error = ?, lease_until = NULL, "
+                         "updated_at = ? WHERE username = ?", (state, not_before, error, now, username))
+        return state
+
+    def next_ready_in(self) -> Optional[float]:
+        """Seconds until some handle may become claimable; None when nothing is left to do."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(CASE state WHEN 'pending' THEN not_before ELSE lease_until END) "
+                "FROM handles WHERE state IN ('pending', 'leased')").fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def status(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM handles GROUP BY state").fetchall())
+
+    def results(self) -> List[Tuple]:
+        """[(username, state, worker, attempts, posts, error)] in queue order."""
+        with self._lock:
+            return [tuple(r) for r in self._conn.execute(
+                "SELECT username, state, worker, attempts, posts, error FROM handles ORDER BY position")]
+
+    def close(self):
+        self._conn.close()
+
+QUEUE_METHODS = ("load", "claim", "heartbeat", "complete", "fail", "next_ready_in", "status", "results")
+
+TOKEN_HEADER = "X-Crawl-Token"
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost": return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+class RemoteQueue:
+    """
+    WorkQueue calls forwarded to a `crawl.py serve` coordinator over HTTP.
+    Connection errors and 5xx answers are retried; 4xx answers are not.
+    """
+    def __init__(self, url: str, timeout: float = 30.0, token: Optional[str] = None):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.token = token
+
+    def _call(self, method: str, **kwargs):
+        body = json.dumps(kwargs).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.token: headers[TOKEN_HEADER] = self.token
+
+        def post():
+            req = urllib.request.Request(f"{self.url}/{method}", data=body, headers=headers)
+            try:
+                with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                    return json.loads(resp.read())["result"]
+            except urllib.error.HTTPError as e:
+                if e.code >= 500: raise
+                try:
+                    error = json.loads(e.read())["error"]
+                except Exception:
+                    error = e.reason
+                raise RuntimeError(f"{self.url}/{method}: HTTP {e.code}: {error}") from None
+        return retry_call(post, 5, 0.5, 10.0, retry_on=(OSError,))
+
+    def __getattr__(self, name: str):
+        if name not in QUEUE_METHODS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._call(name, **self._named(name, args, kwargs))
+
+    @staticmethod
+    def _named(name: str, args: Tuple, kwargs: Dict) -> Dict:
+        params = list(inspect.signature(getattr(WorkQueue, name)).parameters)[1:]
+        return dict(zip(params, args), **kwargs)
+
+    def close(self):
+        pass
+
+class QueueServer:
+    """
+    Serves one WorkQueue to RemoteQueue clients: POST /<method> with JSON
+    keyword arguments. Only loopback addresses are served unless
+    allow_remote=True, which also requires a token; with a token set, every
+    request must send it in the X-Crawl-Token header.
+    """
+    def __init__(self, queue: WorkQueue, host: str = "127.0.0.1", port: int = 8765,
+                 token: Optional[str] = None, allow_remote: bool = False):
+        if not is_loopback(host):
+            if not allow_remote:
+                raise ValueError(f"refusing to serve the queue on {host}: only loopback without allow_remote")
+            if not token:
+                raise ValueError(f"serving the queue on {host} needs a token")
+        self.queue = queue
+        self.token = token
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+
+    @property
+    def address(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                method = self.path.strip("/")
+                try:
+                    if server.token and not hmac.compare_digest(
+                            (self.headers.get(TOKEN_HEADER) or "").encode("utf-8"), server.token.encode("utf-8")):
+                        status, body = 401, {"error": "missing or wrong token"}
+                    else:
+                        if method not in QUEUE_METHODS:
+                            raise ValueError(f"unknown method {method!r}")
+                        kwargs = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                        status, body = 200, {"result": getattr(server.queue, method)(**kwargs)}
+                except (ValueError, TypeError) as e:
+                    status, body = 400, {"error": str(e)}
+                except Exception as e:
+                    status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def start(self) -> "QueueServer":
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+def open_queue(spec: Optional[str] = None, token: Optional[str] = None):
+    """
+    WorkQueue for a path (default CRAWL_DIR/queue.sqlite), RemoteQueue for an
+    http:// URL (sending `token`, default CRAWL_TOKEN).
+    """
+    if spec and spec.startswith(("http://", "https://")):
+        return RemoteQueue(spec, token=token or smdc.CRAWL_TOKEN)
+    return WorkQueue.from_config(spec)
+
+# ---------- Worker ----------
+class Heartbeat(threading.Thread):
+    """Renews the worker's leases every lease_seconds / 3 and notices lost ones."""
+    def __init__(self, queue, worker: str, lease_seconds: float):
+        super().__init__(daemon=True)
+        self.queue, self.worker, self.lease_seconds = queue, worker, lease_seconds
+        self._held = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def hold(self, usernames: Iterable[str]):
+        with self._lock: self._held.update(usernames)
+
+    def release(self, username: str):
+        with self._lock: self._held.discard(username)
+
+    def holds(self, username: str) -> bool:
+        with self._lock: return username in self._held
+
+    def run(self):
+        while not self._stopped.wait(self.lease_seconds / 3):
+            with self._lock: names = sorted(self._held)
+            if not names: continue
+            try:
+                still = set(self.queue.heartbeat(self.worker, names, self.lease_seconds))
+            except Exception as e:
+                print(f"   (heartbeat failed: {e})")
+                continue
+            with self._lock:
+                for username in set(names) - still:
+                    if username in self._held:
+                        print(f"   (@{username}: lease lost)")
+                        self._held.discard(username)
+
+    def stop(self):
+        self._stopped.set()
+
+def run_worker(queue, parts_dir: str, worker: Optional[str] = None, shard_size: int = 5,
+               lease_seconds: float = 300.0, driver_factory: Optional[Callable] = None,
+               poll: float = 5.0) -> int:
+    """
+    Claim shards until the queue is drained; returns the number of handles
+    this worker completed. Results are appended to parts_dir/<worker>/.
+    """
+    from browser_pool import driver_alive
+
+    worker = worker or worker_id()
+    driver_factory = driver_factory or (lambda: smdc.get_driver(
+        use_mobile=smdc.USE_MOBILE_LAYOUT, headless=False, lean=smdc.LEAN_DRIVER))
+    sink = JSONLSink(os.path.join(parts_dir, worker), flush_every=1)   # on disk before complete()
+    beat = Heartbeat(queue, worker, lease_seconds)
+    beat.start()
+    driver, done = None, 0
+    try:
+        while True:
+            shard = queue.claim(worker, shard_size, lease_seconds)
+            if not shard:
+                wait = queue.next_ready_in()
+                if wait is None: break
+                time.sleep(min(max(wait, 0.5), poll))
+                continue
+            beat.hold(shard)
+            for username in shard:
+                if not beat.holds(username): continue
+                print(f"\n===== @{username} [{worker}] =====")
+                try:
+                    if driver is None: driver = driver_factory()
+                    identity, post_urls, posts = smdc.scrape_profile(driver, username)
+                    if post_urls:
+                        display_name, bio, followers, following = identity
+                        row = smdc.analyze_profile(username, display_name, bio, posts)
+                        smdc.print_profile_report(row, followers, following, posts)
+                        sink.write(username, row, posts, identity)
+                        smdc.record_history(username, identity, posts)
+                    else:
+                        print("No recent posts found (profile private or grid blocked).")
+                    queue.complete(worker, username, len(posts))
+                    done += 1
+                except Exception as e:
+                    state = queue.fail(worker, username, f"{type(e).__name__}: {e}")
+                    print(f"   (@{username} failed: {e}; {state})")
+                    if driver is not None and not driver_alive(driver):
+                        smdc.release_driver(driver)
+                        driver = None
+                finally:
+                    beat.release(username)
+    finally:
+        beat.stop()
+        sink.close()
+        if driver is not None: smdc.release_driver(driver)
+        smdc.close_history()
+    return done
+
+def _work_process(queue_spec: Optional[str], token: Optional[str], parts_dir: str, shard_size: int,
+                  lease_seconds: float):
+    run_worker(open_queue(queue_spec, token), parts_dir, shard_size=shard_size, lease_seconds=lease_seconds)
+
+# ---------- Merge ----------
+OUTPUT_NAMES = ("summary", "profiles", "posts")
+
+def read_part(part_dir: str) -> Dict[str, Tuple[Dict, Optional[Tuple], List[Dict]]]:
+    """{username: (summary row, identity, [post row])} of one worker's part; a handle written twice keeps its last copy."""
+    summaries = {r["username"]: r for r in read_table(part_dir, "summary")}
+    identities = {r["username"]: (r.get("display_name"), r.get("bio"), r.get("followers"), r.get("following"))
+                  for r in read_table(part_dir, "profiles")}
+    posts, _, _ = load_store(part_dir)
+    return {u: (row, identities.get(u), posts.get(u, [])) for u, row in summaries.items()}
+
+def merge(parts_dirs: Sequence[str], out_dir: str, queue=None, formats: Optional[Sequence[str]] = None,
+          overwrite: bool = False) -> int:
+    """
+    Combine worker parts into one summary/profiles/posts output in out_dir.
+    Handles come in queue order (then by name for any the queue does not
+    know); each takes the part of the worker that completed it, else the
+    last worker by name. Returns the number of profiles written.
+    """
+    formats = formats or smdc.OUTPUT_FORMATS
+    existing = [os.path.join(out_dir, f) for f in sorted(os.listdir(out_dir))
+                if f.split(".")[0] in OUTPUT_NAMES] if os.path.isdir(out_dir) else []
+    if existing and not overwrite:
+        raise FileExistsError(f"{out_dir} already has output: {', '.join(existing)}")
+    for path in existing:
+        shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+
+    found: Dict[str, Dict[str, Tuple]] = {}
+    for parts_dir in sorted(parts_dirs):
+        for worker in sorted(os.listdir(parts_dir)):
+            part_dir = os.path.join(parts_dir, worker)
+            if not os.path.isdir(part_dir): continue
+            for username, result in read_part(part_dir).items():
+                found.setdefault(username, {})[worker] = result
+
+    order, finished_by = [], {}
+    for username, state, worker, *_ in (queue.results() if queue is not None else []):
+        if username in found:
+            order.append(username)
+            if state == "done": finished_by[username] = worker
+    queued = set(order)
+    order += sorted(u for u in found if u not in queued)
+
+    sinks = make_sinks(formats, out_dir)
+    try:
+        for username in order:
+            by_worker = found[username]
+            row, identity, posts = by_worker.get(finished_by.get(username)) or by_worker[max(by_worker)]
+            for sink in sinks:
+                sink.write(username, row, posts, identity)
+    finally:
+        for sink in sinks:
+            sink.close()
+    return len(order)
+
+# ---------- CLI ----------
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--queue", help="queue file or coordinator URL (default: CRAWL_DIR/queue.sqlite)")
+    ap.add_argument("--token", default=smdc.CRAWL_TOKEN, help="shared token of the coordinator (default: CRAWL_TOKEN)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ld = sub.add_parser("load", help="queue handles from a file (default: HANDLES_FILE / USERNAMES)")
+    ld.add_argument("file", nargs="?")
+    sv = sub.add_parser("serve", help="serve the queue to workers on other nodes")
+    sv.add_argument("--host", default="127.0.0.1")
+    sv.add_argument("--allow-remote", action="store_true", help="allow a non-loopback --host (needs --token)")
+    sv.add_argument("--port", type=int, default=8765)
+    wk = sub.add_parser("work", help="claim and scrape shards until the queue is drained")
+    wk.add_argument("--parts", default=None, help="where to write results (default: CRAWL_DIR/parts)")
+    wk.add_argument("--processes", type=int, default=1, help="worker processes on this machine")
+    wk.add_argument("--shard-size", type=int, default=smdc.CRAWL_SHARD_SIZE)
+    wk.add_argument("--lease", type=float, default=smdc.CRAWL_LEASE_SECONDS, help="lease seconds")
+    sub.add_parser("status", help="handle counts per state, and failures")
+    mg = sub.add_parser("merge", help="combine worker parts into OUTPUT_DIR")
+    mg.add_argument("--parts", nargs="*", help="parts directories (default: CRAWL_DIR/parts)")
+    mg.add_argument("--out", default=smdc.OUTPUT_DIR)
+    mg.add_argument("--formats", nargs="*", default=smdc.OUTPUT_FORMATS)
+    mg.add_argument("--overwrite", action="store_true", help="replace existing output in --out")
+    args = ap.parse_args()
+    default_parts = os.path.join(smdc.CRAWL_DIR, "parts")
+
+    if args.cmd == "load":
+        handles = smdc.load_handles(args.file) if args.file else smdc.usernames()
+        queue = open_queue(args.queue, args.token)
+        print(f"Queued {queue.load(handles)} new handle(s) of {len(handles)}")
+    elif args.cmd == "serve":
+        try:
+            server = QueueServer(open_queue(args.queue), args.host, args.port, args.token, args.allow_remote)
+        except ValueError as e:
+            ap.error(str(e))
+        print(f"Serving {args.queue or 'CRAWL_DIR/queue.sqlite'} at {server.address}")
+        server.serve_forever()
+    elif args.cmd == "work":
+        parts = args.parts or default_parts
+        if args.processes <= 1:
+            done = run_worker(open_queue(args.queue, args.token), parts, shard_size=args.shard_size,
+                              lease_seconds=args.lease)
+            print(f"\nWorker done: {done} handle(s)")
+        else:
+            procs = [multiprocessing.Process(target=_work_process,
+                                             args=(args.queue, args.token, parts, args.shard_size, args.lease))
+                     for _ in range(args.processes)]
+            for p in procs: p.start()
+            for p in procs: p.join()
+    elif args.cmd == "status":
+        queue = open_queue(args.queue, args.token)
+        print(", ".join(f"{state}: {n}" for state, n in sorted(queue.status().items())) or "queue is empty")
+        for username, state, worker, attempts, _, error in queue.results():
+            if state == "failed":
+                print(f"  @{username}: {error} (after {attempts} attempts, {worker})")
+    else:
+        queue = open_queue(args.queue, args.token) if args.queue or os.path.exists(
+            os.path.join(smdc.CRAWL_DIR, "queue.sqlite")) else None
+        try:
+            written = merge(args.parts or [default_parts], args.out, queue, args.formats, args.overwrite)
+        except FileExistsError as e:
+            ap.error(f"{e} (use --overwrite to replace it)")
+        print(f"Saved {written} profile(s) to {args.out}/ ({', '.join(args.formats)})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+# fixture_server.py
+"""
+Local stand-in for tiktok.com that replays fixture pages.
+
+Point the scraper at it by setting Social_Media_Data_Collection.BASE_URL to
+FixtureServer.base_url; profile and post pages keep TikTok's URL layout
+(/@{username} and /@{username}/video/{id}) and page structure (rehydration
+JSON + data-e2e elements), so the Selenium and HTTP paths run unchanged.
+"""
+import html as html_lib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+REHYDRATION_SCRIPT_ID = "__UNIVERSAL_DATA_FOR_REHYDRATION__"
+
+HASHTAG_POOL = [
+    "#learnenglish", "#englishlearning", "#grammar", "#vocabulary", "#idioms",
+    "#pronunciation", "#ielts", "#toefl", "#slang", "#businessenglish",
+    "#study", "#fyp", "#english", "#esl", "#phrasalverbs",
+]
+
+# ---------- Synthetic pages ----------
+def _page(title: str, data: Dict, body: str) -> str:
+    payload = json.dumps(data, ensure_ascii=False).replace("</", "<\\/")
+    return (
+        "<!DOCTYPE html><html lang=\"en\"><head><meta charset=\"utf-8\">"
+        f"<title>{html_lib.escape(title)}</title>"
+        f"<script id=\"{REHYDRATION_SCRIPT_ID}\" type=\"application/json\">{payload}</script>"
+        f"</head><body>{body}</body></html>"
+    )
+
+def synthetic_post(username: str, video_id: str, rng: random.Random, create_time: int) -> Dict:
+    views = rng.randint(500, 2_000_000)
+    tags = rng.sample(HASHTAG_POOL, rng.randint(0, 5))
+    words = ["Today", "we", "learn", "a", "useful", "English", "phrase", "for", "daily", "life"]
+    caption = " ".join(rng.choices(words, k=rng.randint(3, 25)))
+    return {
+        "id": video_id,
+        "author": username,
+        "desc": (caption + " " + " ".join(tags)).strip(),
+        "createTime": str(create_time),
+        "stats": {
+            "playCount": views,
+            "diggCount": int(views * rng.uniform(0.01, 0.12)),
+            "commentCount": int(views * rng.uniform(0.0005, 0.01)),
+            "shareCount": int(views * rng.uniform(0.0005, 0.01)),
+            "collectCount": int(views * rng.uniform(0.001, 0.02)),
+        },
+    }
+
+def post_page(item: Dict, username: str) -> str:
+    stats = item["stats"]
+    data = {"__DEFAULT_SCOPE__": {"webapp.video-detail": {"itemInfo": {"itemStruct": item}}}}
+    body = (
+        f"<div data-e2e=\"browse-video-desc\">{html_lib.escape(item['desc'])}</div>"
+        f"<strong data-e2e=\"like-count\">{stats['diggCount']}</strong>"
+        f"<strong data-e2e=\"comment-count\">{stats['commentCount']}</strong>"
+        f"<strong data-e2e=\"share-count\">{stats['shareCount']}</strong>"
+    )
+    return _page(f"@{username} video {item['id']}", data, body)
+
+def profile_page(username: str, user: Dict, items: List[Dict]) -> str:
+    data = {"__DEFAULT_SCOPE__": {"webapp.user-detail": {"userInfo": user}}}
+    u, stats = user["user"], user["stats"]
+    grid = "".join(
+        f"<div data-e2e=\"user-post-item\"><a href=\"/@{username}/video/{it['id']}\">"
+        f"<strong data-e2e=\"video-views\">{it['stats']['playCount']}</strong></a></div>"
+        for it in items
+    )
+    body = (
+        f"<h1 data-e2e=\"user-title\">{html_lib.escape(u['nickname'])}</h1>"
+        f"<h2 data-e2e=\"user-bio\">{html_lib.escape(u['signature'])}</h2>"
+        f"<strong data-e2e=\"following-count\">{stats['followingCount']}</strong>"
+        f"<strong data-e2e=\"followers-count\">{stats['followerCount']}</strong>"
+        f"<div data-e2e=\"user-post-item-list\">{grid}</div>"
+    )
+    return _page(f"@{username}", data, body)
+
+def pad_page(html: str, size_bytes: int) -> str:
+    """
+    Grow a page to ~size_bytes with inline CSS ahead of the state script,
+    the way real TikTok pages carry megabytes of bundled assets.
+    """
+    filler_unit = ".css-1x2y3z{display:flex;margin:0 auto}\n"
+    missing = max(0, size_bytes - len(html))
+    filler = filler_unit * (missing // len(filler_unit) + 1)
+    return html.replace("<script id=", f"<style>{filler[:missing]}</style><script id=", 1)
+
+def build_synthetic_site(usernames: List[str], posts_per_profile: int = 25,
+                         seed: int = 0) -> Dict[str, str]:
+    """
+    Deterministic fake site: {path: html} for each profile and its posts.
+    """
+    rng = random.Random(seed)
+    bios = ["English teacher from the USA", "British English tips", "Learn English with me!",
+            "Canadian ESL coach", "IELTS prep | Poland"]
+    pages: Dict[str, str] = {}
+    now = 1_700_000_000
+    for n, username in enumerate(usernames):
+        items = []
+        for i in range(posts_per_profile):
+            video_id = str(7_000_000_000_000_000_000 + n * 100_000 + i)
+            create_time = now - i * rng.randint(30_000, 200_000)
+            items.append(synthetic_post(username, video_id, rng, create_time))
+        user = {
+            "user": {"uniqueId": username, "nickname": username.replace(".", " ").title(),
+                     "signature": rng.choice(bios)},
+            "stats": {"followerCount": rng.randint(100, 5_000_000),
+                      "followingCount": rng.randint(0, 2_000)},
+        }
+        pages[f"/@{username}"] = profile_page(username, user, items)
+        for it in items:
+            pages[f"/@{username}/video/{it['id']}"] = post_page(it, username)
+    return pages
+
+# ---------- Recorded corpus ----------
+# Layout: {dir}/@user/index.html for profiles, {dir}/@user/video/{id}.html for posts.
+def _corpus_file(corpus_dir: str, path: str) -> str:
+    parts = path.strip("/").split("/")
+    if len(parts) == 1:
+        parts.append("index")
+    return os.path.join(corpus_dir, *parts) + ".html"
+
+def save_corpus(pages: Dict[str, str], corpus_dir: str):
+    for path, page in pages.items():
+        target = _corpus_file(corpus_dir, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "w", encoding="utf-8") as f:
+            f.write(page)
+
+def load_corpus(corpus_dir: str) -> Dict[str, str]:
+    """Read a recorded corpus back into {path: html}."""
+    pages: Dict[str, str] = {}
+    for root, _, files in os.walk(corpus_dir):
+        for name in files:
+            if not name.endswith(".html"): continue
+            rel = os.path.relpath(os.path.join(root, name[:-5]), corpus_dir).replace(os.sep, "/")
+            if rel.endswith("/index"): rel = rel[:-len("/index")]
+            with open(os.path.join(root, name), encoding="utf-8") as f:
+                pages["/" + rel] = f.read()
+    return pages
+
+def record_corpus(driver, usernames: List[str], corpus_dir: str, posts_per_profile: int = 5) -> int:
+    """
+    Save live profile pages and their first posts (page_source) as a corpus.
+    Returns the number of pages written.
+    """
+    import Social_Media_Data_Collection as smdc
+    pages: Dict[str, str] = {}
+    for username in usernames:
+        _, post_urls = smdc.harvest_profile(driver, username, posts_per_profile)
+        pages[f"/@{username}"] = driver.page_source
+        for url in post_urls:
+            driver.get(url)
+            smdc.accept_cookies(driver)
+            pages[urlsplit(url).path.rstrip("/")] = driver.page_source
+    save_corpus(pages, corpus_dir)
+    return len(pages)
+
+# ---------- Server ----------
+class FixtureServer:
+    """
+    Threaded HTTP server replaying {path: html}. Query strings are ignored,
+    unknown paths return 404. Each response is delayed by `latency` plus a
+    uniform random `jitter` (seconds). To exercise retries, a share of
+    requests can be answered with 500 (`error_rate`) or 429 with Retry-After
+    (`throttle_rate`); `injected` counts them by status. Faults and jitter
+    come from random.Random(seed), so a seeded server replays the same
+    sequence for the same request order. Use as a context manager.
+    """
+    def __init__(self, pages: Dict[str, str], host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: float = 1.0, seed: Optional[int] = None):
+        self.pages = pages
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate, self.throttle_rate, self.retry_after = error_rate, throttle_rate, retry_after
+        self._rng = random.Random(seed)
+        self.hits: Dict[str, int] = {}
+        self.injected: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def do_GET(self):
+                path = urlsplit(self.path).path.rstrip("/") or "/"
+                with server._lock:
+                    server.hits[path] = server.hits.get(path, 0) + 1
+                    # Both draws every request, so the fault sequence for a seed does not depend on jitter.
+                    roll, spread = server._rng.random(), server._rng.random()
+                if server.latency or server.jitter:
+                    time.sleep(server.latency + spread * server.jitter)
+                page = server.pages.get(path)
+                status = 200 if page is not None else 404
+                body = (page if page is not None else "not found").encode("utf-8")
+                if roll < server.throttle_rate:
+                    status, body = 429, b"too many requests"
+                elif roll < server.throttle_rate + server.error_rate:
+                    status, body = 500, b"internal error"
+                if status in (429, 500):
+                    with server._lock:
+                        server.injected[status] = server.injected.get(status, 0) + 1
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", f"{server.retry_after:g}")
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FixtureServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Serve fixture pages on a local port.")
+    ap.add_argument("usernames", nargs="*", default=["all.american.eng"])
+    ap.add_argument("--corpus", help="serve a recorded corpus directory instead of synthetic pages")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500")
+    ap.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with 429")
+    ap.add_argument("--seed", type=int, default=None, help="seed for injected faults")
+    args = ap.parse_args()
+    pages = load_corpus(args.corpus) if args.corpus else build_synthetic_site(args.usernames)
+    with FixtureServer(pages, port=args.port, latency=args.latency, error_rate=args.error_rate,
+                       throttle_rate=args.throttle_rate, seed=args.seed) as srv:
+        print(f"Serving {len(srv.pages)} fixture pages at {srv.base_url} (Ctrl+C to stop)")
+        try:
+            while True: time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,393 @@
+# hashtag_index.py
+"""
+Cross-profile hashtag index with top-k lift and co-occurrence queries.
+
+Posts from any number of profiles are added incrementally and kept as flat
+arrays. A re-scraped post updates its ER in place; if its hashtags, theme or
+creator changed, its old row is retired (postings, pair counts and ER totals
+taken back out) and the post is added again as a new row:
+
+    post_tags/tag_offsets  post -> hashtag codes (CSR)
+    postings[tag]          hashtag -> post rows (inverted index)
+    cooc[tag]              hashtag -> {other hashtag: posts with both}
+    tag_er_n/tag_er_sum    running ER totals per hashtag, for unfiltered lift
+
+Hashtags are matched case-insensitively ("#IELTS" and "#ielts" are one tag).
+Lift follows hashtag_efficiency(): mean ER of posts with the tag minus the
+mean ER of all posts in scope. Unfiltered top_lift() reads the running totals
+(O(tags)); filtering by creators or theme re-aggregates the matching posts,
+vectorized when numpy is installed.
+
+    index = HashtagIndex.load("hashtags.idx")
+    index.add_posts("someuser", posts)
+    index.top_lift(k=20, min_count=50, themes=["grammar"])
+    index.cooccurring("#ielts", k=20)
+    index.save("hashtags.idx")
+
+The index is saved as JSON (one row per live post); postings, pair counts and
+ER totals are rebuilt from the rows on load.
+
+    python hashtag_index.py build --input output/ --cache .post_cache
+    python hashtag_index.py top --k 20 --min-count 50 --theme grammar
+    python hashtag_index.py cooc ielts --by lift
+"""
+import argparse
+import heapq
+import json
+import os
+import sys
+import tempfile
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import Social_Media_Data_Collection as smdc
+
+FORMAT_VERSION = 2
+NAN = float("nan")
+
+def normalize_tag(tag: str) -> str:
+    tag = tag.strip().lower()
+    return tag if tag.startswith("#") else "#" + tag
+
+class HashtagVocab:
+    """
+    Interns hashtag strings to small integer codes. The vocab owns one str
+    and one int object per distinct tag, so index rows store only the codes.
+    """
+    def __init__(self):
+        self._codes: Dict[str, int] = {}
+        self._names: List[str] = []
+
+    def __len__(self):
+        return len(self._names)
+
+    def encode(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        out = []
+        for tag in tags:
+            code = self._codes.get(tag)
+            if code is None:
+                tag = sys.intern(tag)
+                code = self._codes[tag] = len(self._names)
+                self._names.append(tag)
+            out.append(code)
+        return tuple(out)
+
+    def decode(self, codes: Iterable[int]) -> List[str]:
+        names = self._names
+        return [names[c] for c in codes]
+
+    def code(self, tag: str) -> Optional[int]:
+        """Code of `tag`, or None if it was never encoded."""
+        return self._codes.get(tag)
+
+    def name(self, code: int) -> str:
+        return self._names[code]
+
+class HashtagIndex:
+    def __init__(self):
+        self.tags = HashtagVocab()
+        self.profiles: List[str] = []
+        self.themes: List[str] = []
+        self._profile_codes: Dict[str, int] = {}
+        self._theme_codes: Dict[str, int] = {}
+        self._rows: Dict[str, int] = {}         # post key (video ID or URL) -> live row
+        self.post_keys: List[Optional[str]] = []  # None: retired row (post re-indexed)
+        self.post_profile = array("I")
+        self.post_theme = array("I")
+        self.post_er = array("d")               # NaN: no ER (no views)
+        self.tag_offsets = array("Q", [0])
+        self.post_tags = array("I")
+        self.postings: List[array] = []
+        self.profile_rows: List[array] = []
+        self.cooc: List[Dict[int, int]] = []
+        self.tag_er_n: List[int] = []
+        self.tag_er_sum: List[float] = []
+        self.er_n = 0
+        self.er_sum = 0.0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _code(self, codes: Dict[str, int], names: List[str], name: str) -> int:
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    # ----- building -----
+    def add_posts(self, username: str, posts: Iterable[Mapping]):
+        """
+        Index scrape_post() records of one profile. A post seen before only
+        updates its ER, unless its hashtags, theme or creator changed: then it
+        is re-indexed.
+        """
+        profile = self._profile(username)
+        for p in posts:
+            url = p.get("url") or ""
+            key = smdc.video_id_from_url(url) or url.split("?")[0].rstrip("/")
+            er = p.get("er_view")
+            theme = self._code(self._theme_codes, self.themes, p.get("theme") or "general english")
+            codes = sorted(set(self.tags.encode(dict.fromkeys(normalize_tag(h) for h in p.get("hashtags") or ()))))
+            row = self._rows.get(key)
+            if row is not None and (self.post_profile[row], self.post_theme[row], self._tags_of(row)) \
+                    == (profile, theme, codes):
+                self._update_er(row, er)
+                continue
+            if row is not None:
+                self._retire(row)
+            self._add_post(key, profile, theme, codes, er)
+
+    def _profile(self, username: str) -> int:
+        profile = self._code(self._profile_codes, self.profiles, username)
+        if profile == len(self.profile_rows):
+            self.profile_rows.append(array("I"))
+        return profile
+
+    def _tags_of(self, row: int) -> List[int]:
+        return self.post_tags[self.tag_offsets[row]:self.tag_offsets[row + 1]].tolist()
+
+    def _add_post(self, key: str, profile: int, theme: int, codes: List[int], er: Optional[float]):
+        """Append a row for `key`; codes are sorted, distinct hashtag codes."""
+        row = self._rows[key] = len(self.post_keys)
+        self.post_keys.append(key)
+        self.post_profile.append(profile)
+        self.profile_rows[profile].append(row)
+        self.post_theme.append(theme)
+        while len(self.postings) < len(self.tags):
+            self.postings.append(array("I"))
+            self.cooc.append({})
+            self.tag_er_n.append(0)
+            self.tag_er_sum.append(0.0)
+        self.post_tags.extend(codes)
+        self.tag_offsets.append(len(self.post_tags))
+        cooc = self.cooc
+        for i, a in enumerate(codes):
+            self.postings[a].append(row)
+            row_a = cooc[a]
+            for b in codes[i + 1:]:
+                row_a[b] = row_a.get(b, 0) + 1
+                row_b = cooc[b]
+                row_b[a] = row_b.get(a, 0) + 1
+        self.post_er.append(NAN)
+        self._update_er(row, er)
+
+    def _retire(self, row: int):
+        """
+        Take a row out of every posting, pair count and ER total. The row
+        stays in the flat arrays with no ER, so filtered scans skip it; save()
+        drops it.
+        """
+        self._update_er(row, None)
+        codes = self._tags_of(row)
+        cooc = self.cooc
+        for i, a in enumerate(codes):
+            self.postings[a].remove(row)
+            for b in codes[i + 1:]:
+                for x, y in ((a, b), (b, a)):
+                    n = cooc[x][y] - 1
+                    if n: cooc[x][y] = n
+                    else: del cooc[x][y]
+        self.profile_rows[self.post_profile[row]].remove(row)
+        del self._rows[self.post_keys[row]]
+        self.post_keys[row] = None
+
+    def _update_er(self, row: int, er: Optional[float]):
+        old = self.post_er[row]
+        new = NAN if er is None else float(er)
+        if old == new or (old != old and new != new): return
+        codes = self.post_tags[self.tag_offsets[row]:self.tag_offsets[row + 1]]
+        for value, sign in ((old, -1), (new, 1)):
+            if value != value: continue     # NaN
+            self.er_n += sign
+            self.er_sum += sign * value
+            for c in codes:
+                self.tag_er_n[c] += sign
+                self.tag_er_sum[c] += sign * value
+        self.post_er[row] = new
+
+    # ----- queries -----
+    def posts_with(self, *tags: str) -> List[str]:
+        """Keys of posts carrying every one of `tags` (intersection of postings)."""
+        lists = []
+        for tag in tags:
+            code = self.tags.code(normalize_tag(tag))
+            if code is None: return []
+            lists.append(self.postings[code])
+        if not lists: return []
+        lists.sort(key=len)
+        rows = set(lists[0])
+        for other in lists[1:]:
+            rows.intersection_update(other)
+        return [self.post_keys[r] for r in sorted(rows)]
+
+    def _scope_totals(self, usernames: Optional[Sequence[str]], themes: Optional[Sequence[str]]
+                      ) -> Tuple[int, float, Dict[int, int], Dict[int, float]]:
+        """(posts with ER, ER sum, {tag: n}, {tag: ER sum}) over posts matching the filters."""
+        profiles = [self._profile_codes[u] for u in usernames or () if u in self._profile_codes]
+        wanted = {self._theme_codes[t] for t in themes or () if t in self._theme_codes}
+        if (usernames and not profiles) or (themes and not wanted):
+            return 0, 0.0, {}, {}
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        if np is not None:
+            er = np.frombuffer(self.post_er, dtype=np.float64)
+            keep = ~np.isnan(er)
+            if usernames:
+                mask = np.zeros(len(er), dtype=bool)
+                for code in profiles:
+                    mask[np.frombuffer(self.profile_rows[code], dtype=np.uint32)] = True
+                keep &= mask
+            if themes:
+                keep &= np.isin(np.frombuffer(self.post_theme, dtype=np.uint32), list(wanted))
+            offsets = np.frombuffer(self.tag_offsets, dtype=np.uint64).astype(np.int64)
+            tags = np.frombuffer(self.post_tags, dtype=np.uint32)
+            post_of_tag = np.repeat(np.arange(len(er)), np.diff(offsets))
+            sel = keep[post_of_tag]
+            n = np.bincount(tags[sel], minlength=len(self.tags))
+            s = np.bincount(tags[sel], weights=er[post_of_tag[sel]], minlength=len(self.tags))
+            nz = np.flatnonzero(n).tolist()
+            return (int(keep.sum()), float(er[keep].sum()),
+                    dict(zip(nz, n[nz].tolist())), dict(zip(nz, s[nz].tolist())))
+
+        if usernames:
+            rows = (r for code in profiles for r in self.profile_rows[code])
+        else:
+            rows = range(len(self.post_keys))
+        n, s = defaultdict(int), defaultdict(float)
+        er_n, er_sum = 0, 0.0
+        post_er, post_theme, offsets, post_tags = self.post_er, self.post_theme, self.tag_offsets, self.post_tags
+        for r in rows:
+            er = post_er[r]
+            if er != er or (themes and post_theme[r] not in wanted): continue
+            er_n += 1; er_sum += er
+            for c in post_tags[offsets[r]:offsets[r + 1]]:
+                n[c] += 1; s[c] += er
+        return er_n, er_sum, n, s
+
+    def top_lift(self, k: int = 20, min_count: int = 2, usernames: Optional[Sequence[str]] = None,
+                 themes: Optional[Sequence[str]] = None, lowest: bool = False
+                 ) -> Tuple[float, List[Tuple[str, int, float, float]]]:
+        """
+        (overall ER, [(tag, n, avg ER, lift)]) for the k tags with the highest
+        lift (lowest with lowest=True) among tags on at least min_count posts
+        with ER, restricted to posts of `usernames` and/or with a theme in
+        `themes`. Ties by tag, as in hashtag_efficiency().
+        """
+        if usernames or themes:
+            er_n, er_sum, counts, sums = self._scope_totals(usernames, themes)
+            counts = {c: n for c, n in counts.items() if n >= min_count}
+        else:
+            er_n, er_sum = self.er_n, self.er_sum
+            counts = {c: n for c, n in enumerate(self.tag_er_n) if n >= min_count}
+            sums = self.tag_er_sum
+        overall = er_sum / er_n if er_n else 0.0
+        name = self.tags.name
+        sign = 1 if lowest else -1
+        best = heapq.nsmallest(k, counts, key=lambda c: (sign * (sums[c] / counts[c]), name(c)))
+        return overall, [(name(c), counts[c], sums[c] / counts[c], sums[c] / counts[c] - overall) for c in best]
+
+    def cooccurring(self, tag: str, k: int = 20, min_count: int = 1, by: str = "count"
+                    ) -> List[Tuple[str, int, float, float]]:
+        """
+        [(other tag, posts with both, share of `tag`'s posts, lift)] for the k
+        tags most often seen with `tag` (by="count") or most over-represented
+        next to it (by="lift": P(other | tag) / P(other)), among pairs on at
+        least min_count posts.
+        """
+        if by not in ("count", "lift"):
+            raise ValueError(f"by must be 'count' or 'lift', not {by!r}")
+        code = self.tags.code(normalize_tag(tag))
+        if code is None: return []
+        n_tag, n_posts = len(self.postings[code]), len(self._rows)
+        postings, name = self.postings, self.tags.name
+        pairs = [(b, n) for b, n in self.cooc[code].items() if n >= min_count]
+        if by == "count":
+            best = heapq.nsmallest(k, pairs, key=lambda bn: (-bn[1], name(bn[0])))
+        else:
+            best = heapq.nsmallest(k, pairs, key=lambda bn: (-bn[1] / len(postings[bn[0]]), name(bn[0])))
+        return [(name(b), n, n / n_tag, n * n_posts / (n_tag * len(postings[b]))) for b, n in best]
+
+    # ----- persistence -----
+    def save(self, path: str):
+        """
+        Write the index atomically as JSON: the names, then one
+        [key, profile, theme, ER or null, [hashtag codes]] row per live post.
+        """
+        posts = [[key, self.post_profile[row], self.post_theme[row],
+                  None if self.post_er[row] != self.post_er[row] else self.post_er[row], self._tags_of(row)]
+                 for row, key in enumerate(self.post_keys) if key is not None]
+        state = {"version": FORMAT_VERSION, "tags": self.tags.decode(range(len(self.tags))),
+                 "profiles": self.profiles, "themes": self.themes, "posts": posts}
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps(state, ensure_ascii=False, separators=(",", ":")))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "HashtagIndex":
+        """Index saved at `path`, or an empty one if the file does not exist yet."""
+        index = cls()
+        if not os.path.exists(path): return index
+        try:
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            state = None
+        if not isinstance(state, dict) or state.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported hashtag index format; rebuild it")
+        index.tags.encode(state["tags"])
+        for name in state["profiles"]:
+            index._profile(name)
+        for name in state["themes"]:
+            index._code(index._theme_codes, index.themes, name)
+        for key, profile, theme, er, codes in state["posts"]:
+            index._add_post(key, profile, theme, codes, er)
+        return index
+
+def _print_lift(overall: float, rows):
+    print(f"overall ER {overall:.4f}")
+    for tag, n, avg, lift in rows:
+        print(f"  {tag:<32} n={n:<8} ER {avg:.4f}  lift {lift:+.4f}")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--index", default=smdc.HASHTAG_INDEX or "hashtags.idx")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="add stored posts (pipeline output and/or post cache)")
+    b.add_argument("--input", default=None, help=f"pipeline output directory (default: {smdc.OUTPUT_DIR})")
+    b.add_argument("--cache", default=None, help="post cache directory to read as well")
+    t = sub.add_parser("top", help="hashtags by ER lift")
+    t.add_argument("--k", type=int, default=20)
+    t.add_argument("--min-count", type=int, default=smdc.MIN_HASHTAG_OCCURRENCES)
+    t.add_argument("--user", nargs="*", help="only posts of these creators")
+    t.add_argument("--theme", nargs="*", help="only posts with these themes")
+    t.add_argument("--lowest", action="store_true", help="most negative lift first")
+    c = sub.add_parser("cooc", help="hashtags that co-occur with a hashtag")
+    c.add_argument("tag")
+    c.add_argument("--k", type=int, default=20)
+    c.add_argument("--min-count", type=int, default=2)
+    c.add_argument("--by", choices=("count", "lift"), default="count")
+    args = ap.parse_args()
+
+    index = HashtagIndex.load(args.index)
+    if args.cmd == "build":
+        from reanalyze import load_store, raw_fields
+        input_dir = args.input if args.input or args.cache else smdc.OUTPUT_DIR
+        profiles, _, _ = load_store(input_dir, args.cache)
+        for username, rows in profiles.items():
+            index.add_posts(username, (smdc.build_post_record(r.get("url") or "", raw_fields(r)) for r in rows))
+        index.save(args.index)
+        print(f"Saved: {args.index} ({len(index)} posts, {len(index.tags)} hashtags, "
+              f"{len(index.profiles)} profiles)")
+    elif args.cmd == "top":
+        _print_lift(*index.top_lift(args.k, args.min_count, args.user, args.theme, args.lowest))
+    else:
+        for tag, n, share, lift in index.cooccurring(args.tag, args.k, args.min_count, args.by):
+            print(f"  {tag:<32} n={n:<8} {share:6.1%} of {normalize_tag(args.tag)} posts  lift {lift:.2f}")
+
+if __name__ == "__main__":
+    main()
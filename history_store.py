@@ -0,0 +1,316 @@
+# history_store.py
+"""
+SQLite history of post and profile snapshots, for growth over time.
+
+Every scraped post is stored as a timestamped snapshot of its counts, so
+repeated runs build up a time series instead of overwriting the summary:
+
+    posts              post_id <- (username, video_id), url, created_at
+    post_snapshots     (post_id, fetched_at) -> views, likes, ...
+    profile_snapshots  (username, fetched_at) -> followers, following
+
+posts carries the unique (username, video_id) index; snapshot tables are
+WITHOUT ROWID, clustered on (post_id, fetched_at), so one post's history is
+a contiguous range of small integer keys. Writes are buffered and upserted
+in one transaction per batch, and the database runs in WAL mode so readers
+are not blocked by a run in progress. fetched_at is stored in whole seconds;
+recording the same snapshot twice (a cached post with its original fetch
+time) is a no-op.
+
+    with HistoryStore("history.sqlite") as store:
+        store.record_posts("someuser", posts)
+        store.post_velocity(window_hours=24, metric="views")
+        store.profile_velocity(window_hours=24)
+
+    python history_store.py history.sqlite --window 24 --top 20
+    python history_store.py history.sqlite --profiles --metric likes
+"""
+import argparse
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import Social_Media_Data_Collection as smdc
+
+METRICS = ("views", "likes", "comments", "shares", "saves")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    post_id    INTEGER PRIMARY KEY,
+    username   TEXT    NOT NULL,
+    video_id   TEXT    NOT NULL,
+    url        TEXT,
+    created_at INTEGER,
+    UNIQUE (username, video_id)
+);
+CREATE TABLE IF NOT EXISTS post_snapshots (
+    post_id    INTEGER NOT NULL,
+    fetched_at INTEGER NOT NULL,
+    views      INTEGER,
+    likes      INTEGER,
+    comments   INTEGER,
+    shares     INTEGER,
+    saves      INTEGER,
+    PRIMARY KEY (post_id, fetched_at)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS profile_snapshots (
+    username   TEXT    NOT NULL,
+    fetched_at INTEGER NOT NULL,
+    followers  INTEGER,
+    following  INTEGER,
+    PRIMARY KEY (username, fetched_at)
+) WITHOUT ROWID;
+"""
+
+UPSERT_POST = """
+INSERT INTO posts (username, video_id, url, created_at) VALUES (?, ?, ?, ?)
+ON CONFLICT (username, video_id) DO UPDATE SET
+    url = excluded.url, created_at = COALESCE(excluded.created_at, posts.created_at)
+"""
+UPSERT_POST_SNAPSHOT = """
+INSERT INTO post_snapshots VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (post_id, fetched_at) DO UPDATE SET
+    views = excluded.views, likes = excluded.likes, comments = excluded.comments,
+    shares = excluded.shares, saves = excluded.saves
+"""
+UPSERT_PROFILE_SNAPSHOT = """
+INSERT INTO profile_snapshots VALUES (?, ?, ?, ?)
+ON CONFLICT (username, fetched_at) DO UPDATE SET
+    followers = excluded.followers, following = excluded.following
+"""
+
+# First and last snapshot of each post inside the window. SQLite returns the
+# bare columns of the row that holds MIN()/MAX(), and the grouping follows
+# the primary key, so each side is one ordered index scan without a sort.
+POST_VELOCITY_SQL = """
+SELECT p.username, p.video_id, f.t, f.v, l.t, l.v
+FROM (SELECT post_id, MIN(fetched_at) AS t, {metric} AS v
+      FROM post_snapshots WHERE fetched_at >= ? AND fetched_at <= ? {where}
+      GROUP BY post_id) AS f
+JOIN (SELECT post_id, MAX(fetched_at) AS t, {metric} AS v
+      FROM post_snapshots WHERE fetched_at >= ? AND fetched_at <= ? {where}
+      GROUP BY post_id) AS l USING (post_id)
+JOIN posts AS p USING (post_id)
+WHERE l.t > f.t
+"""
+POSTS_OF_USER = "AND post_id IN (SELECT post_id FROM posts WHERE username = ?)"
+FOLLOWER_VELOCITY_SQL = """
+SELECT f.username, f.t, f.v, l.t, l.v
+FROM (SELECT username, MIN(fetched_at) AS t, followers AS v
+      FROM profile_snapshots WHERE fetched_at >= ? AND fetched_at <= ? {where}
+      GROUP BY username) AS f
+JOIN (SELECT username, MAX(fetched_at) AS t, followers AS v
+      FROM profile_snapshots WHERE fetched_at >= ? AND fetched_at <= ? {where}
+      GROUP BY username) AS l USING (username)
+WHERE l.t > f.t
+"""
+
+def _epoch(ts) -> Optional[int]:
+    return int(ts.timestamp()) if isinstance(ts, datetime) else None
+
+class HistoryStore:
+    """Buffered writer and query API over one SQLite file; safe to share between threads."""
+    def __init__(self, path: str = "history.sqlite", batch_size: int = 5000):
+        self.path = path
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")   # durable at checkpoints; WAL keeps the db consistent
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._ids: Dict[Tuple[str, str], int] = {}     # (username, video_id) -> post_id, once written
+        self._new_posts: Dict[Tuple[str, str], Tuple] = {}
+        self._post_snaps: List[Tuple] = []              # (username, video_id, fetched_at, counts...)
+        self._profile_snaps: List[Tuple] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # ----- writes -----
+    def record_posts(self, username: str, posts: Iterable[Dict], fetched_at: Optional[float] = None):
+        """
+        Buffer one snapshot per post. fetched_at defaults to now; a post may
+        carry its own (e.g. from the post cache) under "fetched_at".
+        """
+        now = time.time() if fetched_at is None else fetched_at
+        with self._lock:
+            known, new_posts, append = self._ids, self._new_posts, self._post_snaps.append
+            for p in posts:
+                url = p.get("url") or ""
+                video_id = smdc.video_id_from_url(url) or url.split("?")[0].rstrip("/")
+                key = (username, video_id)
+                if key not in known:
+                    new_posts[key] = (username, video_id, url, _epoch(p.get("timestamp")))
+                append((username, video_id, int(p.get("fetched_at") or now),
+                        p.get("views"), p.get("likes"), p.get("comments"), p.get("shares"), p.get("saves")))
+            full = len(self._post_snaps) >= self.batch_size
+        if full: self.flush()
+
+    def record_profile(self, username: str, followers: Optional[int], following: Optional[int],
+                       fetched_at: Optional[float] = None):
+        with self._lock:
+            self._profile_snaps.append((username, int(time.time() if fetched_at is None else fetched_at),
+                                        followers, following))
+
+    def flush(self):
+        """Write everything buffered in one transaction."""
+        with self._lock:
+            if not (self._post_snaps or self._profile_snaps): return
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._new_posts:
+                    conn.executemany(UPSERT_POST, self._new_posts.values())
+                    users = {u for u, _ in self._new_posts}
+                    for username in users:
+                        for video_id, post_id in conn.execute(
+                                "SELECT video_id, post_id FROM posts WHERE username = ?", (username,)):
+                            self._ids[(username, video_id)] = post_id
+                ids = self._ids
+                conn.executemany(UPSERT_POST_SNAPSHOT,
+                                 [(ids[snap[:2]],) + snap[2:] for snap in self._post_snaps])
+                conn.executemany(UPSERT_PROFILE_SNAPSHOT, self._profile_snaps)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            self._new_posts, self._post_snaps, self._profile_snaps = {}, [], []
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    # ----- queries -----
+    def _window(self, window_hours: Optional[float], now: Optional[float]) -> Tuple[float, float]:
+        until = time.time() if now is None else now
+        since = until - window_hours * 3600 if window_hours else float("-inf")
+        return since, until
+
+    def post_velocity(self, window_hours: Optional[float] = 24, metric: str = "views",
+                      username: Optional[str] = None, now: Optional[float] = None,
+                      top: Optional[int] = None) -> List[Tuple[str, str, int, int, float, float]]:
+        """
+        Growth of `metric` per post between its first and last snapshot in the
+        window (window_hours=None: all history). Posts with fewer than two
+        snapshots in the window are left out. Returns
+        [(username, video_id, first_value, last_value, hours, per_hour)],
+        fastest growing first.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {METRICS}, not {metric!r}")
+        since, until = self._window(window_hours, now)
+        where, params = (POSTS_OF_USER, (since, until, username)) if username else ("", (since, until))
+        sql = POST_VELOCITY_SQL.format(metric=metric, where=where)
+        with self._lock:
+            rows = self._conn.execute(sql, params * 2).fetchall()
+        out = []
+        for user, video_id, t0, v0, t1, v1 in rows:
+            if v0 is None or v1 is None: continue
+            hours = (t1 - t0) / 3600
+            out.append((user, video_id, v0, v1, hours, (v1 - v0) / hours))
+        out.sort(key=lambda r: r[5], reverse=True)
+        return out[:top] if top else out
+
+    def profile_velocity(self, window_hours: Optional[float] = 24, metric: str = "views",
+                         usernames: Optional[Sequence[str]] = None, now: Optional[float] = None
+                         ) -> List[Dict]:
+        """
+        Per-profile growth in the window: `metric` gained across its tracked
+        posts and the summed per-post rates (metric_per_hour), plus follower
+        growth from the profile snapshots. Fastest growing first.
+        """
+        since, until = self._window(window_hours, now)
+        wanted = set(usernames) if usernames else None
+        out: Dict[str, Dict] = {}
+
+        def entry(user):
+            return out.setdefault(user, {"username": user, "posts": 0, f"{metric}_gained": 0,
+                                         f"{metric}_per_hour": 0.0, "followers_gained": None,
+                                         "followers_per_hour": None})
+
+        username = usernames[0] if usernames and len(usernames) == 1 else None
+        for user, _, v0, v1, _, per_hour in self.post_velocity(window_hours, metric, username, now):
+            if wanted and user not in wanted: continue
+            e = entry(user)
+            e["posts"] += 1
+            e[f"{metric}_gained"] += v1 - v0
+            e[f"{metric}_per_hour"] += per_hour
+
+        where, params = ("AND username = ?", (since, until, username)) if username else ("", (since, until))
+        with self._lock:
+            rows = self._conn.execute(FOLLOWER_VELOCITY_SQL.format(where=where), params * 2).fetchall()
+        for user, t0, v0, t1, v1 in rows:
+            if (wanted and user not in wanted) or v0 is None or v1 is None: continue
+            e = entry(user)
+            e["followers_gained"] = v1 - v0
+            e["followers_per_hour"] = (v1 - v0) / ((t1 - t0) / 3600)
+        return sorted(out.values(), key=lambda e: e[f"{metric}_per_hour"], reverse=True)
+
+    def post_histories(self, usernames: Optional[Sequence[str]] = None, keep: Optional[int] = None
+                       ) -> Dict[Tuple[str, str], Tuple[Optional[int], List[Tuple]]]:
+        """
+        {(username, video_id): (created_at, [(fetched_at, views, likes, comments,
+        shares, saves)])} with snapshots oldest first; keep=N returns only each
+        post's latest N snapshots.
+        """
+        where, params = "", ()
+        if usernames:
+            where = f"WHERE p.username IN ({','.join('?' * len(usernames))})"
+            params = tuple(usernames)
+        snaps = "post_snapshots"
+        if keep:
+            snaps = ("(SELECT *, ROW_NUMBER() OVER (PARTITION BY post_id ORDER BY fetched_at DESC) AS n "
+                     "FROM post_snapshots)")
+            where = f"{where} {'AND' if where else 'WHERE'} s.n <= ?"
+            params += (keep,)
+        sql = ("SELECT p.username, p.video_id, p.created_at, s.fetched_at, s.views, s.likes, s.comments, "
+               f"s.shares, s.saves FROM posts AS p JOIN {snaps} AS s USING (post_id) {where} "
+               "ORDER BY p.post_id, s.fetched_at")
+        out: Dict[Tuple[str, str], Tuple[Optional[int], List[Tuple]]] = {}
+        with self._lock:
+            for user, video_id, created_at, *snap in self._conn.execute(sql, params):
+                key = (user, video_id)
+                if key not in out: out[key] = (created_at, [])
+                out[key][1].append(tuple(snap))
+        return out
+
+    def snapshots(self, username: str, video_id: str) -> List[Tuple]:
+        """[(fetched_at, views, likes, comments, shares, saves)] for one post, oldest first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT s.fetched_at, s.views, s.likes, s.comments, s.shares, s.saves "
+                "FROM posts AS p JOIN post_snapshots AS s USING (post_id) "
+                "WHERE p.username = ? AND p.video_id = ? ORDER BY s.fetched_at", (username, video_id)).fetchall()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("db", nargs="?", default=smdc.HISTORY_DB or "history.sqlite")
+    ap.add_argument("--window", type=float, default=24, help="hours back from now (0 = all history)")
+    ap.add_argument("--metric", choices=METRICS, default="views")
+    ap.add_argument("--user", help="only this username")
+    ap.add_argument("--profiles", action="store_true", help="per-profile instead of per-post velocity")
+    ap.add_argument("--top", type=int, default=20)
+    args = ap.parse_args()
+
+    with HistoryStore(args.db) as store:
+        if args.profiles:
+            rows = store.profile_velocity(args.window or None, args.metric, [args.user] if args.user else None)
+            for e in rows[:args.top]:
+                fol = f"{e['followers_per_hour']:+,.1f}/h" if e["followers_per_hour"] is not None else "n/a"
+                print(f"@{e['username']:<24} {e[args.metric + '_per_hour']:>+14,.1f} {args.metric}/h "
+                      f"over {e['posts']} posts | followers {fol}")
+        else:
+            for user, video_id, v0, v1, hours, rate in store.post_velocity(
+                    args.window or None, args.metric, args.user, top=args.top):
+                print(f"@{user:<24} {video_id:<22} {v0:>12,} -> {v1:>12,} in {hours:6.1f}h "
+                      f"{rate:>+12,.1f} {args.metric}/h")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# http_fetch.py
+"""
+Browserless fetch engine for post pages.
+
+Post pages embed their stats as JSON, so most of them can be downloaded over
+plain HTTP and parsed with the same parse_post_html()/build_post_record()
+used by scrape_post(). Requests go through an asyncio connection pool that
+keeps HTTP/1.1 connections alive per host; only URLs whose JSON is missing
+or incomplete are handed to Selenium. Requests honour RATE_LIMIT_PER_HOST,
+and 429/5xx responses are retried with backoff up to MAX_ATTEMPTS.
+"""
+import asyncio
+import ssl
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import Social_Media_Data_Collection as smdc
+import instrumentation as instr
+from scheduler import RateLimited, TransientError, retry_delay
+
+MAX_REDIRECTS = 5
+DEFAULT_HEADERS = {
+    "User-Agent": smdc.DESKTOP_USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+class HTTPResponse:
+    __slots__ = ("url", "status", "headers", "body")
+
+    def __init__(self, url: str, status: int, headers: Dict[str, str], body: bytes):
+        self.url, self.status, self.headers, self.body = url, status, headers, body
+
+    @property
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+class AsyncConnectionPool:
+    """
+    Keep-alive HTTP/1.1 client. At most max_per_host requests are in flight
+    per host; idle connections are reused by later requests to that host.
+    """
+    def __init__(self, max_per_host: int = 16, timeout: float = 20.0,
+                 headers: Optional[Dict[str, str]] = None):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.headers = dict(DEFAULT_HEADERS, **(headers or {}))
+        self.connections_opened = 0
+        self._idle: Dict[Tuple[str, str, int], List] = defaultdict(list)
+        self._limits: Dict[Tuple[str, str, int], asyncio.Semaphore] = {}
+        self._ssl = ssl.create_default_context()
+
+    @staticmethod
+    def _key(url: str) -> Tuple[str, str, int]:
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        return scheme, parts.hostname or "", port
+
+    async def _connect(self, key):
+        idle = self._idle[key]
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        scheme, host, port = key
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=self._ssl if scheme == "https" else None)
+        self.connections_opened += 1
+        return reader, writer, False
+
+    async def _send(self, reader, writer, url: str):
+        parts = urlsplit(url)
+        target = parts.path or "/"
+        if parts.query: target += "?" + parts.query
+        lines = [f"GET {target} HTTP/1.1", f"Host: {parts.netloc}"]
+        lines += [f"{k}: {v}" for k, v in self.headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed before response")
+        status = int(status_line.split()[1])
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""): break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        reusable = headers.get("connection", "").lower() != "close"
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            reusable = False
+
+        encoding = headers.get("content-encoding", "").lower()
+        if encoding == "gzip":
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            body = zlib.decompress(body)
+        return status, headers, body, reusable
+
+    async def get(self, url: str) -> HTTPResponse:
+        for _ in range(MAX_REDIRECTS + 1):
+            key = self._key(url)
+            limit = self._limits.setdefault(key, asyncio.Semaphore(self.max_per_host))
+            async with limit:
+                reader, writer, reused = await self._connect(key)
+                try:
+                    result = await asyncio.wait_for(self._send(reader, writer, url), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if not reused:
+                        raise
+                    # stale keep-alive connection: retry once on a fresh one
+                    instr.count("retries", stage="http_keepalive")
+                    reader, writer, _ = await self._connect(key)
+                    try:
+                        result = await asyncio.wait_for(self._send(reader, writer, url), self.timeout)
+                    except BaseException:
+                        writer.close()
+                        raise
+                except BaseException:
+                    writer.close()
+                    raise
+                status, headers, body, reusable = result
+                if reusable:
+                    self._idle[key].append((reader, writer))
+                else:
+                    writer.close()
+            if status in (301, 302, 303, 307, 308) and "location" in headers:
+                url = urljoin(url, headers["location"])
+                continue
+            return HTTPResponse(url, status, headers, body)
+        raise RuntimeError(f"too many redirects: {url}")
+
+    async def close(self):
+        for conns in self._idle.values():
+            for _, writer in conns:
+                writer.close()
+        self._idle.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+# ---------- Post fetching ----------
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None  # HTTP-date form: fall back to plain backoff
+
+async def _fetch_posts(urls: Sequence[str], concurrency: int) -> List[Optional[Dict]]:
+    async with AsyncConnectionPool(max_per_host=concurrency) as pool:
+        limiter = smdc.rate_limiter()
+
+        async def one(url: str) -> Optional[Dict]:
+            for attempt in range(smdc.MAX_ATTEMPTS):
+                if limiter: await limiter.wait_async(url)
+                try:
+                    resp = await pool.get(url)
+                except Exception as e:
+                    resp, err = None, e
+                else:
+                    if resp.status == 200: break
+                    if resp.status == 429:
+                        err = RateLimited(url, _retry_after(resp.headers.get("retry-after")))
+                        if limiter and err.retry_after: limiter.penalize(url, err.retry_after)
+                    elif resp.status >= 500:
+                        err = TransientError(f"HTTP {resp.status}: {url}")
+                    else:
+                        return None
+                if attempt + 1 >= smdc.MAX_ATTEMPTS:
+                    return None
+                instr.count("retries", stage="http")
+                await asyncio.sleep(retry_delay(err, attempt, smdc.BACKOFF_BASE, smdc.BACKOFF_CAP))
+            fields = smdc.parse_post_html(resp.text, url)
+            if not smdc.post_fields_complete(fields):
+                return None
+            return smdc.build_post_record(url, fields)
+
+        return await asyncio.gather(*(one(u) for u in urls))
+
+def fetch_posts_http(urls: Sequence[str], concurrency: Optional[int] = None) -> List[Optional[Dict]]:
+    """
+    Fetch and parse post pages over HTTP. Returns one entry per URL, in
+    order: the post record, or None when the page needs a browser.
+    """
+    if not urls:
+        return []
+    with instr.span("http_fetch"):
+        return asyncio.run(_fetch_posts(list(urls), concurrency or smdc.HTTP_CONCURRENCY))
+
+def scrape_posts_http(post_urls: Sequence[str], fallback_driver=None,
+                      concurrency: Optional[int] = None) -> List[Dict]:
+    """
+    HTTP-first replacement for the serial scrape_post() loop. URLs that
+    need a browser are scraped with fallback_driver (skipped if None).
+    """
+    fetched = fetch_posts_http(post_urls, concurrency)
+    posts = []
+    for i, (url, post) in enumerate(zip(post_urls, fetched), 1):
+        if post is None:
+            instr.count("http_browser_fallback")
+            if fallback_driver is None:
+                print(f"   (post {i}/{len(post_urls)} skipped: no embedded JSON)")
+                continue
+            print(f"  Scraping post {i}/{len(post_urls)} in browser (no embedded JSON) …")
+            try:
+                post = smdc.scrape_post_retrying(fallback_driver, url)
+            except Exception as e:
+                print(f"   (skipped due to error: {e})")
+                continue
+        posts.append(post)
+    return posts
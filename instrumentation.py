@@ -0,0 +1,164 @@
+# instrumentation.py
+"""
+Stage timings and counters for the scraper's hot paths.
+
+    with span("navigate"): driver.get(url)
+
+    @timed("analytics")
+    def profile_metrics(posts): ...
+
+    count("extraction", field="views", path="dom")
+
+Nothing is recorded until enable() is called; while disabled, span() returns
+a shared no-op context and count()/observe() return immediately. When
+enabled, every span appends one JSON line to the trace file (if any), and
+write_prometheus() exports the totals in Prometheus text format:
+
+    scraper_stage_seconds_sum{stage="navigate"} 12.5
+    scraper_stage_seconds_count{stage="navigate"} 40
+    scraper_timeouts_total{wait="cookie_banner"} 3
+"""
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+ENABLED = False
+METRIC_PREFIX = "scraper"
+
+_lock = threading.Lock()
+_trace = None
+# (stage, labels) -> [count, total seconds, max seconds]
+STAGES: Dict[Tuple, list] = {}
+# (name, labels) -> count
+COUNTERS: Dict[Tuple, int] = {}
+
+def _key(name: str, labels: Dict) -> Tuple:
+    return (name, tuple(sorted(labels.items())))
+
+def enable(trace_path: Optional[str] = None):
+    """Start recording; spans are also appended to `trace_path` as JSON lines."""
+    global ENABLED, _trace
+    with _lock:
+        if _trace is not None: _trace.close()
+        _trace = open(trace_path, "a", encoding="utf-8") if trace_path else None
+        ENABLED = True
+
+def disable():
+    global ENABLED, _trace
+    with _lock:
+        ENABLED = False
+        if _trace is not None:
+            _trace.close()
+            _trace = None
+
+def reset():
+    with _lock:
+        STAGES.clear()
+        COUNTERS.clear()
+
+# ---------- Recording ----------
+def observe(stage: str, seconds: float, **labels):
+    """Record one timed occurrence of `stage`."""
+    if not ENABLED: return
+    key = _key(stage, labels)
+    with _lock:
+        st = STAGES.get(key)
+        if st is None:
+            STAGES[key] = [1, seconds, seconds]
+        else:
+            st[0] += 1; st[1] += seconds
+            if seconds > st[2]: st[2] = seconds
+        if _trace is not None:
+            event = {"ts": round(time.time(), 6), "stage": stage, "seconds": round(seconds, 6)}
+            event.update(labels)
+            _trace.write(json.dumps(event) + "\n")
+
+def count(name: str, n: int = 1, **labels):
+    if not ENABLED: return
+    key = _key(name, labels)
+    with _lock:
+        COUNTERS[key] = COUNTERS.get(key, 0) + n
+
+class _Span:
+    __slots__ = ("stage", "labels", "t0")
+
+    def __init__(self, stage: str, labels: Dict):
+        self.stage, self.labels = stage, labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = self.labels
+        if exc_type is not None:
+            labels = dict(labels, error=exc_type.__name__)
+        observe(self.stage, time.perf_counter() - self.t0, **labels)
+        return False
+
+class _NoSpan:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NO_SPAN = _NoSpan()
+
+def span(stage: str, **labels):
+    """Context manager timing its block under `stage` (no-op while disabled)."""
+    return _Span(stage, labels) if ENABLED else _NO_SPAN
+
+def timed(stage: str) -> Callable:
+    """Decorator form of span(); the disabled path is a single flag check."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with _Span(stage, {}):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+# ---------- Export ----------
+def _labels_text(labels: Tuple) -> str:
+    if not labels: return ""
+    parts = []
+    for k, v in labels:
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+def prometheus_text() -> str:
+    with _lock:
+        stages = sorted(STAGES.items())
+        counters = sorted(COUNTERS.items())
+    base = f"{METRIC_PREFIX}_stage_seconds"
+    lines = [f"# HELP {base} Wall time spent per scraper stage.", f"# TYPE {base} summary"]
+    for (stage, labels), (n, total, _) in stages:
+        lbl = _labels_text((("stage", stage),) + labels)
+        lines.append(f"{base}_sum{lbl} {total:.6f}")
+        lines.append(f"{base}_count{lbl} {n}")
+    lines += [f"# HELP {base}_max Longest single occurrence per stage.", f"# TYPE {base}_max gauge"]
+    for (stage, labels), (_, _, longest) in stages:
+        lines.append(f"{base}_max{_labels_text((('stage', stage),) + labels)} {longest:.6f}")
+    declared = set()
+    for (name, labels), n in counters:
+        metric = f"{METRIC_PREFIX}_{name}_total"
+        if metric not in declared:
+            declared.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_labels_text(labels)} {n}")
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path: str):
+    """Write the current totals atomically (textfile-collector friendly)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.chmod(tmp, 0o644)  # mkstemp creates 0600; the collector may run as another user
+    os.replace(tmp, path)
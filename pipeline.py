@@ -0,0 +1,264 @@
+# pipeline.py
+"""
+Streaming scrape pipeline with consolidated, append-only outputs.
+
+    discover -> fetch -> aggregate -> sinks
+
+Each stage is a generator running in its own thread, connected to the next
+by a small bounded queue, so profile discovery, post fetching and
+analysis/writing overlap while at most a few handles are in memory at once.
+Drivers come from a DriverPool, so stages never use one driver at the same
+time.
+
+Sinks append one row per handle to a consolidated summary file
+(CSV_COLUMNS order) and to a profiles file (identity, incl. bio), and one
+row per post to a posts file; reanalyze.py recomputes summaries from the
+last two:
+
+    CSVSink      -> summary.csv, profiles.csv, posts.csv
+    JSONLSink    -> summary.jsonl, profiles.jsonl, posts.jsonl
+    ParquetSink  -> summary.parquet/, ...  (one part file per run; needs pyarrow)
+"""
+import csv
+import importlib.util
+import io
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import Social_Media_Data_Collection as smdc
+import instrumentation as instr
+from browser_pool import DriverPool, fetch_profile_posts
+
+POST_COLUMNS = [
+    "username", "url", "views", "likes", "comments", "shares", "saves",
+    "er_view", "caption", "caption_len", "hashtags", "timestamp", "theme",
+]
+PROFILE_COLUMNS = ["username", "display_name", "bio", "followers", "following"]
+
+_DONE = object()
+
+# ---------- Stages ----------
+def staged(stage: Callable[[Iterable], Iterator], upstream: Iterable, maxsize: int = 2) -> Iterator:
+    """
+    Run stage(upstream) in a background thread; yield its items through a
+    queue of at most `maxsize` items. Errors are re-raised in the consumer.
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def run():
+        try:
+            for item in stage(upstream):
+                while not stop.is_set():
+                    try:
+                        q.put(item, timeout=0.2); break
+                    except queue.Full:
+                        continue
+                if stop.is_set(): return
+            q.put(_DONE)
+        except BaseException as e:
+            q.put(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE: return
+            if isinstance(item, BaseException): raise item
+            yield item
+    finally:
+        stop.set()
+
+def discover(pool: DriverPool, limit: int) -> Callable[[Iterable[str]], Iterator]:
+    def stage(usernames):
+        for username in usernames:
+            try:
+                identity, post_urls = pool.run(
+                    lambda d, u: smdc.harvest_profile(d, u, limit), username)
+            except Exception as e:
+                print(f"   (@{username} skipped due to error: {e})")
+                continue
+            yield username, identity, post_urls
+    return stage
+
+def fetch(pool: DriverPool) -> Callable[[Iterable], Iterator]:
+    def stage(items):
+        for username, identity, post_urls in items:
+            yield username, identity, post_urls, fetch_profile_posts(pool, username, post_urls)
+    return stage
+
+def aggregate(items) -> Iterator:
+    for username, identity, post_urls, posts in items:
+        if not post_urls:
+            print(f"\n===== @{username} =====")
+            print("No recent posts found (profile private or grid blocked).")
+            continue
+        display_name, bio, followers, following = identity
+        row = smdc.analyze_profile(username, display_name, bio, posts)
+        print(f"\n===== @{username} =====")
+        smdc.print_profile_report(row, followers, following, posts)
+        yield username, identity, row, posts
+
+# ---------- Sinks ----------
+def post_row(username: str, post: Dict) -> Dict:
+    row = {"username": username}
+    row.update({k: post.get(k) for k in POST_COLUMNS[1:]})
+    if isinstance(row["timestamp"], datetime):
+        row["timestamp"] = row["timestamp"].isoformat()
+    row["hashtags"] = list(row["hashtags"] or [])
+    return row
+
+def append_atomic(path: str, data: bytes):
+    """
+    Append all of `data` and fsync. Short writes are continued; if a write
+    or the fsync fails, the file is truncated back to its old length, so a
+    batch lands whole or not at all. Only a process killed mid-write (or a
+    power loss) can leave a torn last line.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        start = os.lseek(fd, 0, os.SEEK_END)
+        view = memoryview(data)
+        try:
+            while view:
+                view = view[os.write(fd, view):]
+            os.fsync(fd)
+        except BaseException:
+            os.ftruncate(fd, start)
+            raise
+    finally:
+        os.close(fd)
+
+class Sink:
+    """Buffers rows and flushes them every `flush_every` handles and on close()."""
+    def __init__(self, out_dir: str, flush_every: int = 1):
+        self.out_dir = out_dir
+        self.flush_every = flush_every
+        self._summary: List[Dict] = []
+        self._profiles: List[Dict] = []
+        self._posts: List[Dict] = []
+        self._pending = 0
+        os.makedirs(out_dir, exist_ok=True)
+
+    def write(self, username: str, summary: Dict, posts: Sequence[Dict], identity=None):
+        self._summary.append({c: summary.get(c, "") for c in smdc.CSV_COLUMNS})
+        if identity is not None:
+            self._profiles.append(dict(zip(PROFILE_COLUMNS, (username,) + tuple(identity))))
+        self._posts.extend(post_row(username, p) for p in posts)
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        with instr.span("sink_flush", sink=type(self).__name__):
+            if self._summary: self._flush("summary", smdc.CSV_COLUMNS, self._summary)
+            if self._profiles: self._flush("profiles", PROFILE_COLUMNS, self._profiles)
+            if self._posts: self._flush("posts", POST_COLUMNS, self._posts)
+        self._summary, self._profiles, self._posts, self._pending = [], [], [], 0
+
+    def _flush(self, name: str, columns: List[str], rows: List[Dict]):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+class CSVSink(Sink):
+    def _flush(self, name, columns, rows):
+        path = os.path.join(self.out_dir, f"{name}.csv")
+        buf = io.StringIO()
+        w = csv.DictWriter(buf, fieldnames=columns, lineterminator="\n")
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            w.writeheader()
+        for row in rows:
+            if "hashtags" in row and isinstance(row["hashtags"], list):
+                row = dict(row, hashtags=";".join(row["hashtags"]))
+            w.writerow(row)
+        append_atomic(path, buf.getvalue().encode("utf-8"))
+
+class JSONLSink(Sink):
+    def _flush(self, name, columns, rows):
+        path = os.path.join(self.out_dir, f"{name}.jsonl")
+        data = "".join(json.dumps({c: row.get(c) for c in columns}, ensure_ascii=False) + "\n"
+                       for row in rows)
+        append_atomic(path, data.encode("utf-8"))
+
+class ParquetSink(Sink):
+    """
+    Parquet files cannot be appended to, so each run writes one part file per
+    table into a dataset directory; readers load the directory as one table.
+    The part is written under a .tmp name and renamed on close().
+    """
+    INT_COLUMNS = {"posts_analyzed", "views", "likes", "comments", "shares", "saves", "caption_len",
+                   "followers", "following"}
+    FLOAT_COLUMNS = {"avg_likes", "avg_comments", "avg_shares", "avg_saves",
+                     "engagement_rate_view_adj_mean", "post_frequency_per_week", "er_view"}
+
+    def __init__(self, out_dir: str, flush_every: int = 50):
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ImportError("the parquet sink needs pyarrow (pip install pyarrow)")
+        super().__init__(out_dir, flush_every)
+        self._writers: Dict[str, tuple] = {}
+        self._run_id = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+
+    def _schema(self, columns):
+        import pyarrow as pa
+        def kind(c):
+            if c in self.INT_COLUMNS: return pa.int64()
+            if c in self.FLOAT_COLUMNS: return pa.float64()
+            if c == "hashtags": return pa.list_(pa.string())
+            return pa.string()
+        return pa.schema([(c, kind(c)) for c in columns])
+
+    def _flush(self, name, columns, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if name not in self._writers:
+            ds_dir = os.path.join(self.out_dir, f"{name}.parquet")
+            os.makedirs(ds_dir, exist_ok=True)
+            final = os.path.join(ds_dir, f"part-{self._run_id}.parquet")
+            self._writers[name] = (pq.ParquetWriter(final + ".tmp", self._schema(columns)), final)
+        writer, _ = self._writers[name]
+        # "" marks a missing value in CSV rows; Parquet uses nulls
+        data = [{c: (None if row.get(c) == "" and c in self.FLOAT_COLUMNS else row.get(c))
+                 for c in columns} for row in rows]
+        writer.write_table(pa.Table.from_pylist(data, schema=writer.schema))
+
+    def close(self):
+        super().close()
+        for writer, final in self._writers.values():
+            writer.close()
+            os.replace(final + ".tmp", final)
+        self._writers = {}
+
+SINKS = {"csv": CSVSink, "jsonl": JSONLSink, "parquet": ParquetSink}
+
+def make_sinks(formats: Sequence[str], out_dir: str) -> List[Sink]:
+    return [SINKS[f](out_dir) for f in formats]
+
+# ---------- Run ----------
+def run_pipeline(usernames: Iterable[str], pool: DriverPool, sinks: Sequence[Sink],
+                 limit: Optional[int] = None, prefetch: int = 2) -> int:
+    """
+    Stream handles through discover -> fetch -> aggregate -> sinks.
+    Returns the number of profiles written.
+    """
+    limit = smdc.POSTS_TO_FETCH if limit is None else limit
+    written = 0
+    discovered = staged(discover(pool, limit), usernames, prefetch)
+    fetched = staged(fetch(pool), discovered, prefetch)
+    try:
+        for username, identity, row, posts in aggregate(fetched):
+            for sink in sinks:
+                sink.write(username, row, posts, identity)
+            smdc.record_history(username, identity, posts)
+            smdc.index_hashtags(username, posts)
+            written += 1
+    finally:
+        for sink in sinks:
+            sink.close()
+    return written
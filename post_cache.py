@@ -0,0 +1,173 @@
+# post_cache.py
+"""
+Persistent on-disk cache of scrape_post() records.
+
+Entries are content-addressed by video ID (falling back to the URL when no
+ID can be parsed) and stored as one JSON file each:
+
+    {CACHE_DIR}/ab/ab12...ef.json  ->  {"fetched_at": <epoch>, "post": {...}}
+
+Entries older than the TTL are re-fetched by scrape_incremental() (with
+REFRESH_POLICY, the posts the run's refresh plan picks instead); once the
+cache holds more than max_entries files, the oldest fetches are evicted.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import Social_Media_Data_Collection as smdc
+
+def cache_key(url: str) -> str:
+    video_id = smdc.video_id_from_url(url)
+    ident = f"video:{video_id}" if video_id else f"url:{url.split('?')[0].rstrip('/')}"
+    return hashlib.sha1(ident.encode("utf-8")).hexdigest()
+
+class PostCache:
+    _shared: Dict[Tuple, "PostCache"] = {}
+
+    def __init__(self, path: str = ".post_cache", ttl_hours: float = 24,
+                 max_entries: Optional[int] = None):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self.max_entries = max_entries
+        self.hits = self.misses = self.evicted = 0
+        self._count: Optional[int] = None   # scanned lazily on first put
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "PostCache":
+        """Shared instance for the CACHE_* settings in the scraper config."""
+        key = (smdc.CACHE_DIR, smdc.CACHE_TTL_HOURS, smdc.CACHE_MAX_ENTRIES)
+        if key not in cls._shared:
+            cls._shared[key] = cls(*key)
+        return cls._shared[key]
+
+    def _file(self, url: str) -> str:
+        key = cache_key(url)
+        return os.path.join(self.path, key[:2], key + ".json")
+
+    def _entries(self) -> List[Tuple[float, str]]:
+        out = []
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.endswith(".json"):
+                    full = os.path.join(root, name)
+                    try:
+                        out.append((os.path.getmtime(full), full))
+                    except OSError:
+                        continue
+        return out
+
+    # ----- lookups -----
+    def get(self, url: str) -> Optional[Tuple[Dict, float]]:
+        """Return (post, fetched_at) or None, regardless of age."""
+        try:
+            with open(self._file(url), encoding="utf-8") as f:
+                entry = json.load(f)
+            return smdc.post_from_json(entry["post"]), float(entry["fetched_at"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def is_fresh(self, fetched_at: float, now: Optional[float] = None) -> bool:
+        return ((now or time.time()) - fetched_at) < self.ttl
+
+    # ----- writes -----
+    def put(self, url: str, post: Dict, fetched_at: Optional[float] = None):
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        target = self._file(url)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        existed = os.path.exists(target)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": fetched_at, "post": smdc.post_to_json(post)}, f)
+        os.replace(tmp, target)  # atomic: readers never see a partial entry
+        os.utime(target, (fetched_at, fetched_at))  # mtime doubles as eviction age
+
+        with self._lock:
+            if self._count is None:
+                self._count = len(self._entries())
+            elif not existed:
+                self._count += 1
+            over = self.max_entries and self._count > self.max_entries
+        if over:
+            self.evict()
+
+    def evict(self):
+        """Drop the oldest entries until at most max_entries remain (10% headroom)."""
+        if not self.max_entries:
+            return
+        with self._lock:
+            entries = sorted(self._entries())
+            keep = int(self.max_entries * 0.9)
+            for _, full in entries[:max(0, len(entries) - keep)]:
+                try:
+                    os.remove(full)
+                    self.evicted += 1
+                except OSError:
+                    pass
+            self._count = min(len(entries), keep)
+
+# ---------- Incremental scraping ----------
+def is_current(url: str, fetched_at: float, cache: PostCache, plan=None, now: Optional[float] = None) -> bool:
+    """
+    Whether a cached copy can be served: posts tracked by the run's refresh
+    plan (refresh_policy.py) are re-fetched only if planned, others by TTL.
+    """
+    if plan is not None:
+        key = (smdc.handle_from_url(url), smdc.video_id_from_url(url))
+        if key in plan: return not plan.wants(*key)
+    return cache.is_fresh(fetched_at, now)
+
+def split_cached(urls: Sequence[str], cache: PostCache,
+                 now: Optional[float] = None) -> Tuple[Dict[str, Dict], List[str]]:
+    """
+    Partition URLs into ({url: fresh cached post}, [urls to fetch]).
+    Stale cached copies are not returned here; see merge_cached().
+    """
+    fresh: Dict[str, Dict] = {}
+    to_fetch: List[str] = []
+    plan = smdc.refresh_plan()
+    for url in urls:
+        hit = cache.get(url)
+        if hit and is_current(url, hit[1], cache, plan, now):
+            fresh[url] = hit[0]
+            cache.hits += 1
+        else:
+            to_fetch.append(url)
+            cache.misses += 1
+    return fresh, to_fetch
+
+def merge_cached(urls: Sequence[str], fresh: Dict[str, Dict], fetched: Sequence[Dict],
+                 cache: PostCache) -> List[Dict]:
+    """
+    Store newly fetched posts and return posts in `urls` order. A post that
+    failed to re-fetch falls back to its stale cached copy, if any.
+    """
+    by_url = {}
+    for post in fetched:
+        cache.put(post["url"], post)
+        by_url[post["url"]] = post
+    posts = []
+    for url in urls:
+        post = fresh.get(url) or by_url.get(url)
+        if post is None:
+            stale = cache.get(url)
+            post = stale[0] if stale else None
+        if post is not None:
+            posts.append(post)
+    return posts
+
+def scrape_incremental(urls: Sequence[str], fetch: Callable[[List[str]], List[Dict]],
+                       cache: PostCache) -> List[Dict]:
+    """
+    Fetch only URLs that are new or past the TTL, then merge with cached posts.
+    """
+    fresh, to_fetch = split_cached(urls, cache)
+    if fresh:
+        print(f"  {len(fresh)}/{len(urls)} posts served from cache")
+    fetched = fetch(to_fetch) if to_fetch else []
+    return merge_cached(urls, fresh, fetched, cache)
@@ -0,0 +1,217 @@
+# reanalyze.py
+"""
+Recompute CSV summary rows from stored posts; no browser, no network.
+
+Posts are read from PIPELINE_MODE output (posts.jsonl, posts.parquet/ or
+posts.csv in a directory) and/or the INCREMENTAL post cache. Each post is
+rebuilt from its raw fields with the current build_post_record(), so themes
+and ER follow the current code, then handles are analyzed in a process pool
+(each worker runs the columnar batch over its chunk of handles when numpy
+is installed). Output has the same CSV_COLUMNS as the live run.
+
+    python reanalyze.py --input output/ --out summary_reanalyzed.csv
+    python reanalyze.py --cache .post_cache --workers 8 --limit 0
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import Social_Media_Data_Collection as smdc
+
+try:
+    from orjson import loads as _loads  # optional, ~3x faster on large posts files
+except ImportError:
+    _loads = json.loads
+
+COUNT_FIELDS = ("views", "likes", "comments", "shares", "saves")
+HANDLE_IN_URL = re.compile(r"/@([^/?#]+)/video/")
+
+# ---------- Loading ----------
+def read_table(input_dir: str, name: str) -> Iterator[Dict]:
+    """Rows of {name}.jsonl, {name}.parquet/ or {name}.csv (first one found)."""
+    path = os.path.join(input_dir, f"{name}.jsonl")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip(): yield _loads(line)
+        return
+    path = os.path.join(input_dir, f"{name}.parquet")
+    if os.path.isdir(path):
+        import pyarrow.parquet as pq
+        yield from pq.read_table(path).to_pylist()
+        return
+    path = os.path.join(input_dir, f"{name}.csv")
+    if os.path.exists(path):
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+
+def _int(value) -> Optional[int]:
+    if type(value) is int: return value
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+def raw_fields(row: Dict) -> Dict:
+    """Stored post row (any sink format, or a cached post) -> build_post_record() fields."""
+    fields = {k: _int(row.get(k)) for k in COUNT_FIELDS}
+    hashtags = row.get("hashtags")
+    if isinstance(hashtags, str):
+        hashtags = [h for h in hashtags.split(";") if h]
+    ts = row.get("timestamp")
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts) if ts else None
+    fields.update(caption=row.get("caption") or "",
+                  hashtags=list(hashtags) if hashtags is not None else None,
+                  timestamp=ts if isinstance(ts, datetime) else None)
+    return fields
+
+def _cached_rows(cache_dir: str) -> Iterator[Dict]:
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if not name.endswith(".json"): continue
+            try:
+                with open(os.path.join(root, name), encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            post = entry.get("post") or {}
+            m = HANDLE_IN_URL.search(post.get("url") or "")
+            if m:
+                yield dict(post, username=m.group(1), fetched_at=entry.get("fetched_at", 0))
+
+def _post_key(row: Dict) -> str:
+    url = row.get("url") or ""
+    return smdc.video_id_from_url(url) or url
+
+def _grid_order(row: Dict):
+    """Sort key, newest post first as on the profile grid: createTime, then video ID."""
+    ts = row.get("timestamp") or ""
+    vid = smdc.video_id_from_url(row.get("url") or "")
+    return (bool(ts), ts, int(vid) if vid and vid.isdigit() else -1)
+
+def load_store(input_dir: Optional[str] = None, cache_dir: Optional[str] = None,
+               handles: Optional[Sequence[str]] = None, limit: Optional[int] = None):
+    """
+    Return ({username: [stored post row, ...]}, {username: (display_name, bio)},
+    {username: stored country_region}).
+
+    Pipeline output is read in stored order. A post stored more than once
+    keeps its latest copy, moved to the end, so with appended runs the last
+    run's posts come last in their original (grid) order; `limit` keeps the
+    last N per handle. Cached posts have no grid position: they are ordered
+    by their own timestamp, newest first with ties by video ID (never by
+    fetch time), and `limit` keeps the first N. A handle found in both takes
+    its limited posts from the pipeline output; without a limit its other
+    cached posts come first. Cache-only handles follow, sorted by name.
+    """
+    wanted = set(handles) if handles else None
+    posts: Dict[str, "OrderedDict[str, Dict]"] = {}
+    cached: Dict[str, List[Dict]] = {}
+
+    def add(row):
+        username = row.get("username")
+        if not username or (wanted and username not in wanted): return
+        key = _post_key(row)
+        bucket = posts.setdefault(username, OrderedDict())
+        bucket.pop(key, None)
+        bucket[key] = row
+
+    if cache_dir:
+        for row in _cached_rows(cache_dir):
+            if not wanted or row["username"] in wanted:
+                cached.setdefault(row["username"], []).append(row)
+        for rows in cached.values():
+            rows.sort(key=_grid_order, reverse=True)
+    identities: Dict[str, Tuple[str, str]] = {}
+    countries: Dict[str, str] = {}
+    if input_dir:
+        for row in read_table(input_dir, "posts"):
+            add(row)
+        for row in read_table(input_dir, "profiles"):
+            identities[row["username"]] = (row.get("display_name") or row["username"], row.get("bio") or "")
+        # Output from before profiles.* was written: keep the stored name and country.
+        for row in read_table(input_dir, "summary"):
+            username = row.get("username")
+            if username and username not in identities:
+                countries[username] = row.get("country_region") or "Unknown"
+                identities[username] = (row.get("tiktok_profile_name") or username, "")
+
+    out = {}
+    for username in list(posts) + sorted(u for u in cached if u not in posts):
+        stored = list(posts[username].values()) if username in posts else []
+        if limit:
+            items = stored[-limit:] if stored else cached[username][:limit]
+        else:
+            seen = posts.get(username, {})
+            items = [r for r in cached.get(username, ()) if _post_key(r) not in seen] + stored
+        out[username] = items
+        identities.setdefault(username, (username, ""))
+    return out, identities, countries
+
+# ---------- Analysis ----------
+def _analyze_chunk(chunk: List[Tuple[str, str, str, List[Dict]]]) -> List[Dict]:
+    """Worker: [(username, display_name, bio, [stored post row])] -> CSV rows, same order."""
+    profiles = {u: [smdc.build_post_record(row.get("url") or "", raw_fields(row)) for row in rows]
+                for u, _, _, rows in chunk}
+    identities = {u: (name, bio) for u, name, bio, _ in chunk}
+    try:
+        import columnar
+    except ImportError:
+        return [smdc.analyze_profile(u, *identities[u], profiles[u]) for u in profiles]
+    return columnar.batch_summary_rows(profiles, identities)
+
+def reanalyze(profiles: Dict[str, List[Dict]], identities: Dict[str, Tuple[str, str]],
+              workers: Optional[int] = None, chunk_size: Optional[int] = None) -> List[Dict]:
+    """Summary rows for every handle in `profiles`, in the same order."""
+    items = [(u, *identities[u], posts) for u, posts in profiles.items() if posts]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(items) < 2:
+        return _analyze_chunk(items)
+    chunk_size = chunk_size or max(1, min(500, -(-len(items) // (workers * 4))))
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as ex:
+        return [row for rows in ex.map(_analyze_chunk, chunks) for row in rows]
+
+def write_summary_csv(path: str, rows: Sequence[Dict]):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=smdc.CSV_COLUMNS)
+        w.writeheader()
+        w.writerows(rows)
+    os.replace(tmp, path)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--input", default=None, help=f"pipeline output directory (default: {smdc.OUTPUT_DIR})")
+    ap.add_argument("--cache", default=None, help="post cache directory to read as well")
+    ap.add_argument("--handles", nargs="*", help="only these usernames")
+    ap.add_argument("--limit", type=int, default=smdc.POSTS_TO_FETCH,
+                    help="most recent posts per handle (0 = all stored)")
+    ap.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    ap.add_argument("--out", default="summary_reanalyzed.csv")
+    args = ap.parse_args()
+
+    input_dir = args.input if args.input or args.cache else smdc.OUTPUT_DIR
+    t0 = time.perf_counter()
+    profiles, identities, countries = load_store(input_dir, args.cache, args.handles, args.limit)
+    t1 = time.perf_counter()
+    rows = reanalyze(profiles, identities, args.workers)
+    for row in rows:
+        if row["username"] in countries:
+            row["country_region"] = countries[row["username"]]
+    write_summary_csv(args.out, rows)
+    n_posts = sum(len(p) for p in profiles.values())
+    print(f"Saved: {args.out} ({len(rows)} profiles, {n_posts} posts; "
+          f"load {t1 - t0:.2f}s, analyze+write {time.perf_counter() - t1:.2f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+# refresh_policy.py
+"""
+Adaptive refresh planning: re-scrape posts whose counts are still moving.
+
+A post's engagement grows fast just after it is published and then levels
+off. The planner models each post's relative growth rate (views, likes,
+comments and shares, as a fraction of the current count per hour) as a
+power law in its age since createTime:
+
+    rate(age) = c * age ** -decay
+
+c is set per post from the change between its last two snapshots in the
+history store; decay is shared by all posts and fitted from the history
+(RefreshPolicy.fit_decay()). A post with a single snapshot starts from a
+prior. Integrating the rate from the last fetch gives the expected drift
+(the largest relative change across the four counts) of the copy we hold.
+Once it passes REFRESH_TOLERANCE the post is due. Fast-moving posts are
+due again within hours, while settled posts wait up to max_hours. plan()
+picks the due posts with the largest expected drift, up to a request
+budget per run.
+
+With INCREMENTAL and REFRESH_POLICY set, the post cache serves every cached
+post that is not in the run's plan, whatever its age. Posts the history has
+never seen are always fetched.
+
+    policy = RefreshPolicy(tolerance=0.05)
+    policy.fit_decay(histories)            # HistoryStore.post_histories()
+    plan = policy.plan(histories, budget=500)
+
+    python refresh_policy.py plan history.sqlite --budget 500
+    python refresh_policy.py simulate history.sqlite --every 6 --budget 200
+
+simulate() replays recorded histories as ground truth. Each post is
+"scraped" at fixed run intervals under a policy, and the result reports
+requests made and the staleness of the counts held between fetches.
+"""
+import argparse
+import bisect
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import Social_Media_Data_Collection as smdc
+
+METRICS = ("views", "likes", "comments", "shares")   # snapshot columns 1..4
+HOUR = 3600.0
+DEFAULT_DECAY = 1.0
+
+Histories = Dict[Tuple[str, str], Tuple[Optional[int], List[Tuple]]]
+
+def _integral(a0: float, a1: float, decay: float) -> float:
+    """Integral of age ** -decay from a0 to a1 (ages in hours)."""
+    if abs(decay - 1.0) < 1e-9:
+        return math.log(a1 / a0)
+    return (a1 ** (1 - decay) - a0 ** (1 - decay)) / (1 - decay)
+
+def _solve_age(a0: float, target: float, decay: float) -> float:
+    """The age at which _integral(a0, age) reaches target (inf if it never does)."""
+    if abs(decay - 1.0) < 1e-9:
+        return a0 * math.exp(min(target, 700.0))
+    base = a0 ** (1 - decay) + target * (1 - decay)
+    return base ** (1 / (1 - decay)) if base > 0 else math.inf
+
+class RefreshPlan:
+    """One run's plan: the posts to re-fetch, and what the rest are expected to have drifted."""
+    def __init__(self, fetch: List[Tuple[str, str]], deferred: List[Tuple[str, str]],
+                 drift: Dict[Tuple[str, str], float], due_at: Dict[Tuple[str, str], float], now: float):
+        self.fetch, self.deferred = fetch, deferred
+        self.drift, self.due_at, self.now = drift, due_at, now
+        self._fetch = set(fetch)
+
+    def __contains__(self, key) -> bool:
+        return key in self.drift
+
+    def wants(self, username: str, video_id: str) -> bool:
+        return (username, video_id) in self._fetch
+
+    def summary(self) -> str:
+        held = [d for k, d in self.drift.items() if k not in self._fetch]
+        worst = max(held, default=0.0)
+        return (f"refresh plan: {len(self.fetch)}/{len(self.drift)} tracked posts to re-fetch, "
+                f"{len(self.deferred)} due but over budget, max expected drift kept {worst:.1%}")
+
+class RefreshPolicy:
+    """
+    tolerance: expected relative change at which a post is due.
+    min_hours / max_hours: bounds on the interval between fetches of one post.
+    prior_growth: for a post with one snapshot, assume its counts grow like
+        age ** prior_growth (relative rate prior_growth / age at that age).
+    min_count: counts below this are treated as this, so 3 -> 4 likes is not a 33% change.
+    """
+    def __init__(self, tolerance: float = 0.05, decay: float = DEFAULT_DECAY, min_hours: float = 1.0,
+                 max_hours: float = 14 * 24.0, prior_growth: float = 0.5, min_count: int = 50):
+        self.tolerance = tolerance
+        self.decay = decay
+        self.min_hours, self.max_hours = min_hours, max_hours
+        self.prior_growth = prior_growth
+        self.min_count = min_count
+
+    @classmethod
+    def from_config(cls) -> "RefreshPolicy":
+        return cls(tolerance=smdc.REFRESH_TOLERANCE, max_hours=smdc.REFRESH_MAX_HOURS)
+
+    @staticmethod
+    def _age(t: float, created_at: Optional[float], first_seen: float) -> float:
+        """Hours since publication (since first snapshot when createTime is unknown), at least 1."""
+        return max((t - (created_at if created_at else first_seen)) / HOUR, 1.0)
+
+    def fit_decay(self, histories: Histories, min_points: int = 20) -> float:
+        """
+        Pooled power-law exponent of views growth vs age, from posts with 3+
+        snapshots: a within-post least-squares fit of log rate on log age,
+        clamped to [0.3, 3]. Keeps the current value if there is too little data.
+        """
+        sxx = sxy = 0.0
+        points = 0
+        for created_at, snaps in histories.values():
+            if len(snaps) < 3: continue
+            xs, ys = [], []
+            for (t0, v0, *_), (t1, v1, *_) in zip(snaps, snaps[1:]):
+                if not v0 or not v1 or v1 <= v0 or t1 <= t0: continue
+                age = self._age((t0 + t1) / 2, created_at, snaps[0][0])
+                xs.append(math.log(age))
+                ys.append(math.log((v1 - v0) / ((t1 - t0) / HOUR) / max(v1, self.min_count)))
+            if len(xs) < 2: continue
+            mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+            sxx += sum((x - mx) ** 2 for x in xs)
+            sxy += sum((x - mx) * (y - my) for x, y in zip(xs, ys))
+            points += len(xs)
+        if points >= min_points and sxx > 0:
+            self.decay = min(max(-sxy / sxx, 0.3), 3.0)
+        return self.decay
+
+    def scale(self, created_at: Optional[float], snaps: Sequence[Tuple]) -> float:
+        """c in rate(age) = c * age ** -decay for the fastest of the four counts."""
+        first_seen, (t1, *counts1) = snaps[0][0], snaps[-1]
+        if len(snaps) < 2 or snaps[-2][0] >= t1:
+            return self.prior_growth * self._age(t1, created_at, first_seen) ** (self.decay - 1)
+        t0, *counts0 = snaps[-2]
+        hours = (t1 - t0) / HOUR
+        rate = 0.0
+        for x0, x1 in zip(counts0[:len(METRICS)], counts1[:len(METRICS)]):
+            if x0 is None or x1 is None: continue
+            rate = max(rate, max(x1 - x0, 0) / hours / max(x1, self.min_count))
+        return rate * self._age((t0 + t1) / 2, created_at, first_seen) ** self.decay
+
+    def drift(self, created_at: Optional[float], snaps: Sequence[Tuple], now: float) -> float:
+        """Expected relative change of the counts since the last snapshot."""
+        first_seen, t1 = snaps[0][0], snaps[-1][0]
+        a1, an = self._age(t1, created_at, first_seen), self._age(max(now, t1), created_at, first_seen)
+        return self.scale(created_at, snaps) * _integral(a1, an, self.decay)
+
+    def due_at(self, created_at: Optional[float], snaps: Sequence[Tuple]) -> float:
+        """When the expected drift reaches tolerance, within [min_hours, max_hours] of the last fetch."""
+        t1 = snaps[-1][0]
+        c = self.scale(created_at, snaps)
+        hours = self.max_hours
+        if c > 0:
+            a1 = self._age(t1, created_at, snaps[0][0])
+            hours = min(max(_solve_age(a1, self.tolerance / c, self.decay) - a1, self.min_hours), self.max_hours)
+        return t1 + hours * HOUR
+
+    def plan(self, histories: Histories, budget: Optional[int] = None,
+             now: Optional[float] = None) -> RefreshPlan:
+        """Due posts, largest expected drift first, at most `budget` of them (None: all due)."""
+        now = time.time() if now is None else now
+        drift, due_at, due = {}, {}, []
+        for key, (created_at, snaps) in histories.items():
+            if not snaps: continue
+            drift[key] = d = self.drift(created_at, snaps, now)
+            due_at[key] = t = self.due_at(created_at, snaps)
+            if t <= now:
+                due.append((-d, key))
+        due.sort()
+        keys = [key for _, key in due]
+        cut = len(keys) if budget is None else max(budget, 0)
+        return RefreshPlan(keys[:cut], keys[cut:], drift, due_at, now)
+
+class FixedIntervalPolicy:
+    """Baseline: re-fetch every post once its copy is `hours` old, oldest first (the CACHE_TTL_HOURS rule)."""
+    def __init__(self, hours: float):
+        self.hours = hours
+
+    def fit_decay(self, histories: Histories) -> None:
+        return None
+
+    def plan(self, histories: Histories, budget: Optional[int] = None,
+             now: Optional[float] = None) -> RefreshPlan:
+        now = time.time() if now is None else now
+        ages = {key: now - snaps[-1][0] for key, (_, snaps) in histories.items() if snaps}
+        keys = sorted((k for k, age in ages.items() if age >= self.hours * HOUR), key=lambda k: -ages[k])
+        cut = len(keys) if budget is None else max(budget, 0)
+        due_at = {k: now - age + self.hours * HOUR for k, age in ages.items()}
+        return RefreshPlan(keys[:cut], keys[cut:], {k: 0.0 for k in ages}, due_at, now)
+
+# ---------- Simulation ----------
+def _truth_at(times: Sequence[float], snaps: Sequence[Tuple], t: float) -> Tuple:
+    """Counts at time t, linearly interpolated between recorded snapshots."""
+    i = bisect.bisect_right(times, t)
+    if i == 0: return snaps[0][1:]
+    if i == len(snaps): return snaps[-1][1:]
+    (t0, *c0), (t1, *c1) = snaps[i - 1], snaps[i]
+    w = (t - t0) / (t1 - t0)
+    return tuple(None if a is None or b is None else round(a + (b - a) * w) for a, b in zip(c0, c1))
+
+def simulate(recorded: Histories, policy, run_every_hours: float = 6.0, budget: Optional[int] = None,
+             refit_every: int = 4, min_count: int = 50) -> Dict:
+    """
+    Replay recorded histories as ground truth. Every run_every_hours the
+    scraper sees each post that exists by then: a post seen for the first
+    time is always fetched; the others are re-fetched when the policy's
+    plan (under `budget`) says so. Staleness of a held copy is its largest
+    relative error across views, likes, comments and shares, computed at
+    every run for every post.
+    """
+    truth = {}
+    for key, (_, snaps) in recorded.items():
+        if snaps:
+            snaps = sorted(snaps, key=lambda s: s[0])
+            truth[key] = ([s[0] for s in snaps], snaps)
+    if not truth:
+        raise ValueError("no recorded snapshots to replay")
+    start = min(times[0] for times, _ in truth.values())
+    end = max(times[-1] for times, _ in truth.values())
+    appears = sorted((times[0], key) for key, (times, _) in truth.items())
+    observed: Histories = {}
+    requests = new_fetches = 0
+    errors: List[float] = []
+    nxt, run = 0, 0
+    t = start
+    while t <= end:
+        while nxt < len(appears) and appears[nxt][0] <= t:
+            key = appears[nxt][1]
+            observed[key] = (recorded[key][0], [(t,) + tuple(_truth_at(*truth[key], t))])
+            requests += 1
+            new_fetches += 1
+            nxt += 1
+        if run % refit_every == 0:
+            policy.fit_decay(observed)
+        for key in policy.plan(observed, budget, now=t).fetch:
+            observed[key][1].append((t,) + tuple(_truth_at(*truth[key], t)))
+            requests += 1
+        for key, (_, snaps) in observed.items():
+            actual, held = _truth_at(*truth[key], t), snaps[-1][1:]
+            errors.append(max((abs(h - x) / max(x, min_count)
+                               for h, x in zip(held[:len(METRICS)], actual[:len(METRICS)])
+                               if h is not None and x is not None), default=0.0))
+        run += 1
+        t += run_every_hours * HOUR
+    errors.sort()
+    full = len(errors)   # fetching everything: one request per post per run
+    return {"runs": run, "posts": len(truth), "requests": requests, "new_post_fetches": new_fetches,
+            "fetch_all_requests": full, "saved": 1 - requests / full if full else 0.0,
+            "staleness_mean": sum(errors) / len(errors) if errors else 0.0,
+            "staleness_p95": errors[int(0.95 * (len(errors) - 1))] if errors else 0.0,
+            "staleness_max": errors[-1] if errors else 0.0,
+            "decay": getattr(policy, "decay", None)}
+
+def print_simulation(rows: Iterable[Tuple[str, Dict]]):
+    print(f"{'policy':<28} {'requests':>9} {'saved':>7} {'stale mean':>11} {'p95':>8} {'max':>8}")
+    for name, r in rows:
+        print(f"{name:<28} {r['requests']:>9,} {r['saved']:>7.1%} {r['staleness_mean']:>11.2%} "
+              f"{r['staleness_p95']:>8.2%} {r['staleness_max']:>8.2%}")
+
+# ---------- CLI ----------
+def main():
+    from history_store import HistoryStore
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("cmd", choices=("plan", "simulate"))
+    ap.add_argument("db", nargs="?", default=smdc.HISTORY_DB or "history.sqlite")
+    ap.add_argument("--budget", type=int, default=smdc.REFRESH_BUDGET, help="re-fetches per run")
+    ap.add_argument("--tolerance", type=float, default=smdc.REFRESH_TOLERANCE)
+    ap.add_argument("--user", nargs="*", help="only these usernames")
+    ap.add_argument("--every", type=float, default=6.0, help="simulate: hours between runs")
+    ap.add_argument("--ttl", type=float, nargs="*", default=[24.0], help="simulate: fixed-interval baselines (hours)")
+    ap.add_argument("--top", type=int, default=20)
+    args = ap.parse_args()
+
+    policy = RefreshPolicy(tolerance=args.tolerance, max_hours=smdc.REFRESH_MAX_HOURS)
+    with HistoryStore(args.db) as store:
+        histories = store.post_histories(args.user, keep=None if args.cmd == "simulate" else 8)
+    if args.cmd == "plan":
+        policy.fit_decay(histories)
+        plan = policy.plan(histories, args.budget)
+        print(f"decay exponent {policy.decay:.2f}; {plan.summary()}")
+        for user, video_id in plan.fetch[:args.top]:
+            print(f"@{user:<24} {video_id:<22} expected drift {plan.drift[(user, video_id)]:7.1%}")
+    else:
+        rows = [(f"every run ({args.every:g}h)" if h == args.every else f"fixed interval {h:g}h",
+                 simulate(histories, FixedIntervalPolicy(h), args.every, args.budget))
+                for h in [args.every] + args.ttl]
+        rows.append((f"adaptive tol={args.tolerance:g}", simulate(histories, policy, args.every, args.budget)))
+        print_simulation(rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# scheduler.py
+"""
+Rate limiting, retries with backoff, and resumable per-handle scheduling.
+
+    RateLimiter   token bucket per host; navigate() and the HTTP pool wait on it
+    retry_call()  exponential backoff with full jitter; honours 429 Retry-After
+    Checkpoint    durable JSON progress file, rewritten atomically on every change
+    Scheduler     runs one job per handle, stalest first, with a concurrency
+                  cap, retries and checkpointing
+
+An interrupted run resumes from its checkpoint: handles already done or
+given up on are skipped, retry counts carry over, and the remaining handles
+run in staleness order (least recently completed first, never-scraped first).
+"""
+import heapq
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+# ---------- Rate limiting ----------
+class RateLimited(Exception):
+    """The server answered 429; retry_after is its Retry-After in seconds, if given."""
+    def __init__(self, url: str, retry_after: Optional[float] = None):
+        super().__init__(f"429 Too Many Requests: {url}")
+        self.url, self.retry_after = url, retry_after
+
+class TransientError(Exception):
+    """A page failed in a way worth retrying: a 5xx, or a page with no post data on it."""
+
+# What a page fetch retries on. Anything else (a dead WebDriver session, a bad
+# URL) is left to the caller: the driver pool replaces dead drivers itself.
+PAGE_ERRORS = (RateLimited, TransientError)
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = max(float(burst), 1.0)
+        self._clock = clock
+        self._tokens = self.burst
+        self._t = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token; returns how many seconds the caller must wait before using it."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._t) * self.rate)
+            self._t = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0: time.sleep(delay)
+
+    def pause(self, seconds: float):
+        """Hold back every caller for at least `seconds` (e.g. after a 429)."""
+        with self._lock:
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+class RateLimiter:
+    """One TokenBucket per host (scheme://netloc)."""
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate, self.burst = rate, burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return self._buckets[host]
+
+    def wait(self, url: str):
+        self.bucket(url).acquire()
+
+    async def wait_async(self, url: str):
+        import asyncio
+        delay = self.bucket(url).reserve()
+        if delay > 0: await asyncio.sleep(delay)
+
+    def penalize(self, url: str, seconds: float):
+        self.bucket(url).pause(seconds)
+
+# ---------- Backoff ----------
+def backoff_delay(attempt: int, base: float, cap: float, rng=random) -> float:
+    """Full jitter: uniform(0, min(cap, base * 2**attempt)), attempt counting from 0."""
+    return rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+def retry_delay(err: BaseException, attempt: int, base: float, cap: float, rng=random) -> float:
+    delay = backoff_delay(attempt, base, cap, rng)
+    if isinstance(err, RateLimited) and err.retry_after:
+        delay = max(delay, err.retry_after)
+    return delay
+
+def retry_call(fn: Callable[[], object], attempts: int, base: float, cap: float,
+               retry_on=(Exception,), sleep: Callable[[float], None] = time.sleep, rng=random):
+    """Call fn() up to `attempts` times, sleeping with backoff between failures."""
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except retry_on as e:
+            if attempt + 1 >= attempts:
+                raise
+            sleep(retry_delay(e, attempt, base, cap, rng))
+
+# ---------- Checkpoint ----------
+class Checkpoint:
+    """
+    Progress of the current run plus when each handle last completed:
+
+        {"last_completed": {handle: epoch},
+         "run": {"started_at": epoch, "done": [...], "failed": {handle: error},
+                 "attempts": {handle: n}} | null}
+
+    path=None keeps the state in memory only.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.last_completed: Dict[str, float] = {}
+        self.run: Optional[Dict] = None
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.last_completed = data.get("last_completed") or {}
+            self.run = data.get("run")
+
+    @property
+    def resuming(self) -> bool:
+        return self.run is not None
+
+    def start(self, usernames: Sequence[str]) -> List[str]:
+        """Begin or resume a run; returns the handles still to do, in input order."""
+        if self.run is None:
+            self.run = {"started_at": time.time(), "done": [], "failed": {}, "attempts": {}}
+            self.save()
+        finished = set(self.run["done"]) | set(self.run["failed"])
+        return [u for u in dict.fromkeys(usernames) if u not in finished]
+
+    def attempts(self, username: str) -> int:
+        return self.run["attempts"].get(username, 0)
+
+    def record_attempt(self, username: str):
+        self.run["attempts"][username] = self.attempts(username) + 1
+        self.save()
+
+    def mark_done(self, username: str):
+        self.run["done"].append(username)
+        self.run["attempts"].pop(username, None)
+        self.last_completed[username] = time.time()
+        self.save()
+
+    def mark_failed(self, username: str, error: str):
+        self.run["failed"][username] = error
+        self.save()
+
+    def finish(self):
+        """Close the run; last_completed is kept for the next run's ordering."""
+        self.run = None
+        self.save()
+
+    def save(self):
+        if not self.path: return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"last_completed": self.last_completed, "run": self.run}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+# ---------- Scheduler ----------
+class Scheduler:
+    """
+    Run job(username) for every handle with at most `concurrency` jobs at a
+    time. A failed job is retried after a jittered exponential backoff (other
+    handles keep running meanwhile) until max_attempts, then recorded as
+    failed. Ready handles run stalest first.
+    """
+    def __init__(self, job: Callable[[str], object], checkpoint: Optional[Checkpoint] = None,
+                 concurrency: int = 1, max_attempts: int = 3, backoff_base: float = 2.0,
+                 backoff_cap: float = 60.0, rng=None):
+        self.job = job
+        self.checkpoint = checkpoint or Checkpoint()
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max_attempts
+        self.backoff_base, self.backoff_cap = backoff_base, backoff_cap
+        self.rng = rng or random.Random()
+        self._cond = threading.Condition()
+        self._ready: List[Tuple[float, int, str]] = []     # (last completed, seq, handle)
+        self._delayed: List[Tuple[float, int, str]] = []   # (not before, seq, handle)
+        self._in_flight = 0
+        self._seq = 0
+
+    def _push_ready(self, username: str):
+        self._seq += 1
+        heapq.heappush(self._ready, (self.checkpoint.last_completed.get(username, 0.0), self._seq, username))
+
+    def _next(self) -> Optional[str]:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    self._push_ready(heapq.heappop(self._delayed)[2])
+                if self._ready:
+                    self._in_flight += 1
+                    return heapq.heappop(self._ready)[2]
+                if not self._delayed and not self._in_flight:
+                    return None
+                self._cond.wait(self._delayed[0][0] - now if self._delayed else None)
+
+    def _finish(self, username: str, err: Optional[BaseException]):
+        with self._cond:
+            self._in_flight -= 1
+            cp = self.checkpoint
+            if err is None:
+                cp.mark_done(username)
+            else:
+                cp.record_attempt(username)
+                attempt = cp.attempts(username)
+                if attempt >= self.max_attempts:
+                    cp.mark_failed(username, f"{type(err).__name__}: {err}")
+                    print(f"   (@{username} failed after {attempt} attempts: {err})")
+                else:
+                    delay = retry_delay(err, attempt - 1, self.backoff_base, self.backoff_cap, self.rng)
+                    print(f"   (@{username} attempt {attempt} failed: {err}; retrying in {delay:.1f}s)")
+                    self._seq += 1
+                    heapq.heappush(self._delayed, (time.monotonic() + delay, self._seq, username))
+            self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            username = self._next()
+            if username is None: return
+            try:
+                self.job(username)
+            except Exception as e:
+                self._finish(username, e)
+            else:
+                self._finish(username, None)
+
+    def run(self, usernames: Sequence[str]) -> Dict[str, List]:
+        """Run every handle to done or failed; returns {"done": [...], "failed": {...}}."""
+        if self.checkpoint.resuming:
+            print(f"Resuming run from {self.checkpoint.path}")
+        with self._cond:
+            for username in self.checkpoint.start(usernames):
+                self._push_ready(username)
+        threads = [threading.Thread(target=self._worker, daemon=True)
+                   for _ in range(self.concurrency - 1)]
+        for t in threads: t.start()
+        self._worker()
+        for t in threads: t.join()
+        result = {"done": list(self.checkpoint.run["done"]), "failed": dict(self.checkpoint.run["failed"])}
+        self.checkpoint.finish()
+        return result
@@ -0,0 +1,84 @@
+import html
+import os
+import sys
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Social_Media_Data_Collection as smdc  # noqa: E402
+from benchmarks import _close, synthetic_posts  # noqa: E402
+
+@pytest.fixture
+def assert_same():
+    """Deep equality via benchmarks._close(): float tolerance, lists and tuples in order."""
+    def check(a, b, tol: float = 1e-9):
+        assert _close(a, b, tol), f"\n{a!r}\n!=\n{b!r}"
+    return check
+
+@pytest.fixture(scope="session")
+def profiles():
+    """{username: [post record]} from benchmarks.synthetic_posts(), 1 to 60 posts per profile."""
+    return synthetic_posts(12, 60, seed=1, min_posts=1)
+
+@pytest.fixture
+def tied_posts():
+    """Posts where #alpha and #beta (and two hours) have identical counts and ER, to pin tie order."""
+    from datetime import datetime
+    posts = []
+    for i, (tags, hour) in enumerate([(["#beta", "#alpha"], 9), (["#alpha", "#beta"], 18),
+                                      (["#gamma"], 9), (["#gamma"], 18)]):
+        fields = {"views": 1000, "likes": 100, "comments": 10, "shares": 5, "saves": 0,
+                  "caption": "tip " + " ".join(tags), "hashtags": None,
+                  "timestamp": datetime(2024, 1, 1 + i, hour)}
+        posts.append(smdc.build_post_record(f"https://www.tiktok.com/@tied/video/{i}", fields))
+    return posts
+
+class PageDriver:
+    """Stands in for Chrome: page_source is what the server sent, error pages included."""
+    def __init__(self, dead_after=None):
+        self.page_source, self.loads, self.dead_after = "", 0, dead_after
+
+    @property
+    def current_url(self):
+        if self.dead_after is not None and self.loads > self.dead_after:
+            raise ConnectionError("session gone")
+        return ""
+
+    def get(self, url):
+        self.current_url
+        self.loads += 1
+        self.current_url
+        try:
+            body = urllib.request.urlopen(url, timeout=5).read().decode()
+        except urllib.error.HTTPError as e:
+            body = e.read().decode()
+        if not body.startswith("<"):
+            body = f"<html><head></head><body><pre>{html.escape(body)}</pre></body></html>"
+        self.page_source = body
+
+    def execute_script(self, script, *args):
+        if script == smdc.REHYDRATION_JS:
+            return smdc.find_rehydration_text(self.page_source)
+        raise RuntimeError("no JS")
+
+    def find_element(self, *args):
+        raise LookupError("no DOM")
+
+    def quit(self):
+        pass
+
+@pytest.fixture
+def page_driver():
+    return PageDriver
+
+@pytest.fixture
+def browser(monkeypatch):
+    """Browser-mode scraping with PageDriver: no waits, no backoff, generous retries."""
+    monkeypatch.setattr(smdc, "timed_wait", lambda *a, **k: None)
+    monkeypatch.setattr(smdc, "accept_cookies", lambda *a, **k: None)
+    monkeypatch.setattr(smdc, "MAX_ATTEMPTS", 20)
+    monkeypatch.setattr(smdc, "BACKOFF_BASE", 0.0)
+    monkeypatch.setattr(smdc, "BACKOFF_CAP", 0.0)
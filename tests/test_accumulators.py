@@ -0,0 +1,66 @@
+import json
+import math
+import random
+import statistics
+
+import pytest
+
+import Social_Media_Data_Collection as smdc
+from accumulators import ProfileAccumulator, QuantileSketch, Welford
+
+def test_welford_merge_equals_single_pass():
+    rng = random.Random(3)
+    values = [rng.lognormvariate(0, 2) for _ in range(5000)]
+    single = Welford()
+    for x in values: single.add(x)
+    merged = Welford()
+    for i in range(7):
+        part = Welford()
+        for x in values[i::7]: part.add(x)
+        merged.merge(Welford.from_state(json.loads(json.dumps(part.state()))))
+    assert merged.n == single.n == len(values)
+    assert math.isclose(merged.mean, single.mean, rel_tol=1e-12)
+    assert math.isclose(merged.variance, single.variance, rel_tol=1e-12)
+    assert math.isclose(single.mean, statistics.fmean(values), rel_tol=1e-12)
+    assert math.isclose(single.variance, statistics.variance(values), rel_tol=1e-9)
+
+def test_welford_merge_with_empty():
+    w = Welford()
+    for x in (1.0, 2.0, 4.0): w.add(x)
+    assert Welford().merge(w).state() == w.state()
+    assert w.merge(Welford()).state() == [3, w.mean, w.m2]
+
+@pytest.mark.parametrize("alpha", [0.005, 0.02])
+def test_quantile_sketch_relative_error_bound(alpha):
+    rng = random.Random(4)
+    values = [rng.lognormvariate(-3, 1.5) for _ in range(20_000)] + [0.0] * 50
+    sketch = QuantileSketch(alpha)
+    for i in range(4):
+        part = QuantileSketch(alpha)
+        for x in values[i::4]: part.add(x)
+        sketch.merge(QuantileSketch.from_state(json.loads(json.dumps(part.state()))))
+    ordered = sorted(values)
+    for q in (0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0):
+        exact = ordered[math.floor(q * (len(ordered) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= alpha * exact + sketch.min_value
+    exact_median = statistics.median(values)
+    assert abs(sketch.median() - exact_median) <= alpha * exact_median + sketch.min_value
+
+def test_profile_accumulator_matches_profile_metrics(profiles, assert_same):
+    for username, posts in profiles.items():
+        acc = ProfileAccumulator()
+        for i in range(0, len(posts), 7):   # consecutive runs of posts, merged in order
+            part = ProfileAccumulator().add_many(posts[i:i + 7])
+            acc.merge(ProfileAccumulator.from_state(json.loads(json.dumps(part.state()))))
+        got, ref = acc.metrics(), smdc.profile_metrics(posts)
+        (mean, median), (ref_mean, ref_median) = got["er"], ref["er"]
+        assert math.isclose(mean, ref_mean, rel_tol=1e-9, abs_tol=1e-12)
+        assert abs(median - ref_median) <= acc.er_sketch.alpha * ref_median + acc.er_sketch.min_value
+        got["er"] = ref["er"]   # the median is approximate by design; bounded above
+        assert_same(got, ref)
+
+def test_profile_accumulator_keeps_order_on_ties(tied_posts, assert_same):
+    got = ProfileAccumulator().add_many(tied_posts).metrics()
+    ref = smdc.profile_metrics(tied_posts)
+    for key in ("hashtag_efficiency", "posting_window", "category_lift", "hashtags_used"):
+        assert_same(got[key], ref[key])
@@ -0,0 +1,54 @@
+import re
+
+import pytest
+
+import Social_Media_Data_Collection as smdc
+import browser_pool
+import fixture_server as fs
+
+USERS = ["a", "b", "c", "d", "e"]
+LIMIT = 4
+PAGES = fs.build_synthetic_site(USERS, posts_per_profile=LIMIT)
+
+@pytest.fixture
+def grid(monkeypatch):
+    """Synthetic profiles ship no item list, so read post links from the grid HTML instead of scrolling."""
+    def scroll_post_urls(driver, limit):
+        paths = re.findall(r'data-e2e="user-post-item"><a href="([^"]+)"', driver.page_source)
+        return [smdc.BASE_URL + p for p in paths[:limit]]
+    monkeypatch.setattr(smdc, "scroll_post_urls", scroll_post_urls)
+
+def rows(results):
+    return [smdc.analyze_profile(u, ident[0], ident[1], posts) for u, ident, _, posts in results]
+
+def serial(driver):
+    return [(u, *smdc.scrape_profile(driver, u, LIMIT)) for u in USERS]
+
+def pooled(factory, size):
+    with browser_pool.DriverPool(size, factory, max_retries=1) as pool:
+        return list(browser_pool.scrape_profiles(pool, USERS, LIMIT, batch_size=2))
+
+def test_pooled_matches_serial(browser, grid, page_driver, monkeypatch, assert_same):
+    with fs.FixtureServer(PAGES) as srv:
+        monkeypatch.setattr(smdc, "BASE_URL", srv.base_url)
+        expected = serial(page_driver())
+        got = pooled(page_driver, 3)
+    assert [len(posts) for *_, posts in expected] == [LIMIT] * len(USERS)
+    assert [(u, ident, urls) for u, ident, urls, _ in got] == [(u, ident, urls) for u, ident, urls, _ in expected]
+    assert_same([posts for *_, posts in got], [posts for *_, posts in expected])
+    assert_same(rows(got), rows(expected))
+
+def test_pooled_matches_serial_when_a_driver_dies(browser, grid, page_driver, monkeypatch, assert_same):
+    drivers = []
+
+    def factory():
+        drivers.append(page_driver(dead_after=3 if not drivers else None))
+        return drivers[-1]
+
+    with fs.FixtureServer(PAGES) as srv:
+        monkeypatch.setattr(smdc, "BASE_URL", srv.base_url)
+        expected = serial(page_driver())
+        got = pooled(factory, 2)
+    assert len(drivers) == 3
+    assert [urls for _, _, urls, _ in got] == [urls for _, _, urls, _ in expected]
+    assert_same(rows(got), rows(expected))
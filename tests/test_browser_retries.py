@@ -0,0 +1,56 @@
+import pytest
+
+import Social_Media_Data_Collection as smdc
+import browser_pool
+import fixture_server as fs
+from scheduler import RateLimited, TransientError
+
+PAGES = fs.build_synthetic_site(["a", "b"], posts_per_profile=6)
+PATHS = [p for p in PAGES if "/video/" in p]
+
+def scrape(driver, base_url):
+    return [smdc.scrape_post_retrying(driver, base_url + p) for p in PATHS]
+
+def test_fault_pages_are_retried_not_recorded(browser, page_driver):
+    with fs.FixtureServer(PAGES) as srv:
+        clean = scrape(page_driver(), srv.base_url)
+    driver = page_driver()
+    with fs.FixtureServer(PAGES, error_rate=0.25, throttle_rate=0.25, seed=3) as srv:
+        got = scrape(driver, srv.base_url)
+        injected = sum(srv.injected.values())
+    assert injected > 0 and driver.loads == len(PATHS) + injected
+    assert all(post["views"] > 0 for post in got)
+    assert [{**p, "url": ""} for p in got] == [{**p, "url": ""} for p in clean]
+
+def test_error_pages_raise(browser, page_driver):
+    driver = page_driver()
+    with fs.FixtureServer(PAGES, throttle_rate=1.0) as srv:
+        with pytest.raises(RateLimited):
+            smdc.scrape_post(driver, srv.base_url + PATHS[0])
+    with fs.FixtureServer(PAGES, error_rate=1.0) as srv:
+        with pytest.raises(TransientError):
+            smdc.scrape_post(driver, srv.base_url + PATHS[0])
+    with fs.FixtureServer({PATHS[0]: "<html><body>loading</body></html>"}) as srv:
+        with pytest.raises(TransientError):
+            smdc.scrape_post(driver, srv.base_url + PATHS[0])
+
+def test_pool_replaces_dead_driver_instead_of_retrying_it(browser, page_driver):
+    drivers = []
+
+    def factory():
+        drivers.append(page_driver(dead_after=1 if not drivers else None))
+        return drivers[-1]
+
+    with fs.FixtureServer(PAGES) as srv:
+        urls = [srv.base_url + p for p in PATHS]
+        with browser_pool.DriverPool(1, factory, max_retries=1) as pool:
+            results = pool.map(browser_pool._scrape_post, urls)
+    assert [err for _, err in results] == [None] * len(urls)
+    assert pool.recycled == 1 and len(drivers) == 2 and drivers[0].loads == 2
+
+def test_page_without_stats_is_retried_then_skipped(browser, page_driver):
+    driver = page_driver()
+    with fs.FixtureServer({PATHS[0]: "<html><body>loading</body></html>", PATHS[1]: PAGES[PATHS[1]]}) as srv:
+        posts = smdc.scrape_posts(driver, [srv.base_url + PATHS[0], srv.base_url + PATHS[1]])
+    assert [p["url"] for p in posts] == [srv.base_url + PATHS[1]]
+    assert driver.loads == smdc.MAX_ATTEMPTS + 1
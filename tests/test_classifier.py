@@ -0,0 +1,44 @@
+import itertools
+
+import Social_Media_Data_Collection as smdc
+from classifier import KeywordClassifier
+
+def old_guess_theme(hashtags, caption):
+    blob = (" ".join(hashtags) + " " + (caption or "")).lower()
+    for label, kws in smdc.THEME_CATEGORIES:
+        if any(kw in blob for kw in kws):
+            return label
+    return "general english"
+
+def theme_texts():
+    keywords = [kw for _, kws in smdc.THEME_CATEGORIES for kw in kws]
+    texts = []
+    for kw in keywords:
+        texts += [[kw], ["english" + kw], [kw + "tips"], ["#" + kw.upper()]]
+    for a, b in itertools.combinations(keywords[::3], 2):
+        texts.append([b, a])
+    texts += [[], ["music"], ["#englishgrammar"], ["#learnenglish", "#ielts"]]
+    return texts
+
+def test_default_theme_matching_is_substring_parity():
+    texts = theme_texts()
+    assert [smdc.guess_theme(h, "") for h in texts] == [old_guess_theme(h, "") for h in texts]
+    assert smdc.guess_themes([(h, "a caption") for h in texts]) == \
+        [old_guess_theme(h, "a caption") for h in texts]
+    assert smdc.guess_theme(["#englishgrammar"], "") == "grammar"
+
+def test_start_boundary_is_opt_in():
+    start = KeywordClassifier(smdc.THEME_CATEGORIES, "general english", boundary="start")
+    assert start.classify("#englishgrammar") == "general english"
+    assert start.classify("#grammartips") == "grammar"
+
+def test_small_substring_tables_skip_the_trie_with_same_labels():
+    texts = [" ".join(h) for h in theme_texts()] + ["", "Grammar\nTips", "  idioms  "]
+    scan = smdc.theme_classifier()
+    trie = KeywordClassifier(smdc.THEME_CATEGORIES, "general english", "none", trie_min_keywords=0)
+    assert not scan.uses_trie and trie.uses_trie
+    assert scan.classify_many(texts) == trie.classify_many(texts) == [scan.classify(t) for t in texts]
+    assert smdc.country_classifier().uses_trie
+    cats = [("a", ["x%d" % i for i in range(300)])]
+    assert KeywordClassifier(cats, boundary="none").uses_trie
+    assert KeywordClassifier(cats, boundary="none", trie_min_keywords=301).classify("zx299") == "a"
@@ -0,0 +1,26 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import Social_Media_Data_Collection as smdc  # noqa: E402
+import columnar  # noqa: E402
+
+def batch(profiles):
+    return columnar.batch_metrics(columnar.PostTable.from_profiles(profiles))
+
+def test_batch_metrics_match_profile_metrics(profiles, assert_same):
+    got = batch(profiles)
+    assert list(got) == list(profiles)
+    for username, posts in profiles.items():
+        assert_same(got[username], smdc.profile_metrics(posts))
+
+def test_sorted_outputs_keep_order_on_ties(tied_posts, assert_same):
+    ref = smdc.profile_metrics(tied_posts)
+    got = batch({"tied": tied_posts})["tied"]
+    for key in ("hashtag_efficiency", "posting_window", "category_lift", "hashtags_used"):
+        assert_same(got[key], ref[key])
+    assert [row[0] for row in got["hashtag_efficiency"][1]] == [row[0] for row in ref["hashtag_efficiency"][1]]
+
+def test_summary_rows_match(profiles):
+    rows = columnar.batch_summary_rows(profiles, {u: (u, "") for u in profiles})
+    assert rows == [smdc.analyze_profile(u, u, "", posts) for u, posts in profiles.items()]
@@ -0,0 +1,103 @@
+import os
+import threading
+
+import pytest
+
+import Social_Media_Data_Collection as smdc
+import crawl
+from pipeline import JSONLSink
+
+class Clock:
+    def __init__(self):
+        self.t = 1_000_000.0
+
+    def __call__(self):
+        return self.t
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(crawl.time, "time", clock)
+    return clock
+
+@pytest.fixture
+def queue(tmp_path):
+    q = crawl.WorkQueue(str(tmp_path / "queue.sqlite"), max_attempts=2, backoff_base=0.0, backoff_cap=0.0)
+    q.load(["a", "b", "c"])
+    yield q
+    q.close()
+
+def test_expired_lease_is_reclaimed_by_another_worker(queue, clock):
+    assert queue.claim("w1", 2, lease_seconds=60) == ["a", "b"]
+    assert queue.claim("w2", 5, lease_seconds=60) == ["c"]
+    clock.t += 30
+    assert queue.heartbeat("w1", ["a"], lease_seconds=60) == ["a"]    # a renewed, b not
+    assert queue.heartbeat("w2", ["c"], lease_seconds=60) == ["c"]
+    clock.t += 45
+    assert queue.claim("w2", 5, lease_seconds=60) == ["b"]
+    assert queue.heartbeat("w1", ["a", "b"], lease_seconds=60) == ["a"]
+    assert queue.complete("w1", "b") is False and queue.fail("w1", "b", "boom") == "lost"
+    assert queue.complete("w2", "b", 3) is True
+    assert [r[:4] for r in queue.results()] == [("a", "leased", "w1", 1), ("b", "done", "w2", 2),
+                                                ("c", "leased", "w2", 1)]
+
+def test_lease_expiry_counts_as_a_failed_attempt(queue, clock):
+    queue.claim("w1", 1, lease_seconds=10)
+    clock.t += 11
+    assert queue.claim("w2", 1, lease_seconds=10) == ["a"]
+    clock.t += 11
+    assert queue.claim("w3", 1, lease_seconds=10) == ["b"]       # a used up max_attempts
+    username, state, worker, attempts, _, error = queue.results()[0]
+    assert (state, attempts, error) == ("failed", 2, "lease expired (w2)")
+    assert queue.complete("w2", "a") is False
+
+def test_only_one_of_racing_completions_wins(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    crawl.WorkQueue(path).load([f"h{i}" for i in range(20)])
+    queues = [crawl.WorkQueue(path) for _ in range(4)]
+    owner = queues[0].claim("owner", 20)
+    wins = []
+
+    def complete_all(q, worker):
+        for username in owner:
+            if q.complete(worker, username): wins.append((worker, username))
+    threads = [threading.Thread(target=complete_all, args=(q, "owner" if i < 2 else f"w{i}"))
+               for i, q in enumerate(queues)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert sorted(u for _, u in wins) == sorted(owner)
+    assert {w for w, _ in wins} == {"owner"}
+    for q in queues: q.close()
+
+def write_part(parts, worker, username, posts, bio):
+    sink = JSONLSink(os.path.join(parts, worker), flush_every=1)
+    sink.write(username, smdc.analyze_profile(username, username, bio, posts), posts, (username, bio, 1, 2))
+    sink.close()
+
+def test_merge_is_deterministic(tmp_path, profiles, queue, clock):
+    users = list(profiles)[:2]
+    queue.load(users)
+    parts = str(tmp_path / "parts")
+    # "a" and users[0] were scraped by two workers. The queue credits w2 with
+    # users[0]; nobody completed "a", so the last worker by name wins it.
+    assert queue.claim("w1", 5) == ["a", "b", "c", users[0], users[1]]
+    clock.t += 400
+    assert queue.claim("w2", 5) == ["a", "b", "c", users[0], users[1]]
+    queue.complete("w2", users[0])
+    queue.complete("w1", users[1])
+    for worker in ("w2", "w1"):
+        write_part(parts, worker, users[0], profiles[users[0]], f"by {worker}")
+        write_part(parts, worker, "a", profiles[users[1]][:3], f"by {worker}")
+    write_part(parts, "w1", users[1], profiles[users[1]], "by w1")
+
+    outputs = []
+    for n in range(2):
+        out = str(tmp_path / f"out{n}")
+        assert crawl.merge([parts], out, queue, ["jsonl"]) == 3
+        outputs.append({name: open(os.path.join(out, f"{name}.jsonl"), encoding="utf-8").read()
+                        for name in crawl.OUTPUT_NAMES})
+    assert outputs[0] == outputs[1]
+    rows = list(crawl.read_table(str(tmp_path / "out0"), "profiles"))
+    assert [(r["username"], r["bio"]) for r in rows] == [("a", "by w2"), (users[0], "by w2"), (users[1], "by w1")]
+    with pytest.raises(FileExistsError):
+        crawl.merge([parts], str(tmp_path / "out0"), queue, ["jsonl"])
@@ -0,0 +1,52 @@
+import sqlite3
+import urllib.error
+import urllib.request
+
+import pytest
+
+import crawl
+
+@pytest.fixture
+def queue(tmp_path):
+    q = crawl.WorkQueue(str(tmp_path / "queue.sqlite"))
+    q.load(["a", "b", "c"])
+    return q
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(queue, **kwargs):
+        servers.append(crawl.QueueServer(queue, port=0, **kwargs).start())
+        return servers[-1]
+    yield start
+    for server in servers:
+        server.stop()
+
+def test_serves_loopback_only_by_default(queue, serve):
+    assert serve(queue).address.startswith("http://127.0.0.1:")
+    with pytest.raises(ValueError, match="loopback"):
+        crawl.QueueServer(queue, host="0.0.0.0", port=0)
+    with pytest.raises(ValueError, match="token"):
+        crawl.QueueServer(queue, host="0.0.0.0", port=0, allow_remote=True)
+
+def test_token_is_required(queue, serve):
+    server = serve(queue, token="s3cret")
+    assert crawl.RemoteQueue(server.address, token="s3cret").status() == {"pending": 3}
+    for token in (None, "wrong"):
+        with pytest.raises(RuntimeError, match="HTTP 401"):
+            crawl.RemoteQueue(server.address, token=token).claim("w", 1)
+    assert queue.status() == {"pending": 3}
+
+def test_queue_errors_answer_json_500(queue, serve, monkeypatch):
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(queue, "status", locked)
+    server = serve(queue)
+    req = urllib.request.Request(f"{server.address}/status", data=b"{}", method="POST")
+    with pytest.raises(urllib.error.HTTPError) as err:
+        urllib.request.urlopen(req, timeout=5)
+    assert err.value.code == 500
+    assert "OperationalError: database is locked" in err.value.read().decode()
+    with pytest.raises(RuntimeError, match="HTTP 400"):
+        crawl.RemoteQueue(server.address)._call("claim", worker="w", bogus=1)
@@ -0,0 +1,20 @@
+import urllib.error
+import urllib.request
+
+import fixture_server as fs
+
+def statuses(pages, n=30, **kwargs):
+    out = []
+    with fs.FixtureServer(pages, **kwargs) as srv:
+        for _ in range(n):
+            try:
+                out.append(urllib.request.urlopen(f"{srv.base_url}/@a", timeout=5).status)
+            except urllib.error.HTTPError as e:
+                out.append(e.code)
+    return out
+
+def test_seeded_server_replays_faults_regardless_of_jitter():
+    pages = fs.build_synthetic_site(["a"], posts_per_profile=1)
+    first = statuses(pages, error_rate=0.3, throttle_rate=0.2, seed=7)
+    assert {200, 429, 500} <= set(first)
+    assert statuses(pages, error_rate=0.3, throttle_rate=0.2, seed=7, jitter=0.002) == first
@@ -0,0 +1,75 @@
+import json
+import pickle
+import random
+
+import pytest
+
+from hashtag_index import HashtagIndex
+
+@pytest.fixture(scope="module")
+def posts(profiles):
+    """{username: posts} with video IDs unique across creators."""
+    return {u: [dict(p, url=f"https://www.tiktok.com/@{u}/video/{n}{i:04d}") for i, p in enumerate(ps)]
+            for n, (u, ps) in enumerate(profiles.items(), 1)}
+
+def build(posts):
+    index = HashtagIndex()
+    for username, ps in posts.items():
+        index.add_posts(username, ps)
+    return index
+
+def answers(index, themes):
+    out = {"len": len(index), "top": index.top_lift(50, 1), "lowest": index.top_lift(50, 1, lowest=True)}
+    for theme in themes:
+        out[theme] = index.top_lift(50, 1, themes=[theme])
+    for user in list(index.profiles)[:3]:
+        out[user] = index.top_lift(50, 1, usernames=[user])
+    for tag in index.tags.decode(range(len(index.tags))):
+        out["cooc " + tag] = index.cooccurring(tag, 50)
+        out["with " + tag] = sorted(index.posts_with(tag))
+    return out
+
+def edited(posts):
+    """The same posts re-scraped: new ER everywhere, new hashtags or theme on some."""
+    rng = random.Random(5)
+    out = {}
+    for username, ps in posts.items():
+        out[username] = []
+        for p in ps:
+            p = dict(p, er_view=rng.random() / 10 if rng.random() < 0.9 else None)
+            roll = rng.random()
+            if roll < 0.2:
+                p["hashtags"] = p["hashtags"][1:] + ["#new" + str(rng.randrange(3))]
+            elif roll < 0.3:
+                p["theme"] = "vocabulary" if p["theme"] != "vocabulary" else "grammar"
+            out[username].append(p)
+    return out
+
+def test_reindexed_posts_match_a_fresh_build(posts, assert_same):
+    new = edited(posts)
+    index = build(posts)
+    for username, ps in new.items():
+        index.add_posts(username, ps)
+    fresh = build(new)
+    themes = sorted(set(fresh.themes))
+    assert_same(answers(index, themes), answers(fresh, themes))
+    by_tag = lambda ix: {ix.tags.name(c): n for c, n in enumerate(ix.tag_er_n) if n}
+    assert by_tag(index) == by_tag(fresh)
+
+def test_save_load_round_trip(posts, tmp_path, assert_same):
+    index = build(posts)
+    for username, ps in edited(posts).items():
+        index.add_posts(username, ps)
+    path = tmp_path / "hashtags.idx"
+    index.save(str(path))
+    assert json.loads(path.read_text(encoding="utf-8"))["posts"]
+    loaded = HashtagIndex.load(str(path))
+    assert len(loaded.post_keys) == len(loaded) == len(index)
+    themes = sorted(set(index.themes))
+    assert_same(answers(loaded, themes), answers(index, themes))
+
+def test_load_rejects_old_pickle(tmp_path):
+    path = tmp_path / "hashtags.idx"
+    path.write_bytes(pickle.dumps({"version": 1}))
+    with pytest.raises(ValueError, match="rebuild"):
+        HashtagIndex.load(str(path))
@@ -0,0 +1,80 @@
+import random
+from datetime import datetime
+
+import pytest
+
+from history_store import HistoryStore
+
+T0 = 1_700_000_000
+
+def post(username, vid, views, likes=0, day=1):
+    return {"url": f"https://www.tiktok.com/@{username}/video/{vid}", "views": views, "likes": likes,
+            "comments": 0, "shares": 0, "saves": 0, "timestamp": datetime(2024, 1, day)}
+
+@pytest.fixture
+def store(tmp_path):
+    with HistoryStore(str(tmp_path / "history.sqlite"), batch_size=7) as s:
+        yield s
+
+def test_velocity_rows_and_single_snapshots(store):
+    store.record_posts("a", [post("a", 1, 100), post("a", 2, 50), post("a", 3, 10)], fetched_at=T0)
+    store.record_posts("a", [post("a", 1, 400), post("a", 2, 50)], fetched_at=T0 + 3600)
+    store.record_posts("a", [post("a", 1, 1000)], fetched_at=T0 + 3 * 3600)
+    store.record_posts("b", [post("b", 1, 7)], fetched_at=T0 + 3600)     # one snapshot only
+    store.flush()
+    assert store.post_velocity(None, now=T0 + 4 * 3600) == [
+        ("a", "1", 100, 1000, 3.0, 300.0), ("a", "2", 50, 50, 1.0, 0.0)]
+    # a 2.5h window starts after the first snapshots: post 1 spans 1h..3h, post 2 has one left
+    assert store.post_velocity(2.5, now=T0 + 3.5 * 3600) == [("a", "1", 400, 1000, 2.0, 300.0)]
+    assert store.post_velocity(None, "likes", username="b", now=T0 + 4 * 3600) == []
+    assert store.snapshots("b", "1") == [(T0 + 3600, 7, 0, 0, 0, 0)]
+    with pytest.raises(ValueError):
+        store.post_velocity(None, "plays")
+
+def test_upserts_are_idempotent_per_fetch_time(store):
+    store.record_posts("a", [post("a", 1, 100)], fetched_at=T0)
+    store.flush()
+    store.record_posts("a", [post("a", 1, 100)], fetched_at=T0 + 0.4)   # same second: same snapshot
+    store.record_posts("a", [dict(post("a", 1, 120), timestamp=None)], fetched_at=T0 + 60)
+    store.record_posts("a", [dict(post("a", 1, 130), fetched_at=T0 + 60)])  # cached post, own fetch time
+    store.flush()
+    assert store.snapshots("a", "1") == [(T0, 100, 0, 0, 0, 0), (T0 + 60, 130, 0, 0, 0, 0)]
+    created_at, _ = store.post_histories(["a"])[("a", "1")]
+    assert created_at == int(datetime(2024, 1, 1).timestamp())          # kept when a later copy has none
+
+def test_velocity_matches_a_scan_of_the_snapshots(store):
+    rng = random.Random(3)
+    snaps = {}
+    for n in range(40):
+        for _ in range(rng.randint(1, 6)):
+            t = T0 + rng.randrange(0, 48 * 3600, 60)
+            views = rng.randint(0, 10_000)
+            store.record_posts("u", [post("u", n, views)], fetched_at=t)
+            snaps.setdefault(str(n), {})[t] = views      # last write per second wins
+    store.flush()
+    now = T0 + 48 * 3600
+    for window in (None, 24, 6):
+        since = now - window * 3600 if window else float("-inf")
+        expected = []
+        for vid, series in snaps.items():
+            inside = sorted((t, v) for t, v in series.items() if since <= t <= now)
+            if len(inside) >= 2:
+                (t0, v0), (t1, v1) = inside[0], inside[-1]
+                expected.append(("u", vid, v0, v1, (t1 - t0) / 3600, (v1 - v0) / ((t1 - t0) / 3600)))
+        got = store.post_velocity(window, now=now)
+        key = lambda r: (-r[5], r[1])
+        assert sorted(got, key=key) == sorted(expected, key=key)
+
+def test_profile_velocity_and_histories(store):
+    store.record_posts("a", [post("a", 1, 100, 10), post("a", 2, 0, 0)], fetched_at=T0)
+    store.record_posts("a", [post("a", 1, 300, 20), post("a", 2, 100, 5)], fetched_at=T0 + 7200)
+    store.record_profile("a", 1000, 5, fetched_at=T0)
+    store.record_profile("a", 1100, 5, fetched_at=T0 + 3600)
+    store.record_profile("c", 10, 1, fetched_at=T0)
+    store.flush()
+    [row] = store.profile_velocity(None, "views", now=T0 + 7200)
+    assert row == {"username": "a", "posts": 2, "views_gained": 300, "views_per_hour": 150.0,
+                   "followers_gained": 100, "followers_per_hour": 100.0}
+    histories = store.post_histories(keep=1)
+    assert histories[("a", "2")][1] == [(T0 + 7200, 100, 5, 0, 0, 0)]
+    assert len(store.post_histories(["a"])[("a", "1")][1]) == 2
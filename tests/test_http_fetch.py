@@ -0,0 +1,79 @@
+import asyncio
+import random
+
+import pytest
+
+import Social_Media_Data_Collection as smdc
+import fixture_server as fs
+import http_fetch
+
+PAGES = fs.build_synthetic_site(["a", "b"], posts_per_profile=5)
+PATHS = [p for p in PAGES if "/video/" in p]
+
+def without_caption(path):
+    """A post page whose JSON has stats but an empty desc, so HTTP mode hands it to the browser."""
+    username, vid = path.split("/")[1][1:], path.rsplit("/", 1)[1]
+    item = fs.synthetic_post(username, vid, random.Random(vid), 1_700_000_000)
+    return fs.post_page(dict(item, desc=""), username)
+
+@pytest.fixture
+def http(monkeypatch):
+    monkeypatch.setattr(smdc, "MAX_ATTEMPTS", 20)
+    monkeypatch.setattr(smdc, "BACKOFF_BASE", 0.0)
+    monkeypatch.setattr(smdc, "BACKOFF_CAP", 0.0)
+
+def test_keep_alive_connections_are_reused():
+    async def run(base_url):
+        async with http_fetch.AsyncConnectionPool(max_per_host=2) as pool:
+            first = [await pool.get(base_url + p) for p in PATHS]
+            rest = await asyncio.gather(*(pool.get(base_url + p) for p in PATHS))
+            return first + list(rest), pool.connections_opened
+
+    with fs.FixtureServer(PAGES) as srv:
+        responses, opened = asyncio.run(run(srv.base_url))
+    assert [r.status for r in responses] == [200] * 2 * len(PATHS)
+    assert [r.text for r in responses] == [PAGES[p] for p in PATHS] * 2
+    assert opened == 2
+
+def test_stale_keep_alive_retry_closes_its_connection():
+    writers = []
+
+    async def run(base_url):
+        async with http_fetch.AsyncConnectionPool(max_per_host=1) as pool:
+            await pool.get(base_url + PATHS[0])
+            connect = pool._connect
+
+            async def tracked(key):
+                reader, writer, reused = await connect(key)
+                writers.append(writer)
+                return reader, writer, reused
+
+            async def reset(*args):
+                raise ConnectionResetError("peer reset")
+
+            pool._connect, pool._send = tracked, reset
+            with pytest.raises(ConnectionResetError):
+                await pool.get(base_url + PATHS[1])
+            return pool.connections_opened
+
+    with fs.FixtureServer(PAGES) as srv:
+        opened = asyncio.run(run(srv.base_url))
+    assert opened == 2 and len(writers) == 2
+    assert all(w.is_closing() for w in writers)
+
+def test_http_mode_matches_browser_and_falls_back(http, browser, page_driver):
+    pages = dict(PAGES, **{p: without_caption(p) for p in PATHS[::3]})
+    with fs.FixtureServer(pages, error_rate=0.2, throttle_rate=0.1, retry_after=0, seed=2) as srv:
+        urls = [srv.base_url + p for p in PATHS]
+        fetched = http_fetch.fetch_posts_http(urls, concurrency=2)
+        fallback = page_driver()
+        got = http_fetch.scrape_posts_http(urls, fallback_driver=fallback, concurrency=2)
+        skipped = http_fetch.scrape_posts_http(urls, concurrency=2)
+        injected = sum(srv.injected.values())
+    with fs.FixtureServer(pages) as srv:
+        expected = smdc.scrape_posts(page_driver(), [srv.base_url + p for p in PATHS])
+    assert injected > 0
+    assert [post is None for post in fetched] == [p in PATHS[::3] for p in PATHS]
+    assert fallback.loads >= len(PATHS[::3])
+    assert [{**p, "url": ""} for p in got] == [{**p, "url": ""} for p in expected]
+    assert [p["url"] for p in skipped] == [u for u, p in zip(urls, PATHS) if p not in PATHS[::3]]
@@ -0,0 +1,25 @@
+import os
+import stat
+
+import pytest
+
+import instrumentation as instr
+
+@pytest.fixture
+def recording():
+    instr.reset()
+    instr.enable()
+    yield
+    instr.disable()
+    instr.reset()
+
+def test_write_prometheus_is_world_readable(recording, tmp_path):
+    instr.observe("navigate", 0.5, kind="post")
+    instr.count("retries", stage="http")
+    path = tmp_path / "scraper.prom"
+    instr.write_prometheus(str(path))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+    text = path.read_text()
+    assert 'scraper_stage_seconds_count{stage="navigate",kind="post"} 1' in text
+    assert 'scraper_retries_total{stage="http"} 1' in text
+    assert [p.name for p in tmp_path.iterdir()] == ["scraper.prom"]
@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+import pipeline
+
+def test_append_atomic_finishes_short_writes(tmp_path, monkeypatch):
+    path = str(tmp_path / "posts.jsonl")
+    pipeline.append_atomic(path, b"first\n")
+    real_write = os.write
+    monkeypatch.setattr(pipeline.os, "write", lambda fd, data: real_write(fd, bytes(data[:3])))
+    pipeline.append_atomic(path, b"0123456789\n")
+    with open(path, "rb") as f:
+        assert f.read() == b"first\n0123456789\n"
+
+def test_append_atomic_rolls_back_a_failed_batch(tmp_path, monkeypatch):
+    path = str(tmp_path / "posts.jsonl")
+    pipeline.append_atomic(path, b"first\n")
+    real_write, calls = os.write, []
+
+    def flaky(fd, data):
+        calls.append(len(data))
+        if len(calls) > 1: raise OSError(28, "No space left on device")
+        return real_write(fd, bytes(data[:4]))
+    monkeypatch.setattr(pipeline.os, "write", flaky)
+    with pytest.raises(OSError):
+        pipeline.append_atomic(path, b"0123456789\n")
+    with open(path, "rb") as f:
+        assert f.read() == b"first\n"
@@ -0,0 +1,72 @@
+import os
+from datetime import datetime
+
+import Social_Media_Data_Collection as smdc
+import post_cache
+from post_cache import PostCache, is_current, merge_cached, scrape_incremental, split_cached
+from refresh_policy import RefreshPlan
+
+NOW = 1_700_000_000.0
+
+def url(n):
+    return f"https://www.tiktok.com/@alice/video/{n}"
+
+def post(n, likes=10):
+    fields = {"views": 1000, "likes": likes, "comments": 1, "shares": 0, "saves": 0, "caption": "#tips",
+              "hashtags": None, "timestamp": datetime(2024, 3, 1, 12)}
+    return smdc.build_post_record(url(n), fields)
+
+def likes(posts):
+    return [(smdc.video_id_from_url(p["url"]), p["likes"]) for p in posts]
+
+def test_ttl_cutoff(tmp_path):
+    cache = PostCache(str(tmp_path), ttl_hours=1)
+    cache.put(url(1), post(1), fetched_at=NOW - 3599)
+    cache.put(url(2), post(2), fetched_at=NOW - 3600)
+    assert cache.get(url(1))[1] == NOW - 3599 and cache.get(url(3)) is None
+    assert cache.get(url(1) + "?lang=en")[0]["likes"] == 10    # same video, same entry
+    fresh, to_fetch = split_cached([url(1), url(2), url(3)], cache, now=NOW)
+    assert list(fresh) == [url(1)] and to_fetch == [url(2), url(3)]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_refresh_plan_overrides_ttl_for_tracked_posts(tmp_path, monkeypatch):
+    cache = PostCache(str(tmp_path), ttl_hours=1)
+    plan = RefreshPlan(fetch=[("alice", "1")], deferred=[], now=NOW,
+                       drift={("alice", "1"): 0.2, ("alice", "2"): 0.01}, due_at={})
+    assert not is_current(url(1), NOW, cache, plan, now=NOW)           # fresh, but planned
+    assert is_current(url(2), NOW - 10 * 3600, cache, plan, now=NOW)   # stale, not planned
+    assert not is_current(url(3), NOW - 10 * 3600, cache, plan, now=NOW)  # untracked: TTL
+    for n in (1, 2, 3):
+        cache.put(url(n), post(n), fetched_at=NOW - 10 * 3600)
+    monkeypatch.setattr(smdc, "refresh_plan", lambda: plan)
+    fresh, to_fetch = split_cached([url(1), url(2), url(3)], cache, now=NOW)
+    assert list(fresh) == [url(2)] and to_fetch == [url(1), url(3)]
+
+def test_eviction_drops_the_oldest_fetches(tmp_path):
+    cache = PostCache(str(tmp_path), max_entries=10)
+    for n in range(12):
+        cache.put(url(n), post(n), fetched_at=NOW + n)
+    assert cache.evicted == 2
+    assert [n for n in range(12) if cache.get(url(n))] == list(range(2, 12))
+    cache.put(url(5), post(5, likes=99), fetched_at=NOW + 20)    # overwrite: no new entry
+    assert cache.evicted == 2 and cache.get(url(5))[0]["likes"] == 99
+    files = [f for _, _, fs in os.walk(str(tmp_path)) for f in fs]
+    assert len(files) == 10 and not [f for f in files if f.endswith(".tmp")]
+
+def test_merge_keeps_grid_order_and_falls_back_to_stale_copies(tmp_path, monkeypatch):
+    cache = PostCache(str(tmp_path), ttl_hours=1)
+    monkeypatch.setattr(post_cache.time, "time", lambda: NOW)
+    cache.put(url(1), post(1, likes=1), fetched_at=NOW)
+    cache.put(url(3), post(3, likes=3), fetched_at=NOW - 7200)        # stale; re-fetch fails
+    cache.put(url(4), post(4, likes=4), fetched_at=NOW - 7200)        # stale; re-fetch works
+    grid = [url(n) for n in (5, 4, 3, 2, 1)]
+    requested = []
+
+    def fetch(urls):
+        requested.extend(urls)
+        return [post(4, likes=40), post(5, likes=50)]                 # out of order, 3 and 2 missing
+    posts = scrape_incremental(grid, fetch, cache)
+    assert requested == [url(n) for n in (5, 4, 3, 2)]
+    assert likes(posts) == [("5", 50), ("4", 40), ("3", 3), ("1", 1)]
+    assert cache.get(url(4)) == (posts[1], NOW) and cache.get(url(5))[1] == NOW
+    assert likes(merge_cached([url(1), url(5)], {}, [], cache)) == [("1", 1), ("5", 50)]
@@ -0,0 +1,38 @@
+import json
+import re
+
+import Social_Media_Data_Collection as smdc
+import fixture_server as fs
+
+USERNAME = "all.american.eng"
+
+def dom_count(html: str, e2e: str) -> int:
+    return int(re.search(rf'data-e2e="{e2e}">(\d+)<', html).group(1))
+
+def test_parse_profile_state_reads_fixture_profile_page():
+    pages = fs.build_synthetic_site([USERNAME, "eslkate"], posts_per_profile=5)
+    html = pages[f"/@{USERNAME}"]
+    identity, video_ids = smdc.parse_profile_state(json.loads(smdc.find_rehydration_text(html)), USERNAME)
+
+    display_name, bio, followers, following = identity
+    assert display_name == "All American Eng"
+    assert bio == re.search(r'data-e2e="user-bio">([^<]*)<', html).group(1)
+    assert followers == dom_count(html, "followers-count")
+    assert following == dom_count(html, "following-count")
+    # The universal-data layout carries no item list: URLs come from the grid.
+    assert video_ids == []
+
+def test_parse_profile_state_sigi_layout_keeps_grid_order():
+    pages = fs.build_synthetic_site([USERNAME], posts_per_profile=5)
+    grid = re.findall(rf'href="/@{re.escape(USERNAME)}/video/(\d+)"', pages[f"/@{USERNAME}"])
+    data = {
+        "UserModule": {"users": {USERNAME: {"nickname": " Kate ", "signature": "ESL coach"}},
+                       "stats": {USERNAME: {"followerCount": "1200", "followingCount": 3}}},
+        "ItemList": {"user-post": {"list": [int(v) for v in grid]}},
+    }
+    assert smdc.parse_profile_state(data, USERNAME) == (("Kate", "ESL coach", 1200, 3), grid)
+
+def test_parse_profile_state_without_user_info():
+    identity, video_ids = smdc.parse_profile_state({"ItemModule": {"1": {}, "2": {}}}, USERNAME)
+    assert identity is None
+    assert video_ids == ["1", "2"]
@@ -0,0 +1,44 @@
+import json
+from datetime import datetime
+
+import Social_Media_Data_Collection as smdc
+from post_cache import PostCache
+from reanalyze import load_store
+
+def post(username, video_id, day):
+    fields = {"views": 100, "likes": 10, "comments": 1, "shares": 0, "saves": 0, "caption": "#tips",
+              "hashtags": None, "timestamp": datetime(2024, 3, day, 12) if day else None}
+    return smdc.build_post_record(f"https://www.tiktok.com/@{username}/video/{video_id}", fields)
+
+def ids(rows):
+    return [smdc.video_id_from_url(r["url"]) for r in rows]
+
+def test_cached_posts_are_kept_newest_first_not_by_fetch_time(tmp_path):
+    cache = PostCache(str(tmp_path / "cache"))
+    # (video ID, day posted, fetched_at): current grid posts served from an old
+    # fetch, an old off-grid post refetched recently, a tie on the post time.
+    for vid, day, fetched_at in [(105, 9, 1_000), (104, 8, 1_000), (103, 8, 5_000),
+                                 (102, 5, 2_000), (101, 1, 9_000), (100, None, 9_500)]:
+        p = post("alice", vid, day)
+        cache.put(p["url"], p, fetched_at=fetched_at)
+    profiles, identities, _ = load_store(cache_dir=str(tmp_path / "cache"), limit=4)
+    assert ids(profiles["alice"]) == ["105", "104", "103", "102"]
+    assert identities["alice"] == ("alice", "")
+    profiles, _, _ = load_store(cache_dir=str(tmp_path / "cache"), limit=0)
+    assert ids(profiles["alice"]) == ["105", "104", "103", "102", "101", "100"]
+
+def test_pipeline_rows_win_over_cache(tmp_path):
+    cache = PostCache(str(tmp_path / "cache"))
+    for vid, day in [(3, 3), (2, 2), (1, 1)]:
+        p = post("bob", vid, day)
+        cache.put(p["url"], p, fetched_at=vid)
+    out = tmp_path / "out"
+    out.mkdir()
+    with open(out / "posts.jsonl", "w", encoding="utf-8") as f:
+        for vid in (3, 2):
+            f.write(json.dumps(dict(smdc.post_to_json(post("bob", vid, vid)), username="bob", likes=50)) + "\n")
+    profiles, _, _ = load_store(str(out), str(tmp_path / "cache"), limit=0)
+    assert ids(profiles["bob"]) == ["1", "3", "2"]
+    assert [r["likes"] for r in profiles["bob"]] == [10, 50, 50]
+    profiles, _, _ = load_store(str(out), str(tmp_path / "cache"), limit=2)
+    assert ids(profiles["bob"]) == ["3", "2"]
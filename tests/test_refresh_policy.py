@@ -0,0 +1,74 @@
+import math
+
+import pytest
+
+from benchmarks import _recorded_histories
+from refresh_policy import HOUR, FixedIntervalPolicy, RefreshPolicy, simulate
+
+T0 = 1_700_000_000
+
+def snap(t, views, likes=0):
+    return (t, views, likes, 0, 0, 0)
+
+def histories(n_profiles, posts_per_profile, days, seed=0):
+    """_recorded_histories() in HistoryStore.post_histories() form, hourly snapshots."""
+    out = {}
+    for username, created, snaps in _recorded_histories(n_profiles, posts_per_profile, days, 1.0, seed):
+        for t, post in snaps:
+            key = (username, post["url"].rsplit("/", 1)[1])
+            out.setdefault(key, (int(created), []))[1].append(
+                (t, post["views"], post["likes"], post["comments"], post["shares"], post["saves"]))
+    return out
+
+def test_due_at_reaches_tolerance_within_bounds():
+    policy = RefreshPolicy(tolerance=0.05, decay=1.2, min_hours=1, max_hours=100)
+    created = T0 - 10 * HOUR
+    moving = [snap(T0 - HOUR, 10_000), snap(T0, 10_100)]        # ~1%/h at 10h old
+    due = policy.due_at(created, moving)
+    assert T0 + HOUR < due < T0 + 100 * HOUR
+    assert policy.drift(created, moving, due) == pytest.approx(0.05)
+    assert policy.drift(created, moving, due - 60) < 0.05
+    assert policy.due_at(created, [snap(T0 - HOUR, 5_000), snap(T0, 5_000)]) == T0 + 100 * HOUR
+    assert policy.due_at(created, [snap(T0 - HOUR, 10_000), snap(T0, 90_000)]) == T0 + HOUR
+    # one snapshot: the prior, age ** prior_growth
+    prior = policy.due_at(created, [snap(T0, 10_000)])
+    assert policy.drift(created, [snap(T0, 10_000)], prior) == pytest.approx(0.05)
+
+def test_plan_takes_largest_drift_first_within_budget():
+    policy = RefreshPolicy(tolerance=0.05, decay=1.0, max_hours=48)
+    created = T0 - 20 * HOUR
+    hist = {("u", str(n)): (created, [snap(T0 - 2 * HOUR, 1000), snap(T0 - HOUR, 1000 + gain)])
+            for n, gain in enumerate([0, 400, 100, 200, 2, 200])}
+    now = T0 + 6 * HOUR
+    full = policy.plan(hist, None, now=now)
+    assert full.fetch == [("u", "1"), ("u", "3"), ("u", "5"), ("u", "2")]   # ties by key
+    assert [full.drift[k] for k in full.fetch] == sorted((full.drift[k] for k in full.fetch), reverse=True)
+    assert all(full.due_at[k] > now for k in hist if k not in full.fetch)
+    capped = policy.plan(hist, 2, now=now)
+    assert capped.fetch == full.fetch[:2] and capped.deferred == full.fetch[2:]
+    assert capped.wants("u", "1") and not capped.wants("u", "2") and ("u", "2") in capped
+    assert policy.plan(hist, 0, now=now).deferred == full.fetch
+    assert FixedIntervalPolicy(6).plan(hist, 3, now=now).fetch == [("u", str(n)) for n in range(3)]
+
+def test_fit_decay_recovers_the_exponent():
+    policy = RefreshPolicy(decay=1.0, min_count=1)
+    hist = {}
+    for n in range(10):
+        c, created = 0.5 + n / 10, T0
+        snaps = []
+        for h in range(2, 60, 3):   # relative rate c * age ** -1.4 -> log v = c * age ** -0.4 / -0.4
+            snaps.append(snap(T0 + h * HOUR, round(1e6 * math.exp(c * (2 ** -0.4 - h ** -0.4) / 0.4))))
+        hist[("u", str(n))] = (created, snaps)
+    assert policy.fit_decay(hist) == pytest.approx(1.4, abs=0.1)
+    few = RefreshPolicy(decay=0.8)
+    assert few.fit_decay({k: hist[k] for k in list(hist)[:1]}) == 0.8   # under min_points
+
+def test_simulation_is_deterministic_and_beats_a_fixed_ttl():
+    hist = histories(5, 10, 10)
+    adaptive = simulate(hist, RefreshPolicy(tolerance=0.05), 6.0)
+    assert simulate(hist, RefreshPolicy(tolerance=0.05), 6.0) == adaptive
+    ttl = simulate(hist, FixedIntervalPolicy(24), 6.0)
+    every = simulate(hist, FixedIntervalPolicy(6), 6.0)
+    assert every["saved"] == 0.0 and every["staleness_max"] == 0.0
+    assert adaptive["staleness_p95"] < 0.06 < 0.5 < ttl["staleness_p95"]
+    assert adaptive["saved"] > 0.4
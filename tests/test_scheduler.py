@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+from scheduler import (Checkpoint, RateLimited, RateLimiter, Scheduler, TokenBucket, TransientError,
+                       backoff_delay, retry_call, retry_delay)
+
+class Clock:
+    def __init__(self):
+        self.t = 100.0
+
+    def __call__(self):
+        return self.t
+
+def test_token_bucket_waits_follow_the_rate():
+    clock = Clock()
+    bucket = TokenBucket(rate=2.0, burst=2, clock=clock)
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    clock.t += 1.0      # refills the two tokens the last reservations borrowed
+    assert bucket.reserve() == 0.5
+    clock.t += 10.0     # never more than `burst` saved up
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.5]
+    bucket.pause(3.0)
+    assert bucket.reserve() == pytest.approx(3.5)
+
+def test_rate_limiter_keeps_one_bucket_per_host():
+    limiter = RateLimiter(rate=1.0)
+    a = limiter.bucket("https://www.tiktok.com/@a")
+    assert limiter.bucket("https://www.tiktok.com/@b/video/1") is a
+    assert limiter.bucket("http://www.tiktok.com/@a") is not a
+    assert limiter.bucket("https://m.tiktok.com/@a") is not a
+
+def test_retry_delay_bounds():
+    rng = random.Random(0)
+    for attempt in range(8):
+        ceiling = min(10.0, 0.5 * 2 ** attempt)
+        delays = [retry_delay(TransientError("x"), attempt, 0.5, 10.0, rng) for _ in range(200)]
+        assert all(0 <= d <= ceiling for d in delays)
+        assert max(delays) > 0.8 * ceiling
+    assert all(retry_delay(RateLimited("u", 30.0), 0, 0.5, 10.0, rng) == 30.0 for _ in range(20))
+    assert all(0 <= retry_delay(RateLimited("u"), 1, 0.5, 10.0, rng) <= 1.0 for _ in range(20))
+    assert backoff_delay(50, 2.0, 60.0, random.Random(1)) <= 60.0
+
+def test_retry_call_retries_only_listed_errors():
+    sleeps, calls = [], []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3: raise TransientError("busy")
+        return "ok"
+    assert retry_call(flaky, 5, 1.0, 4.0, retry_on=(TransientError,), sleep=sleeps.append) == "ok"
+    assert len(sleeps) == 2 and all(0 <= s <= 2.0 for s in sleeps)
+
+    def broken():
+        calls.append(1)
+        raise KeyError("driver gone")
+    calls.clear()
+    with pytest.raises(KeyError):
+        retry_call(broken, 5, 1.0, 4.0, retry_on=(TransientError,), sleep=sleeps.append)
+    assert len(calls) == 1
+
+    def throttled():
+        calls.append(1)
+        raise RateLimited("u")
+    calls.clear()
+    with pytest.raises(RateLimited):
+        retry_call(throttled, 3, 0.0, 0.0, retry_on=(RateLimited,), sleep=sleeps.append)
+    assert len(calls) == 3
+
+class Crash(BaseException):
+    """Stands in for the process dying: the scheduler does not catch it."""
+
+def test_checkpoint_resumes_after_a_crash(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    ran, failures = [], {"b": 1}
+
+    def job(username):
+        ran.append(username)
+        if username == "d": raise Crash()
+        if failures.get(username):
+            failures[username] -= 1
+            raise TransientError("429 page")
+        if username == "e": raise ValueError("private profile")
+
+    handles = ["a", "b", "c", "d", "e"]
+    with pytest.raises(Crash):
+        Scheduler(job, Checkpoint(path), max_attempts=2, backoff_base=0.0).run(handles)
+    assert ran == ["a", "b", "c", "d"]
+
+    cp = Checkpoint(path)
+    assert cp.resuming and cp.run["done"] == ["a", "c"]
+    assert cp.attempts("b") == 1 and cp.start(handles) == ["b", "d", "e"]
+
+    ran.clear()
+    result = Scheduler(lambda u: job(u) if u != "d" else ran.append(u), Checkpoint(path),
+                       max_attempts=2, backoff_base=0.0).run(handles)
+    assert ran == ["b", "d", "e", "e"]
+    assert result["done"] == ["a", "c", "b", "d"]
+    assert result["failed"] == {"e": "ValueError: private profile"}
+    cp = Checkpoint(path)
+    assert not cp.resuming and set(cp.last_completed) == {"a", "b", "c", "d"}
+
+def test_scheduler_runs_stalest_first(tmp_path):
+    cp = Checkpoint(str(tmp_path / "checkpoint.json"))
+    cp.last_completed = {"a": 300.0, "b": 100.0, "c": 200.0}
+    ran = []
+    Scheduler(ran.append, cp).run(["a", "b", "c", "new"])
+    assert ran == ["new", "b", "c", "a"]